@@ -22,7 +22,7 @@ from fastapi import FastAPI
 from .routers import api_root
 from .routers.v1 import api_file, api_project, api_manifest, api_validation, \
                         api_lineage, api_forward_entity_info, api_dataset, \
-                            api_hpc, api_kg
+                            api_hpc, api_kg, api_metrics
 
 
 def api_registry(app: FastAPI):
@@ -37,3 +37,4 @@ def api_registry(app: FastAPI):
     app.include_router(api_dataset.router, prefix=prefix)
     app.include_router(api_hpc.router, prefix=prefix)
     app.include_router(api_kg.router, prefix=prefix)
+    app.include_router(api_metrics.router, prefix=prefix)
@@ -18,42 +18,62 @@
 # permissions and limitations under the Licence.
 # 
 
-from sqlalchemy import create_engine
+import asyncio
+import asyncpg
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
 from ...config import ConfigClass
 
 SQLALCHEMY_DATABASE_URL = ConfigClass.SQLALCHEMY_DATABASE_URI
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
+# the declarative models only describe the tables, queries go through
+# the asyncpg pool below
 Base = declarative_base()
 
+_async_pool = None
+_async_pool_lock = None
+
+
+async def get_async_pool() -> asyncpg.pool.Pool:
+    """
+    Return the process wide asyncpg pool, the pool is created on first use.
+    Closed connections are replaced on acquire, idle ones are retired after
+    DB_ASYNC_POOL_MAX_INACTIVE_LIFETIME and every connection is recycled after
+    DB_ASYNC_POOL_MAX_QUERIES queries
+    """
+    global _async_pool, _async_pool_lock
+    if _async_pool is None:
+        if _async_pool_lock is None:
+            _async_pool_lock = asyncio.Lock()
+        async with _async_pool_lock:
+            if _async_pool is None:
+                _async_pool = await asyncpg.create_pool(
+                    dsn=SQLALCHEMY_DATABASE_URL,
+                    min_size=ConfigClass.DB_ASYNC_POOL_MIN_SIZE,
+                    max_size=ConfigClass.DB_ASYNC_POOL_MAX_SIZE,
+                    max_queries=ConfigClass.DB_ASYNC_POOL_MAX_QUERIES,
+                    max_inactive_connection_lifetime=ConfigClass.DB_ASYNC_POOL_MAX_INACTIVE_LIFETIME,
+                    command_timeout=ConfigClass.DB_ASYNC_COMMAND_TIMEOUT
+                )
+    return _async_pool
+
+
+async def close_async_pool():
+    global _async_pool, _async_pool_lock
+    if _async_pool is not None:
+        await _async_pool.close()
+        _async_pool = None
+    _async_pool_lock = None
+
 
-class SingletonMetaClass(type):
-    def __init__(cls,name,bases,dict):
-        super(SingletonMetaClass,cls)\
-          .__init__(name,bases,dict)
-        original_new = cls.__new__
-        def my_new(cls,*args,**kwds):
-            if cls.instance == None:
-                cls.instance = \
-                  original_new(cls,*args,**kwds)
-            return cls.instance
-        cls.instance = None
-        cls.__new__ = staticmethod(my_new)
-
-    
-class DBConnection:
-    __metaclass__ = SingletonMetaClass
-
-    def __init__(self):
-        self.session = SessionLocal()
-
-    def get_db(self):
-        db = self.session
-        try:
-            yield db
-        finally:
-            db.close()
+def async_pool_stats() -> dict:
+    stats = {
+        "started": _async_pool is not None,
+        "min_size": ConfigClass.DB_ASYNC_POOL_MIN_SIZE,
+        "max_size": ConfigClass.DB_ASYNC_POOL_MAX_SIZE,
+        "size": 0,
+        "idle": 0,
+    }
+    if _async_pool is not None:
+        stats["size"] = _async_pool.get_size()
+        stats["idle"] = _async_pool.get_idle_size()
+    return stats
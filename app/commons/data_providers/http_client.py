@@ -0,0 +1,62 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+
+import httpx
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from ...config import ConfigClass
+
+_async_client = None
+
+
+class _RejectCookiePolicy(DefaultCookiePolicy):
+    """
+    Never store or send cookies, the shared client serves every user
+    """
+
+    def set_ok(self, cookie, request):
+        return False
+
+    def return_ok(self, cookie, request):
+        return False
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """
+    Return the process wide pooled http client, the client is created
+    on first use so helpers also work outside of the app lifecycle
+    """
+    global _async_client
+    if _async_client is None or _async_client.is_closed:
+        limits = httpx.Limits(
+            max_connections=ConfigClass.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=ConfigClass.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=ConfigClass.HTTP_KEEPALIVE_EXPIRY
+        )
+        _async_client = httpx.AsyncClient(limits=limits, timeout=ConfigClass.HTTP_TIMEOUT,
+                                          cookies=CookieJar(policy=_RejectCookiePolicy()))
+    return _async_client
+
+
+async def close_async_client():
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
@@ -0,0 +1,76 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from functools import partial
+from ..config import ConfigClass
+
+_executor = None
+_pending = 0
+_completed = 0
+
+
+def get_executor():
+    """
+    Return the process wide executor for cpu bound work, WORKER_POOL_TYPE
+    selects a thread or a process pool
+    """
+    global _executor
+    if _executor is None:
+        if ConfigClass.WORKER_POOL_TYPE == "process":
+            _executor = ProcessPoolExecutor(max_workers=ConfigClass.WORKER_POOL_SIZE)
+        else:
+            _executor = ThreadPoolExecutor(max_workers=ConfigClass.WORKER_POOL_SIZE,
+                                           thread_name_prefix="bff_worker")
+    return _executor
+
+
+async def run_in_worker(func, *args, **kwargs):
+    """
+    Run func in the worker pool without blocking the event loop, with a
+    process pool func and its arguments must be picklable
+    """
+    global _pending, _completed
+    loop = asyncio.get_event_loop()
+    _pending += 1
+    try:
+        return await loop.run_in_executor(get_executor(), partial(func, *args, **kwargs))
+    finally:
+        _pending -= 1
+        _completed += 1
+
+
+def shutdown_worker_pool():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+        _executor = None
+
+
+def worker_pool_stats() -> dict:
+    return {
+        "type": ConfigClass.WORKER_POOL_TYPE,
+        "size": ConfigClass.WORKER_POOL_SIZE,
+        "started": _executor is not None,
+        "pending": _pending,
+        "queued": max(_pending - ConfigClass.WORKER_POOL_SIZE, 0),
+        "completed": _completed,
+    }
@@ -60,6 +60,52 @@ class Settings(BaseSettings):
     RDS_USER: str 
     RDS_SCHEMA_DEFAULT: str 
     NEO4J_SERVICE: str
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_KEEPALIVE_EXPIRY: float = 30.0
+    HTTP_TIMEOUT: float = 5.0
+    IDENTITY_CACHE_TTL: int = 300
+    IDENTITY_CACHE_SIZE: int = 1024
+    PERMISSION_CACHE_TTL: int = 30
+    PERMISSION_CACHE_SIZE: int = 4096
+    PREUPLOAD_CHECK_CONCURRENCY: int = 20
+    FILE_EXIST_CHECK_CONCURRENCY: int = 20
+    WORKER_POOL_TYPE: str = "thread"
+    WORKER_POOL_SIZE: int = 4
+    DB_ASYNC_POOL_MIN_SIZE: int = 2
+    DB_ASYNC_POOL_MAX_SIZE: int = 10
+    DB_ASYNC_POOL_MAX_QUERIES: int = 50000
+    DB_ASYNC_POOL_MAX_INACTIVE_LIFETIME: float = 300
+    DB_ASYNC_COMMAND_TIMEOUT: float = 30
+    MANIFEST_CACHE_TTL: int = 300
+    MANIFEST_CACHE_SIZE: int = 256
+    MANIFEST_VERSION_CHECK_INTERVAL: float = 5
+    FOLDER_CACHE_TTL: int = 30
+    FOLDER_NEGATIVE_CACHE_TTL: int = 5
+    FOLDER_CACHE_SIZE: int = 4096
+    HPC_SESSION_CACHE_TTL: int = 3600
+    HPC_SESSION_CACHE_SIZE: int = 256
+    HPC_INVENTORY_TTL: int = 10
+    HPC_INVENTORY_STALE_TTL: int = 60
+    HPC_INVENTORY_CACHE_SIZE: int = 256
+    HPC_JOB_STATUS_CONCURRENCY: int = 20
+    HPC_JOB_STATUS_MAX_JOBS: int = 1000
+    HPC_WATCH_MIN_INTERVAL: float = 2
+    HPC_WATCH_MAX_INTERVAL: float = 60
+    HPC_WATCH_BACKOFF: float = 2
+    HPC_WATCH_IDLE_TTL: int = 120
+    HPC_WATCH_TIMEOUT: int = 60
+    HPC_WATCH_HEARTBEAT: int = 15
+    HPC_WATCH_STREAM_MAX_AGE: int = 3600
+    HPC_TOKEN_CACHE_TTL: int = 43200
+    HPC_TOKEN_CACHE_SIZE: int = 1024
+    HPC_TOKEN_EXPIRY_MARGIN: int = 60
+    BATCH_VALIDATION_WORKER_THRESHOLD: int = 500
+    MANIFEST_ATTACH_CONCURRENCY: int = 20
+    MANIFEST_ATTACH_BATCH_SIZE: int = 100
+    FILE_LIST_STREAM_PAGE_SIZE: int = 1000
+    FILE_TREE_MAX_DEPTH: int = 20
+    FILE_TREE_CONCURRENCY: int = 10
 
     def __init__(self):
         super().__init__()
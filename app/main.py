@@ -29,12 +29,14 @@ from opentelemetry.sdk.resources import Resource
 from opentelemetry.sdk.resources import SERVICE_NAME
 from opentelemetry.sdk.trace import TracerProvider
 from opentelemetry.sdk.trace.export import BatchSpanProcessor
-from opentelemetry.instrumentation.sqlalchemy import SQLAlchemyInstrumentor
 from opentelemetry.instrumentation.httpx import HTTPXClientInstrumentor
 from opentelemetry.instrumentation.asyncpg import AsyncPGInstrumentor
 from app.namespace import namespace
 from app.config import ConfigClass
-from app.commons.data_providers.database import engine
+from app.commons.data_providers.database import close_async_pool
+from app.commons.data_providers.http_client import get_async_client, close_async_client
+from app.commons.worker_pool import shutdown_worker_pool
+from app.resources.hpc_watcher import stop_job_watchers
 
 
 def instrument_app(app):
@@ -45,7 +47,6 @@ def instrument_app(app):
     trace.set_tracer_provider(tracer_provider)
 
     FastAPIInstrumentor.instrument_app(app)
-    SQLAlchemyInstrumentor().instrument(engine=engine, service=namespace)
     HTTPXClientInstrumentor().instrument()
     AsyncPGInstrumentor().instrument()
 
@@ -75,6 +76,11 @@ def create_app():
         allow_methods=["*"],
         allow_headers=["*"],
     )
+    app.add_event_handler("startup", get_async_client)
+    app.add_event_handler("shutdown", stop_job_watchers)
+    app.add_event_handler("shutdown", close_async_client)
+    app.add_event_handler("shutdown", shutdown_worker_pool)
+    app.add_event_handler("shutdown", close_async_pool)
     api_registry(app)
     instrument_app(app)
     return app
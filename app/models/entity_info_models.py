@@ -46,3 +46,22 @@ class CheckFileResponse(APIResponse):
         "dcm_id": "undefined"
     }
     )
+
+
+class CheckFilesPost(BaseModel):
+    zone: str
+    file_relative_paths: list
+
+
+class CheckFilesResponse(APIResponse):
+    result: dict = Field({}, example={
+        "fake_user/file_1.txt": {
+            "exists": True,
+            "geid": "file_data-2a7ea1d8-7dea-11eb-8428-be498ca98c54-1614973025"
+        },
+        "fake_user/file_2.txt": {
+            "exists": False,
+            "geid": None
+        }
+    }
+    )
@@ -29,6 +29,7 @@ class GetProjectFileList(BaseModel):
 
 
 class GetProjectFileListResponse(APIResponse):
+    next_cursor: str = None
     result: dict = Field({}, example={
         "code": 200,
         "error_msg": "",
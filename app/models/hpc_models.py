@@ -93,6 +93,55 @@ class HPCJobInfoResponse(APIResponse):
         }
     )
 
+class HPCJobStatusPost(BaseModel):
+    """
+    Batch HPC Job status post model
+    """
+    host: str
+    username: str
+    token: str
+    job_ids: list
+
+
+class HPCJobStatusResponse(APIResponse):
+    """
+    Batch HPC Job status Response Class
+    """
+    result: dict = Field({}, example={
+            "code": 200,
+            "error_msg": "",
+            "result": {
+                "12345": {
+                    "code": 200,
+                    "job_state": "COMPLETED",
+                    "error_msg": ""
+                },
+                "12346": {
+                    "code": 404,
+                    "job_state": None,
+                    "error_msg": "Job ID not found"
+                }
+            }
+        }
+    )
+
+class HPCJobWatchResponse(APIResponse):
+    """
+    HPC Job watch Response Class
+    """
+    result: dict = Field({}, example={
+            "code": 200,
+            "error_msg": "",
+            "result": {
+                "job_id": "12345",
+                "changed": True,
+                "code": 200,
+                "job_state": "COMPLETED",
+                "error_msg": ""
+            }
+        }
+    )
+
 class HPCNodesResponse(APIResponse):
     """
     HPC Nodes Response Class
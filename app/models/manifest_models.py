@@ -118,6 +118,33 @@ class ManifestAttachResponse(APIResponse):
     )
 
 
+class ManifestBulkAttachPost(BaseModel):
+    """
+    Attach one manifest to many files post model
+    """
+    manifest_name: str
+    project_code: str
+    zone: str
+    file_names: list = Field([], example=["admin/file1", "admin/folder/file2"])
+    attributes: dict = Field({}, example={"attr1": "a1", "attr2": "asdf"})
+
+
+class ManifestBulkAttachResponse(APIResponse):
+    """
+    Attach manifest to many files response class
+    """
+    result: dict = Field({}, example={
+            "code": 200,
+            "error_msg": "",
+            "result": [
+                {"file_name": "admin/file1", "status": "success",
+                 "global_entity_id": "file_data-11f0d2b4-7163-11eb-8428-be498ca98c54-1613595588"},
+                {"file_name": "admin/folder/file2", "status": "File Not Exist", "global_entity_id": None}
+            ]
+        }
+    )
+
+
 class ManifestExportParam(BaseModel):
     project_code: str
     manifest_name: str
@@ -150,3 +177,18 @@ class ManifestExportResponse(APIResponse):
                 }
             }
         )
+
+
+class ManifestCacheInvalidateResponse(APIResponse):
+    """
+    Invalidate manifest cache response class
+    """
+    result: dict = Field({}, example={
+                "code": 200,
+                "error_msg": "",
+                "result": {
+                    "project_code": "sampleproject",
+                    "invalidated": 1
+                }
+            }
+    )
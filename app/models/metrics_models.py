@@ -0,0 +1,78 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+
+from pydantic import Field
+from .base_models import APIResponse
+
+
+class CacheMetricsResponse(APIResponse):
+    """
+    Cache metrics response class
+    """
+    result: dict = Field({}, example={
+            "code": 200,
+            "error_msg": "",
+            "result": {
+                "identity": {
+                    "size": 12,
+                    "maxsize": 1024,
+                    "ttl": 300,
+                    "hits": 5230,
+                    "misses": 14,
+                    "hit_ratio": 0.9973,
+                    "evictions": 0
+                }
+            }
+        }
+    )
+
+
+class PoolMetricsResponse(APIResponse):
+    """
+    Pool metrics response class
+    """
+    result: dict = Field({}, example={
+            "code": 200,
+            "error_msg": "",
+            "result": {
+                "worker": {
+                    "type": "thread",
+                    "size": 4,
+                    "started": True,
+                    "pending": 1,
+                    "queued": 0,
+                    "completed": 1024
+                },
+                "database": {
+                    "started": True,
+                    "min_size": 2,
+                    "max_size": 10,
+                    "size": 4,
+                    "idle": 3
+                },
+                "hpc_watcher": {
+                    "watchers": 1,
+                    "watched_jobs": 12,
+                    "polls": 240
+                }
+            }
+        }
+    )
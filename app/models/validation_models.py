@@ -18,6 +18,7 @@
 # permissions and limitations under the Licence.
 # 
 
+from typing import List
 from pydantic import BaseModel, Field
 from .base_models import APIResponse
 
@@ -47,6 +48,43 @@ class ManifestValidateResponse(APIResponse):
             )
 
 
+class ManifestBatchEntry(BaseModel):
+    """
+    Attributes of one file in a batch validation
+    """
+    file: str = ""
+    attributes: dict = {}
+
+
+class ManifestBatchValidatePost(BaseModel):
+    """
+    Validate attributes of many files against one manifest post model
+    """
+    manifest_name: str
+    project_code: str
+    entries: List[ManifestBatchEntry] = Field([], example=[
+                {"file": "testf1", "attributes": {"attr1": "a1", "attr2": "test cli upload"}},
+                {"file": "testf2", "attributes": {"attr1": "a9"}}
+            ]
+    )
+
+
+class ManifestBatchValidateResponse(APIResponse):
+    """
+    Validate Manifest batch response class
+    """
+    result: dict = Field({}, example={
+                    "code": 200,
+                    "error_msg": "",
+                    "result": [
+                        {"file": "testf1", "valid": True, "errors": []},
+                        {"file": "testf2", "valid": False,
+                         "errors": ["Invalid Choice Field attr1", "Missing Required Attribute attr2"]}
+                    ]
+                }
+            )
+
+
 class ValidateDICOMIDPOST(BaseModel):
     """Validate DICOM ID Post model"""
     dcm_id: str
@@ -18,91 +18,144 @@
 # permissions and limitations under the Licence.
 # 
 
+import time
 from ..commons.data_providers.data_models import DataManifestModel, DataAttributeModel, DatasetVersionModel
-from ..commons.data_providers.database import DBConnection
+from ..commons.data_providers.database import get_async_pool
+from ..commons.cache import TTLCache
+from ..config import ConfigClass
 from logger import LoggerFactory
 
+_MANIFEST_TABLE = DataManifestModel.__table__.fullname
+_ATTRIBUTE_TABLE = DataAttributeModel.__table__.fullname
+_DATASET_VERSION_TABLE = DatasetVersionModel.__table__.fullname
+
+manifest_cache = TTLCache("manifest", maxsize=ConfigClass.MANIFEST_CACHE_SIZE, ttl=ConfigClass.MANIFEST_CACHE_TTL)
+
+
+def invalidate_manifest_cache(project_code=None) -> int:
+    """
+    drop the cached manifest definitions of a project in this process,
+    with no argument the whole cache is dropped. Other workers pick up
+    the change at their next version check
+    """
+    return manifest_cache.invalidate_where(
+        lambda key: project_code is None or key == project_code)
+
 
 class RDConnection:
     
     def __init__(self):
         self._logger = LoggerFactory("Helpers").get_logger()
-        db = DBConnection()
-        self.db_session = db.session
 
-    def get_manifest_name_from_project_in_db(self, event: dict)-> list:
+    async def get_manifest_name_from_project_in_db(self, event: dict)-> list:
         self._logger.info("get_manifest_name_from_project_in_db".center(80, '-'))
         self._logger.info(f"Received event: {event}")
         project_code = event.get('project_code')
         manifest_name = event.get('manifest_name', None)
         try:
+            manifests = await self.get_manifests_with_attributes_in_db(project_code, manifest_name)
+            manifest_in_project = [{'name': m['manifest_name'], 'id': m['id']} for m in manifests]
             if manifest_name:
-                m = self.db_session.query(DataManifestModel.name,
-                                    DataManifestModel.id)\
-                    .filter_by(project_code=project_code, name=manifest_name)\
-                    .first()
-                self._logger.info(f"QUERY RESULT: {m}")
-                if not m:
-                    return []
-                else:
-                    manifest = [{'name': m[0], 'id': m[1]}]
-                    return manifest
-            else:
-                manifests = self.db_session.query(DataManifestModel.name,
-                                            DataManifestModel.id)\
-                    .filter_by(project_code=project_code)\
-                    .all()
-                self._logger.info(f"QUERY RESULT: {manifests}")
-                manifest_in_project = []
-                for m in manifests:
-                    manifest = {'name': m[0], 'id': m[1]}
-                    manifest_in_project.append(manifest)
-                return manifest_in_project
+                return manifest_in_project[:1]
+            return manifest_in_project
         except Exception as e:
             self._logger.error(f"ERROR get_manifest_name_from_project_in_db: {e}")
             raise e
     
-    def get_attributes_in_manifest_in_db(self, manifests: list) -> dict:
+    async def get_attributes_in_manifest_in_db(self, manifests: list) -> dict:
         self._logger.info("get_attributes_in_manifest_in_db".center(80, '-'))
         self._logger.info(f"Received event: {manifests}")
         manifest_list = []
         for manifest in manifests:
                 manifest_id = manifest.get('id')
                 manifest_list.append(manifest_id)
-        id_list = set(manifest_list)
-        attributes = self.db_session.query(DataAttributeModel.name,
-                                    DataAttributeModel.type,
-                                    DataAttributeModel.optional,
-                                    DataAttributeModel.value,
-                                    DataAttributeModel.manifest_id). \
-            filter(DataAttributeModel.manifest_id.in_(id_list)). \
-            order_by(DataAttributeModel.id.asc()).all()
+        id_list = list(set(manifest_list))
+        pool = await get_async_pool()
+        attributes = await pool.fetch(
+            f"SELECT name, type, optional, value, manifest_id FROM {_ATTRIBUTE_TABLE} "
+            "WHERE manifest_id = ANY($1::int[]) ORDER BY id ASC",
+            id_list)
         self._logger.info(attributes)
         if not attributes:
             return {}
+        attributes_by_manifest = {}
+        for attr in attributes:
+            attributes_by_manifest.setdefault(attr[4], []).append(
+                {"name": attr[0], "type": attr[1], "optional": attr[2], "value": attr[3]})
         manifest_attributes = manifests
         for m in manifest_attributes:
             m['manifest_name'] = m.get('name')
             m.pop('name')
-            m['attributes'] = [{"name": attr[0], "type": attr[1], "optional": attr[2],
-                                "value": attr[3]} for attr in attributes if attr[4] == m.get('id')]
+            m['attributes'] = attributes_by_manifest.get(m.get('id'), [])
         return manifest_attributes
 
+    async def get_manifests_with_attributes_in_db(self, project_code, manifest_name=None) -> list:
+        """
+        Get the manifests of a project with their attributes, the whole project
+        is loaded in one joined query and cached, returned items are shared
+        with the cache and must not be modified. A cached entry is served
+        without touching the database, at most once per version check
+        interval its project version stamp is compared with the database
+        so edits made through other workers are picked up
+        """
+        self._logger.info("get_manifests_with_attributes_in_db".center(80, '-'))
+        self._logger.info(f"Received event: {project_code}, {manifest_name}")
+        cached = manifest_cache.get(project_code)
+        now = time.monotonic()
+        if cached is not None and now - cached[2] < ConfigClass.MANIFEST_VERSION_CHECK_INTERVAL:
+            manifests = cached[1]
+        else:
+            pool = await get_async_pool()
+            version = await self.get_manifest_version_in_db(pool, project_code)
+            if cached is not None and cached[0] == version:
+                manifests = cached[1]
+            else:
+                query = f"SELECT m.id, m.name, a.id, a.name, a.type, a.optional, a.value " \
+                        f"FROM {_MANIFEST_TABLE} m LEFT JOIN {_ATTRIBUTE_TABLE} a ON a.manifest_id = m.id " \
+                        "WHERE m.project_code = $1 ORDER BY m.id ASC, a.id ASC"
+                rows = await pool.fetch(query, project_code)
+                self._logger.info(f"QUERY RESULT: {len(rows)} rows")
+                manifests = self.group_manifest_rows(rows)
+            manifest_cache.set(project_code, (version, manifests, now))
+        if manifest_name:
+            return [m for m in manifests if m['manifest_name'] == manifest_name]
+        return manifests
+
+    @staticmethod
+    async def get_manifest_version_in_db(pool, project_code) -> tuple:
+        """
+        Cheap stamp of the manifest definitions of a project, the row counts
+        catch deletes and the highest row xmin changes on every insert or update
+        """
+        query = f"SELECT count(*), max(xmin::text::bigint) FROM {_MANIFEST_TABLE} WHERE project_code = $1 " \
+                "UNION ALL " \
+                f"SELECT count(*), max(xmin::text::bigint) FROM {_ATTRIBUTE_TABLE} WHERE project_code = $1"
+        rows = await pool.fetch(query, project_code)
+        return tuple(tuple(row) for row in rows)
+
+    @staticmethod
+    def group_manifest_rows(rows) -> list:
+        manifests = {}
+        for row in rows:
+            manifest = manifests.get(row[0])
+            if manifest is None:
+                manifest = manifests[row[0]] = {'id': row[0], 'manifest_name': row[1], 'attributes': []}
+            if row[2] is not None:
+                manifest['attributes'].append({"name": row[3], "type": row[4], "optional": row[5],
+                                               "value": row[6]})
+        return list(manifests.values())
+
 
-    def get_dataset_versions(self, event):
+    async def get_dataset_versions(self, event):
         self._logger.info("get_dataset_versions".center(80, '-'))
         self._logger.info(f'Query event: {event}')
         dataset_geid = event.get('dataset_geid')
         dataset_versions = []
-        versions = self.db_session.query(DatasetVersionModel.dataset_code,
-                                    DatasetVersionModel.dataset_geid,
-                                    DatasetVersionModel.version,
-                                    DatasetVersionModel.created_by,
-                                    DatasetVersionModel.created_at,
-                                    DatasetVersionModel.location,
-                                    DatasetVersionModel.notes). \
-            filter_by(dataset_geid=dataset_geid). \
-            order_by(DatasetVersionModel.id.asc()).all()
+        pool = await get_async_pool()
+        versions = await pool.fetch(
+            "SELECT dataset_code, dataset_geid, version, created_by, created_at, location, notes "
+            f"FROM {_DATASET_VERSION_TABLE} WHERE dataset_geid = $1 ORDER BY id ASC",
+            dataset_geid)
         self._logger.info(f"Query result: {versions}")
         if not versions:
             return []
@@ -116,4 +169,4 @@ class RDConnection:
                     "notes": attr[6]
                     }
             dataset_versions.append(result)
-        return dataset_versions
\ No newline at end of file
+        return dataset_versions
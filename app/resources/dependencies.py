@@ -22,23 +22,28 @@ from .helpers import *
 from fastapi import Request
 import time
 import json
+import httpx
 import jwt as pyjwt
 from ..config import ConfigClass
-import httpx
+from ..commons.data_providers.http_client import get_async_client
+from ..commons.cache import TTLCache
 from ..models.base_models import APIResponse, EAPIResponseCode
 
 api_response = APIResponse()
+identity_cache = TTLCache("identity", maxsize=ConfigClass.IDENTITY_CACHE_SIZE, ttl=ConfigClass.IDENTITY_CACHE_TTL)
+permission_cache = TTLCache("permission", maxsize=ConfigClass.PERMISSION_CACHE_SIZE,
+                            ttl=ConfigClass.PERMISSION_CACHE_TTL)
 
-def get_project_role(user_id, project_code):
+async def get_project_role(user_id, project_code):
     query_payload = {"code": project_code}
-    project = get_node(query_payload, 'Container')
+    project = await get_node(query_payload, 'Container')
     if not project:
         error_msg = customized_error_template(
             ECustomizedError.PROJECT_NOT_FOUND)
         code = EAPIResponseCode.not_found
         return error_msg, code
     project_id = project.get("id")
-    role_check_result = get_user_role(user_id, project_id)
+    role_check_result = await get_user_role(user_id, project_id)
     if role_check_result:
         role = role_check_result.get("r").get('type')
         code = EAPIResponseCode.success
@@ -65,46 +70,68 @@ async def jwt_required(request: Request):
         api_response.code = EAPIResponseCode.unauthorized
         api_response.error_msg = "Token expired"
         return api_response.json_response()
-    # check if user is existed in neo4j
-    url = ConfigClass.NEO4J_SERVICE + "/v1/neo4j/nodes/User/query"
-    with httpx.Client() as client:
-        res = client.post(
-            url=url,
-            json={"name": username}
-        )
-    if res.status_code != 200:
-        api_response.code = EAPIResponseCode.forbidden
-        api_response.error_msg = "Neo4j service: " + json.loads(res.text)
-        return api_response.json_response()
-    users = res.json()
-    if not users:
-        api_response.code = EAPIResponseCode.not_found
-        api_response.error_msg = f"Neo4j service: User {username} does not exist."
-        return api_response.json_response()
-    user_id = users[0]['id']
-    role = users[0]['role']
+    # identities are cached per token lifetime, so the expiry is part of the key
+    identity_key = (username, exp)
+    identity = identity_cache.get(identity_key)
+    if identity is None:
+        # check if user is existed in neo4j
+        res = await query_user_node(username)
+        if res.status_code != 200:
+            api_response.code = EAPIResponseCode.forbidden
+            api_response.error_msg = "Neo4j service: " + json.loads(res.text)
+            return api_response.json_response()
+        users = res.json()
+        if not users:
+            api_response.code = EAPIResponseCode.not_found
+            api_response.error_msg = f"Neo4j service: User {username} does not exist."
+            return api_response.json_response()
+        identity = {"user_id": users[0]['id'], "role": users[0]['role']}
+        if username is not None:
+            identity_cache.set(identity_key, identity, ttl=exp - time.time())
     if username is None:
         api_response.code = EAPIResponseCode.not_found
         api_response.error_msg = "User not found"
         return api_response.json_response()
-    return {"code": 200, "user_id": user_id, "username": username, "role": role, "token": token}
+    return {"code": 200, "user_id": identity["user_id"], "username": username, "role": identity["role"], "token": token}
 
 
-def check_permission(event: dict):
+async def check_permission(event: dict):
     """
     event = {'user_id': user_id,
              'username': username,
              'role': role,
              'project_code': project_code,
              'zone': zone}
+    granted permissions are cached per (user_id, project_code, zone) for PERMISSION_CACHE_TTL,
+    denials are always re-evaluated as they may come from a failed upstream lookup
+    """
+    permission_key = (event.get('user_id'), event.get('project_code'), event.get('zone'))
+    permission = permission_cache.get(permission_key)
+    if permission is None:
+        permission = await evaluate_permission(event)
+        if not permission.get('error_msg'):
+            permission_cache.set(permission_key, permission)
+    return dict(permission)
+
+
+def invalidate_permission(user_id=None, project_code=None) -> int:
+    """
+    drop cached permission decisions of a user and/or a project,
+    with no argument the whole cache is dropped
     """
+    return permission_cache.invalidate_where(
+        lambda key: (user_id is None or key[0] == user_id) and
+                    (project_code is None or key[1] == project_code))
+
+
+async def evaluate_permission(event: dict):
     user_id = event.get('user_id')
     username = event.get('username')
     role = event.get('role')
     project_code = event.get('project_code')
     zone = event.get('zone')
-    project_role, code = get_project_role(user_id, project_code)
-    user_info = get_node({'name': username}, 'User')
+    project_role, code = await get_project_role(user_id, project_code)
+    user_info = await get_node({'name': username}, 'User')
     user_status = user_info.get('status')
     if user_status != 'active':
         permission = {'error_msg': customized_error_template(ECustomizedError.PERMISSION_DENIED),
@@ -140,7 +167,11 @@ def check_permission(event: dict):
     return permission
 
 
-def void_check_file_in_zone(data, file, project_code):
+async def check_file_in_zone(data, file, project_code):
+    """
+    look up a pre upload file in the entity info service, returns (exists, error_msg),
+    exists is True on 200, False on 404 and None with error_msg for any other outcome
+    """
     payload = {"type": data.type,
                "zone": data.zone,
                "file_relative_path": file.get('resumable_relative_path') + '/' +
@@ -148,23 +179,16 @@ def void_check_file_in_zone(data, file, project_code):
                "project_code": project_code
                }
     try:
-        with httpx.Client() as client:
-            result = client.get(ConfigClass.FILEINFO_HOST + f'/v1/project/{project_code}/file/exist/', params=payload)
-        result = result.json()
-    except Exception as e:
-        api_response.error_msg = f"EntityInfo service  error: {e}"
-        api_response.code = EAPIResponseCode.forbidden
-        return api_response.json_response()
-    if result['code'] in [404, 200]:
-        api_response.error_msg = "debug finding file"
-        api_response.code = EAPIResponseCode.bad_request
-        api_response.result = result
-        return api_response.json_response()
-    else:
-        api_response.error_msg = "File with that name already exists"
-        api_response.code = EAPIResponseCode.conflict
-        api_response.result = data
-        return api_response.json_response()
+        client = get_async_client()
+        response = await client.get(ConfigClass.FILEINFO_HOST + f'/v1/project/{project_code}/file/exist/',
+                                    params=payload)
+    except httpx.HTTPError as e:
+        return None, f"EntityInfo service error: {e}"
+    if response.status_code == 200:
+        return True, ''
+    elif response.status_code == 404:
+        return False, ''
+    return None, f"EntityInfo service error: {response.text}"
 
 
 def select_url_by_zone(zone):
@@ -184,7 +208,7 @@ def validate_upload_event(zone, data_type=None):
         return error_msg
 
 
-def transfer_to_pre(data, project_code, session_id):
+async def transfer_to_pre(data, project_code, session_id):
     try:
         payload = {
             "current_folder_node": data.current_folder_node,
@@ -198,8 +222,8 @@ def transfer_to_pre(data, project_code, session_id):
             "Session-ID": session_id
         }
         url = select_url_by_zone(data.zone)
-        with httpx.Client() as client:
-            result = client.post(url, headers=headers, json=payload)
+        client = get_async_client()
+        result = await client.post(url, headers=headers, json=payload)
         return result
     except Exception as e:
         api_response.error_msg = f"Upload service  error: {e}"
@@ -66,6 +66,7 @@ class ECustomizedError(enum.Enum):
     DATASET_NOT_FOUND = "DATASET_NOT_FOUND"
     INVALID_ZONE = "INVALID_ZONE"
     INVALID_VARIABLE = "INVALID_VARIABLE"
+    FILE_EXIST = "FILE_EXIST"
 
 
 def customized_error_template(customized_error: ECustomizedError):
@@ -90,7 +91,8 @@ def customized_error_template(customized_error: ECustomizedError):
         "FILE_FOLDER_ONLY": "Can only work on file or folder not in Trash Bin",
         "DATASET_NOT_FOUND": "Cannot found given dataset code",
         "INVALID_ZONE": "Invalid zone",
-        "INVALID_VARIABLE": "Invalid variable"
+        "INVALID_VARIABLE": "Invalid variable",
+        "FILE_EXIST": "File with that name already exists"
     }.get(
         customized_error.name, "Unknown Error"
     )
@@ -19,13 +19,57 @@
 # 
 
 import json
+import asyncio
 import httpx
 from ..config import ConfigClass
+from ..commons.cache import TTLCache
+from ..commons.data_providers.http_client import get_async_client
 from ..resources. error_handler import customized_error_template, ECustomizedError
 from ..models.base_models import EAPIResponseCode
 from logger import LoggerFactory
 
 _logger = LoggerFactory("Helpers").get_logger()
+folder_cache = TTLCache("folder", maxsize=ConfigClass.FOLDER_CACHE_SIZE, ttl=ConfigClass.FOLDER_CACHE_TTL)
+
+async def gather_with_concurrency(limit, coroutines):
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(coroutine):
+        async with semaphore:
+            return await coroutine
+
+    return await asyncio.gather(*[run(coroutine) for coroutine in coroutines])
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent identical lookups, the first caller of a key runs the
+    coroutine and every caller arriving while it is in flight shares its result
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.shared = 0
+        self._inflight = {}
+
+    def __contains__(self, key):
+        return key in self._inflight
+
+    async def do(self, key, func, *args, **kwargs):
+        future = self._inflight.get(key)
+        if future is None:
+            self.calls += 1
+            future = asyncio.ensure_future(func(*args, **kwargs))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.shared += 1
+        # shielded so a cancelled caller does not cancel the lookup of the others
+        return await asyncio.shield(future)
+
+
+node_flight = SingleFlight()
+
 
 def get_zone(namespace):
     return {ConfigClass.GREEN_ZONE_LABEL.lower(): ConfigClass.GREEN_ZONE_LABEL,
@@ -33,11 +77,11 @@ def get_zone(namespace):
             }.get(namespace.lower(), ConfigClass.GREEN_ZONE_LABEL.lower())
 
 
-def get_user_role(user_id, project_id):
+async def get_user_role(user_id, project_id):
     url = ConfigClass.NEO4J_SERVICE + "/v1/neo4j/relations"
     try:
-        with httpx.Client() as client:
-            res = client.get(
+        client = get_async_client()
+        res = await client.get(
             url=url,
             params={"start_id": user_id,
                     "end_id": project_id})
@@ -47,21 +91,21 @@ def get_user_role(user_id, project_id):
         return None
 
 
-def query__node_has_relation_with_admin(label='Container'):
+async def query__node_has_relation_with_admin(label='Container'):
     _logger.info("query__node_has_relation_with_admin".center(80, '-'))
     url = ConfigClass.NEO4J_SERVICE + f"/v1/neo4j/nodes/{label}/query"
     print(url)
     _logger.info(f"Requesting API: {url}")
     data = {'is_all': 'true'}
     try:
-        with httpx.Client() as client:
-            res = client.post(url=url, json=data)
+        client = get_async_client()
+        res = await client.post(url=url, json=data)
         project = res.json()
         return project
     except Exception:
         return []
 
-def query_node_has_relation_for_user(username, label='Container'):
+async def query_node_has_relation_for_user(username, label='Container'):
     _logger.info("query_node_has_relation_for_user".center(80, '-'))
     url = ConfigClass.NEO4J_SERVICE + "/v1/neo4j/relations/query"
     data = {
@@ -72,21 +116,34 @@ def query_node_has_relation_for_user(username, label='Container'):
     _logger.info(f"Requesting API: {url}")
     _logger.info(f'Query payload: {data}')
     try:
-        with httpx.Client() as client:
-            res = client.post(url=url, json=data)
+        client = get_async_client()
+        res = await client.post(url=url, json=data)
         _logger.info(f'Query response: {res.text}')
         res = res.json()
         return res
     except Exception:
         return []
     
-def get_node_by_geid(geid):
+async def query_user_node(username):
+    """
+    POST the neo4j User query for username, concurrent lookups share one request
+    """
+    return await node_flight.do(('user_query', username), _query_user_node, username)
+
+
+async def _query_user_node(username):
+    url = ConfigClass.NEO4J_SERVICE + "/v1/neo4j/nodes/User/query"
+    client = get_async_client()
+    return await client.post(url=url, json={"name": username})
+
+
+async def get_node_by_geid(geid):
     _logger.info("get_node_by_geid".center(80, '-'))
     url = ConfigClass.NEO4J_SERVICE + f"/v1/neo4j/nodes/geid/{geid}"
     _logger.info(f'Getting node: {url}')
     try:
-        with httpx.Client() as client:
-            res = client.get(url)
+        client = get_async_client()
+        res = await client.get(url)
         _logger.info(f'Getting node info: {res.text}')
         result = res.json()
     except Exception as e:
@@ -95,13 +152,13 @@ def get_node_by_geid(geid):
     return result
 
 
-def batch_query_node_by_geid(geid_list):
+async def batch_query_node_by_geid(geid_list):
     url = ConfigClass.NEO4J_SERVICE + "/v1/neo4j/nodes/query/geids"
     payload = {
         "geids": geid_list
     }
-    with httpx.Client() as client:
-        res = client.post(url, json=payload)
+    client = get_async_client()
+    res = await client.post(url, json=payload)
     res_json = res.json()
     result = res_json.get('result')
     located_geid = []
@@ -114,7 +171,7 @@ def batch_query_node_by_geid(geid_list):
     return located_geid, query_result
 
 
-def query_file_in_project(project_code, filename, zone=ConfigClass.GREEN_ZONE_LABEL):
+async def query_file_in_project(project_code, filename, zone=ConfigClass.GREEN_ZONE_LABEL):
     _logger.info("query_file_in_project".center(80, '-'))
     url = ConfigClass.NEO4J_SERVICE + "/v2/neo4j/nodes/query"
     data = {"query": {
@@ -126,8 +183,8 @@ def query_file_in_project(project_code, filename, zone=ConfigClass.GREEN_ZONE_LA
     _logger.info(f"Query url: {url}")
     try:
         _logger.info(f"Get file info payload: {data}")
-        with httpx.Client() as client:
-            res = client.post(url=url, json=data)
+        client = get_async_client()
+        res = await client.post(url=url, json=data)
         _logger.info(f"Query file response: {res.text}")
         file_res = res.json()
         _logger.info(f"file response: {file_res}")
@@ -142,8 +199,8 @@ def query_file_in_project(project_code, filename, zone=ConfigClass.GREEN_ZONE_LA
         return result
 
 
-def get_file_entity_id(project_code, file_name, zone=ConfigClass.GREEN_ZONE_LABEL):
-    res = query_file_in_project(project_code, file_name, zone)
+async def get_file_entity_id(project_code, file_name, zone=ConfigClass.GREEN_ZONE_LABEL):
+    res = await query_file_in_project(project_code, file_name, zone)
     res = res.get('result')
     if not res:
         return None
@@ -152,11 +209,11 @@ def get_file_entity_id(project_code, file_name, zone=ConfigClass.GREEN_ZONE_LABE
         return global_entity_id
 
 
-def get_file_by_id(file_id):
+async def get_file_by_id(file_id):
     post_data = {"global_entity_id": file_id}
     try:
-        with httpx.Client() as client:
-            response = client.post(ConfigClass.NEO4J_SERVICE + f"/v1/neo4j/nodes/File/query", json=post_data)
+        client = get_async_client()
+        response = await client.post(ConfigClass.NEO4J_SERVICE + f"/v1/neo4j/nodes/File/query", json=post_data)
         if not response.json():
             return None
         return response.json()[0]
@@ -164,24 +221,29 @@ def get_file_by_id(file_id):
         return None
 
 
-def get_node(post_data, label):
+async def get_node(post_data, label):
+    key = (label, json.dumps(post_data, sort_keys=True))
+    return await node_flight.do(key, _get_node, post_data, label)
+
+
+async def _get_node(post_data, label):
     try:
-        with httpx.Client() as client:
-            response = client.post(ConfigClass.NEO4J_SERVICE + f"/v1/neo4j/nodes/{label}/query", json=post_data)
+        client = get_async_client()
+        response = await client.post(ConfigClass.NEO4J_SERVICE + f"/v1/neo4j/nodes/{label}/query", json=post_data)
         if not response.json():
             return None
         return response.json()[0]
     except Exception:
         return None
 
-def get_user_projects(user_role, username):
+async def get_user_projects(user_role, username):
     _logger.info("get_user_projects".center(80, '-'))
     _logger.info(f'Current username: {username}')
     projects_list = []
     if user_role == "admin":
-        project_candidate = query__node_has_relation_with_admin()
+        project_candidate = await query__node_has_relation_with_admin()
     else:
-        projects = query_node_has_relation_for_user(username)
+        projects = await query_node_has_relation_for_user(username)
         project_candidate = []
         for p in projects:
             _logger.info(f"Found project status: {p['r']}")
@@ -201,7 +263,7 @@ def get_user_projects(user_role, username):
     return projects_list
 
 
-def attach_manifest_to_file(event):
+async def attach_manifest_to_file(event):
     project_code = event.get('project_code')
     global_entity_id = event.get('global_entity_id')
     manifest_id = event.get('manifest_id')
@@ -210,30 +272,41 @@ def attach_manifest_to_file(event):
     project_role = event.get('project_role')
     _logger.info("attach_manifest_to_file".center(80, '-'))
     url = ConfigClass.FILEINFO_HOST + "/v1/files/attributes/attach"
+    if not isinstance(global_entity_id, list):
+        global_entity_id = [global_entity_id]
     payload = {"project_code": project_code,
                "manifest_id": manifest_id,
-               "global_entity_id": [global_entity_id],
+               "global_entity_id": global_entity_id,
                "attributes": attributes,
                "inherit": True,
                "project_role": project_role,
                "username": username}
     _logger.info(f"POSTING: {url}")
     _logger.info(f"PAYLOAD: {payload}")
-    with httpx.Client() as client:
-        response = client.post(url=url, json=payload)
+    client = get_async_client()
+    response = await client.post(url=url, json=payload)
     _logger.info(f"RESPONSE: {response.text}")
     if not response.json():
         return None
     return response.json()
 
 
-def http_query_node_zone(folder_event):
+async def http_query_node_zone(folder_event):
+    """
+    successful folder lookups are cached per (project_code, zone, display_path),
+    folders that do not exist are only cached for FOLDER_NEGATIVE_CACHE_TTL.
+    The cache keeps the parsed status and body, every caller gets its own response
+    """
     namespace = folder_event.get('namespace')
     project_code = folder_event.get('project_code')
     folder_name = folder_event.get('folder_name')
     display_path = folder_event.get('display_path')
     folder_relative_path = folder_event.get('folder_relative_path')
     zone_label = get_zone(namespace)
+    cache_key = (project_code, zone_label, display_path)
+    cached = folder_cache.get(cache_key)
+    if cached is not None:
+        return httpx.Response(status_code=cached[0], json=cached[1])
     payload = {
         "query": {
             "folder_relative_path": folder_relative_path,
@@ -244,11 +317,111 @@ def http_query_node_zone(folder_event):
             "labels": ['Folder', zone_label]}
     }
     node_query_url = ConfigClass.NEO4J_SERVICE + "/v2/neo4j/nodes/query"
-    with httpx.Client() as client:
-        response = client.post(node_query_url, json=payload)
+    client = get_async_client()
+    response = await client.post(node_query_url, json=payload)
+    if response.status_code == 200:
+        body = response.json()
+        ttl = None if body.get('result') else ConfigClass.FOLDER_NEGATIVE_CACHE_TTL
+        folder_cache.set(cache_key, (response.status_code, body), ttl=ttl)
     return response
 
 
+async def _fetch_relation_nodes(payload, skip=None, limit=None):
+    url = ConfigClass.NEO4J_SERVICE + "/v1/neo4j/relations/query"
+    if limit is not None:
+        payload = {**payload, "skip": skip, "limit": limit}
+    client = get_async_client()
+    res = await client.post(url, json=payload)
+    return [f.get('end_node') for f in res.json()]
+
+
+async def _relation_paging_ignored(payload, skip, limit, nodes):
+    """
+    Tell whether a relation query came back unpaged, a result larger than
+    limit proves it, a later page is compared with a one node probe of the
+    first page since an unpaged result restarts from the first node
+    """
+    if len(nodes) > limit:
+        return True
+    if not skip or not nodes:
+        return False
+    probe = await _fetch_relation_nodes(payload, 0, 1)
+    return len(probe) > 1 or probe[:1] == nodes[:1]
+
+
+async def query_relation_nodes(payload, skip=None, limit=None):
+    """
+    Return the end nodes of a neo4j relation query, skip/limit are passed
+    upstream and also applied locally when the whole result comes back
+    """
+    nodes = await _fetch_relation_nodes(payload, skip, limit)
+    if limit is not None and await _relation_paging_ignored(payload, skip, limit, nodes):
+        nodes = nodes[skip:skip + limit]
+    return nodes
+
+
+async def iter_relation_nodes(payload, page_size):
+    """
+    Yield the end nodes of a neo4j relation query one page at a time,
+    when upstream ignores paging the whole result is yielded from the
+    first response instead of being fetched again for every page
+    """
+    skip = 0
+    first_page = None
+    while True:
+        nodes = await _fetch_relation_nodes(payload, skip, page_size)
+        if len(nodes) > page_size:
+            for node in nodes[skip:]:
+                yield node
+            break
+        # a result of exactly one page comes back again when paging is ignored
+        if first_page is None:
+            first_page = nodes
+        elif nodes == first_page:
+            break
+        for node in nodes:
+            yield node
+        if len(nodes) < page_size:
+            break
+        skip += page_size
+
+
+async def iter_relation_nodes_concurrently(payloads, page_size, concurrency):
+    """
+    Yield the end nodes of many neo4j relation queries as they are paged in,
+    at most `concurrency` queries run at once and a slow reader holds back
+    the queries through a bounded queue
+    """
+    queue = asyncio.Queue(maxsize=page_size)
+    semaphore = asyncio.Semaphore(concurrency)
+    done = object()
+
+    async def walk(payload):
+        async with semaphore:
+            async for node in iter_relation_nodes(payload, page_size):
+                await queue.put(node)
+
+    async def walk_all():
+        try:
+            await asyncio.gather(*[walk(payload) for payload in payloads])
+            result = done
+        except Exception as e:
+            result = e
+        await queue.put(result)
+
+    producer = asyncio.ensure_future(walk_all())
+    try:
+        while True:
+            node = await queue.get()
+            if node is done:
+                break
+            if isinstance(node, Exception):
+                raise node
+            yield node
+    finally:
+        producer.cancel()
+
+
 def get_parent_label(source):
     return {
         'folder': 'Folder',
@@ -280,7 +453,7 @@ def verify_list_event(source_type, folder):
     return code, error_msg
 
 
-def check_folder_exist(zone, project_code, folder):
+async def check_folder_exist(zone, project_code, folder):
     folder_check_event = {
         'namespace': zone,
         'project_code': project_code,
@@ -288,7 +461,7 @@ def check_folder_exist(zone, project_code, folder):
         'folder_name': folder.split('/')[-1],
         'folder_relative_path': '/'.join(folder.split('/')[0:-1])
     }
-    folder_response = http_query_node_zone(folder_check_event)
+    folder_response = await http_query_node_zone(folder_check_event)
     res = folder_response.json().get('result')
     if folder_response.status_code != 200:
         error_msg = folder_response.json()["error_msg"]
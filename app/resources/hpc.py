@@ -18,16 +18,183 @@
 # permissions and limitations under the Licence.
 # 
 
+import os
+import hmac
+import time
+import asyncio
+import hashlib
+import jwt as pyjwt
 from ..models.error_model import HPCError
 from logger import LoggerFactory
 from ..config import ConfigClass
 from ..models.base_models import EAPIResponseCode
-import httpx
+from ..commons.cache import TTLCache
+from ..commons.data_providers.http_client import get_async_client
+from .helpers import SingleFlight, gather_with_concurrency
 
 _logger = LoggerFactory("HPC").get_logger()
+hpc_sessions = TTLCache("hpc_session", maxsize=ConfigClass.HPC_SESSION_CACHE_SIZE,
+                        ttl=ConfigClass.HPC_SESSION_CACHE_TTL)
+hpc_inventory = TTLCache("hpc_inventory", maxsize=ConfigClass.HPC_INVENTORY_CACHE_SIZE,
+                         ttl=ConfigClass.HPC_INVENTORY_STALE_TTL)
+inventory_flight = SingleFlight()
+_refresh_tasks = set()
+hpc_tokens = TTLCache("hpc_token", maxsize=ConfigClass.HPC_TOKEN_CACHE_SIZE, ttl=ConfigClass.HPC_TOKEN_CACHE_TTL)
+token_flight = SingleFlight()
+# passwords only enter cache keys as an HMAC under a per-process secret
+_token_key_secret = os.urandom(32)
 
-def get_hpc_jwt_token(token_issuer, username, password = None):
+
+class HPCSession:
+    """
+    Parsed slurm host, protocol and auth headers of one (host, username, token),
+    requests go through the shared pooled http client
+    """
+
+    def __init__(self, host, username, token):
+        hpc_host = host.split('://')
+        if len(hpc_host) < 2:
+            raise HPCError(EAPIResponseCode.bad_request, "HPC protocal required")
+        self.host = host
+        self.username = username
+        self.token = token
+        self.slurm_host = hpc_host[1]
+        self.protocol = hpc_host[0]
+        self.headers = {
+            "Authorization": token
+        }
+        self.params = {
+            "slurm_host": self.slurm_host,
+            "username": username,
+            "protocol": self.protocol
+        }
+
+    async def get(self, path) -> dict:
+        url = ConfigClass.HPC_SERVICE + path
+        _logger.info(f"Request url: {url}")
+        _logger.info(f"Request params: {self.params}")
+        client = get_async_client()
+        res = await client.get(url, headers=self.headers, params=self.params)
+        _logger.info(f"Response: {res.text}")
+        return res.json()
+
+    async def post(self, path, payload) -> dict:
+        url = ConfigClass.HPC_SERVICE + path
+        _logger.info(f"Request url: {url}")
+        _logger.info(f"Request payload: {payload}")
+        client = get_async_client()
+        res = await client.post(url, headers=self.headers, json=payload)
+        _logger.info(f"Response: {res.text}")
+        return res.json()
+
+
+def get_hpc_session(host, username, token) -> HPCSession:
+    key = (host, username, token)
+    session = hpc_sessions.get(key)
+    if session is None:
+        session = HPCSession(host, username, token)
+        hpc_sessions.set(key, session)
+    return session
+
+
+class HPCInventory:
+    """
+    Listing response of HPC nodes or partitions with its entries indexed by name
+    """
+
+    def __init__(self, response):
+        self.response = response
+        self.fetched_at = time.monotonic()
+        result = response.get('result') if response.get('code') == 200 else None
+        self.index = {}
+        for entry in result if isinstance(result, list) else []:
+            if isinstance(entry, dict):
+                for name in entry:
+                    self.index[name] = entry
+
+    def lookup(self, name):
+        entry = self.index.get(name)
+        return [entry] if entry is not None else None
+
+
+async def _load_inventory(key, session, kind) -> HPCInventory:
+    inventory = HPCInventory(await session.get(f"/v1/hpc/{kind}"))
+    if inventory.response.get('code') == 200:
+        hpc_inventory.set(key, inventory)
+    return inventory
+
+
+async def _refresh_inventory(key, session, kind):
+    try:
+        await inventory_flight.do(key, _load_inventory, key, session, kind)
+    except Exception as e:
+        _logger.error(f"Error refreshing HPC {kind} inventory: {e}")
+
+
+async def get_hpc_inventory(session, kind) -> HPCInventory:
+    """
+    nodes or partitions listing of a session, served from cache for HPC_INVENTORY_TTL,
+    then served stale while one background refresh runs until HPC_INVENTORY_STALE_TTL
+    """
+    key = (session.host, session.username, session.token, kind)
+    inventory = hpc_inventory.get(key)
+    if inventory is None:
+        return await inventory_flight.do(key, _load_inventory, key, session, kind)
+    if time.monotonic() - inventory.fetched_at > ConfigClass.HPC_INVENTORY_TTL and key not in inventory_flight:
+        task = asyncio.ensure_future(_refresh_inventory(key, session, kind))
+        _refresh_tasks.add(task)
+        task.add_done_callback(_refresh_tasks.discard)
+    return inventory
+
+
+async def lookup_hpc_inventory(session, kind, name):
+    """
+    entry of name in the inventory listing, None when the listing is unavailable
+    or does not contain it
+    """
+    try:
+        inventory = await get_hpc_inventory(session, kind)
+    except Exception as e:
+        _logger.error(f"Error getting HPC {kind} inventory: {e}")
+        return None
+    return inventory.lookup(name)
+
+
+def _token_cache_key(token_issuer, username, password):
+    digest = hmac.new(_token_key_secret, (password or '').encode(), hashlib.sha256).hexdigest()
+    return (token_issuer, username, digest)
+
+
+def _token_lifetime(token) -> float:
+    """
+    seconds until HPC_TOKEN_EXPIRY_MARGIN before the token expiry,
+    0 when the expiry cannot be decoded
+    """
+    raw_token = token.get('token') if isinstance(token, dict) else token
+    try:
+        exp = pyjwt.decode(raw_token, verify=False).get('exp')
+    except Exception:
+        return 0
+    if not exp:
+        return 0
+    return exp - time.time() - ConfigClass.HPC_TOKEN_EXPIRY_MARGIN
+
+
+async def get_hpc_jwt_token(token_issuer, username, password = None):
+    """
+    issued tokens are cached per (token_issuer, username, password) until shortly
+    before they expire, concurrent identical requests share one auth call
+    """
     _logger.info("get_hpc_jwt_token".center(80, '-'))
+    key = _token_cache_key(token_issuer, username, password)
+    token = hpc_tokens.get(key)
+    if token is not None:
+        _logger.info(f"Reusing HPC token of {username} from {token_issuer}")
+        return token
+    return await token_flight.do(key, _request_hpc_jwt_token, key, token_issuer, username, password)
+
+
+async def _request_hpc_jwt_token(key, token_issuer, username, password):
     try:
         payload = {
             "token_issuer": token_issuer,
@@ -36,54 +203,39 @@ def get_hpc_jwt_token(token_issuer, username, password = None):
             }
         url = ConfigClass.HPC_SERVICE + "/v1/hpc/auth"
         _logger.info(f"Request url: {url}")
-        _logger.info(f"Request payload: {payload}")
-        with httpx.Client() as client:
-            res = client.post(url, json=payload)
-        _logger.info(f"Response: {res.text}")
-        _logger.info(f"Response: {res.json()}")
+        _logger.info(f"Request token of {username} from {token_issuer}")
+        client = get_async_client()
+        res = await client.post(url, json=payload)
+        _logger.info(f"Response status: {res.status_code}")
         token = res.json().get('result')
+        if token:
+            hpc_tokens.set(key, token, ttl=_token_lifetime(token))
     except Exception as e:
         _logger.error(e)
         token = ''
     finally:
         return token
 
-def submit_hpc_job(job_submission_event) -> dict:
+async def submit_hpc_job(job_submission_event) -> dict:
     _logger.info("submit_hpc_job".center(80, '-'))
     try:
-        _logger.info(f"Received event: {job_submission_event}")
-        token = job_submission_event.token
-        host = job_submission_event.host
-        username = job_submission_event.username
+        _logger.info(f"Received job of {job_submission_event.username} for {job_submission_event.host}")
         job_info = job_submission_event.job_info
         job_script = job_info.get('script', '')
-        hpc_host = host.split('://')
-        if len(hpc_host) < 2:
-            raise HPCError(EAPIResponseCode.bad_request, "HPC protocal required")
-        slurm_host = hpc_host[1]
-        protocol_type = hpc_host[0]
+        session = get_hpc_session(job_submission_event.host, job_submission_event.username,
+                                  job_submission_event.token)
         _logger.info(f"Request job script: {job_script}")
         if not job_script:
             status_code = EAPIResponseCode.bad_request
             error_msg = 'Missing script'
             raise HPCError(status_code, error_msg)
-        url = ConfigClass.HPC_SERVICE + "/v1/hpc/job"
-        headers = {
-            "Authorization": token
-        }
         payload = {
-            "slurm_host": slurm_host,
-            "username": username,
+            "slurm_host": session.slurm_host,
+            "username": session.username,
             "job_info": job_info,
-            'protocol': protocol_type
+            'protocol': session.protocol
         }
-        _logger.info(f"Request url: {url}")
-        _logger.info(f"Request headers: {headers}")
-        _logger.info(f"Request payload: {payload}")
-        with httpx.Client() as client:
-            res = client.post(url, headers=headers, json=payload)
-        _logger.info(f"Response: {res.json()}")
-        response = res.json()
+        response = await session.post("/v1/hpc/job", payload)
         status_code = response.get('code')
         if status_code == 200:
             result = response.get('result')
@@ -103,31 +255,12 @@ def submit_hpc_job(job_submission_event) -> dict:
         _logger.error(e)
         raise e
 
-def get_hpc_job_info(job_id, host, username, token) -> dict:
+async def get_hpc_job_info(job_id, host, username, token) -> dict:
     _logger.info("get_hpc_job_info".center(80, '-'))
     try:
-        hpc_host = host.split('://')
-        if len(hpc_host) < 2:
-            raise HPCError(EAPIResponseCode.bad_request, "HPC protocal required")
-        slurm_host = hpc_host[1]
-        protocol_type = hpc_host[0]
+        session = get_hpc_session(host, username, token)
         _logger.info(f"Received job_id: {job_id}")
-        url = ConfigClass.HPC_SERVICE + f"/v1/hpc/job/{job_id}"
-        headers = {
-            "Authorization": token
-        }
-        params = {
-            "slurm_host": slurm_host,
-            "username": username,
-            "protocol": protocol_type
-        }
-        _logger.info(f"Request url: {url}")
-        _logger.info(f"Request headers: {headers}")
-        _logger.info(f"Request params: {params}")
-        with httpx.Client() as client:
-            res = client.get(url, headers=headers, params=params)
-        _logger.info(f"Response: {res.text}")
-        response = res.json()
+        response = await session.get(f"/v1/hpc/job/{job_id}")
         status_code = response.get('code')
         if status_code == 200:
             result = response.get('result')
@@ -148,32 +281,42 @@ def get_hpc_job_info(job_id, host, username, token) -> dict:
         _logger.error(e)
         raise e
 
-def get_hpc_nodes(host, username, hpc_token) -> dict:
+async def get_hpc_jobs_status(job_ids, host, username, token) -> dict:
+    """
+    job_id -> {code, job_state, error_msg} of every job, fetched concurrently
+    up to HPC_JOB_STATUS_CONCURRENCY, a failed job does not fail the others
+    """
+    _logger.info("get_hpc_jobs_status".center(80, '-'))
+    get_hpc_session(host, username, token)
+    job_ids = list(dict.fromkeys(str(job_id) for job_id in job_ids))
+    _logger.info(f"Received {len(job_ids)} job ids")
+
+    async def job_status(job_id):
+        try:
+            information = await get_hpc_job_info(job_id, host, username, token)
+            return {"code": EAPIResponseCode.success.value,
+                    "job_state": information.get('job_state') if information else None,
+                    "error_msg": ""}
+        except HPCError as e:
+            return {"code": e.code.value if isinstance(e.code, EAPIResponseCode) else e.code,
+                    "job_state": None,
+                    "error_msg": e.message}
+        except Exception as e:
+            return {"code": EAPIResponseCode.internal_error.value,
+                    "job_state": None,
+                    "error_msg": str(e)}
+
+    statuses = await gather_with_concurrency(ConfigClass.HPC_JOB_STATUS_CONCURRENCY,
+                                             [job_status(job_id) for job_id in job_ids])
+    return dict(zip(job_ids, statuses))
+
+async def get_hpc_nodes(host, username, hpc_token) -> dict:
     _logger.info("get_hpc_nodes".center(80, '-'))
     try:
         _logger.info(f"Received host: {host}")
         _logger.info(f"Received username: {username}")
-        hpc_host = host.split('://')
-        if len(hpc_host) < 2:
-            raise HPCError(EAPIResponseCode.bad_request, "HPC protocal required")
-        slurm_host = hpc_host[1]
-        protocol_type = hpc_host[0]
-        url = ConfigClass.HPC_SERVICE + f"/v1/hpc/nodes"
-        headers = {
-            "Authorization": hpc_token
-        }
-        params = {
-            "slurm_host": slurm_host,
-            "username": username,
-            "protocol": protocol_type
-        }
-        _logger.info(f"Request url: {url}")
-        _logger.info(f"Request headers: {headers}")
-        _logger.info(f"Request params: {params}")
-        with httpx.Client() as client:
-            res = client.get(url, headers=headers, params=params)
-        _logger.info(f"Response: {res.text}")
-        response = res.json()
+        session = get_hpc_session(host, username, hpc_token)
+        response = (await get_hpc_inventory(session, "nodes")).response
         status_code = response.get('code')
         if status_code == 200:
             result = response.get('result')
@@ -186,33 +329,17 @@ def get_hpc_nodes(host, username, hpc_token) -> dict:
         _logger.error(e)
         raise e
 
-def get_hpc_node_by_name(host, username, hpc_token, node_name) -> dict:
+async def get_hpc_node_by_name(host, username, hpc_token, node_name) -> dict:
     _logger.info("get_hpc_node_by_name".center(80, '-'))
     try:
         _logger.info(f"Received host: {host}")
         _logger.info(f"Received username: {username}")
         _logger.info(f"Received nodename: {node_name}")
-        hpc_host = host.split('://')
-        if len(hpc_host) < 2:
-            raise HPCError(EAPIResponseCode.bad_request, "HPC protocal required")
-        slurm_host = hpc_host[1]
-        protocol_type = hpc_host[0]
-        url = ConfigClass.HPC_SERVICE + f"/v1/hpc/nodes/{node_name}"
-        headers = {
-            "Authorization": hpc_token
-        }
-        params = {
-            "slurm_host": slurm_host,
-            "username": username,
-            "protocol": protocol_type
-        }
-        _logger.info(f"Request url: {url}")
-        _logger.info(f"Request headers: {headers}")
-        _logger.info(f"Request params: {params}")
-        with httpx.Client() as client:
-            res = client.get(url, headers=headers, params=params)
-        _logger.info(f"Response: {res.text}")
-        response = res.json()
+        session = get_hpc_session(host, username, hpc_token)
+        node = await lookup_hpc_inventory(session, "nodes", node_name)
+        if node is not None:
+            return node
+        response = await session.get(f"/v1/hpc/nodes/{node_name}")
         status_code = response.get('code')
         if status_code == 200:
             result = response.get('result')
@@ -230,32 +357,13 @@ def get_hpc_node_by_name(host, username, hpc_token, node_name) -> dict:
         _logger.error(e)
         raise e
 
-def get_hpc_partitions(host, username, hpc_token) -> dict:
+async def get_hpc_partitions(host, username, hpc_token) -> dict:
     _logger.info("get_hpc_partitions".center(80, '-'))
     try:
         _logger.info(f"Received host: {host}")
         _logger.info(f"Received username: {username}")
-        hpc_host = host.split('://')
-        if len(hpc_host) < 2:
-            raise HPCError(EAPIResponseCode.bad_request, "HPC protocal required")
-        slurm_host = hpc_host[1]
-        protocol_type = hpc_host[0]
-        url = ConfigClass.HPC_SERVICE + f"/v1/hpc/partitions"
-        headers = {
-            "Authorization": hpc_token
-        }
-        params = {
-            "slurm_host": slurm_host,
-            "username": username,
-            "protocol": protocol_type
-        }
-        _logger.info(f"Request url: {url}")
-        _logger.info(f"Request headers: {headers}")
-        _logger.info(f"Request params: {params}")
-        with httpx.Client() as client:
-            res = client.get(url, headers=headers, params=params)
-        _logger.info(f"Response: {res.text}")
-        response = res.json()
+        session = get_hpc_session(host, username, hpc_token)
+        response = (await get_hpc_inventory(session, "partitions")).response
         status_code = response.get('code')
         if status_code == 200:
             result = response.get('result')
@@ -273,33 +381,17 @@ def get_hpc_partitions(host, username, hpc_token) -> dict:
         _logger.error(e)
         raise e
 
-def get_hpc_partition_by_name(host, username, hpc_token, partition_name) -> dict:
+async def get_hpc_partition_by_name(host, username, hpc_token, partition_name) -> dict:
     _logger.info("get_hpc_partition_by_name".center(80, '-'))
     try:
         _logger.info(f"Received host: {host}")
         _logger.info(f"Received username: {username}")
         _logger.info(f"Received partition_name: {partition_name}")
-        hpc_host = host.split('://')
-        if len(hpc_host) < 2:
-            raise HPCError(EAPIResponseCode.bad_request, "HPC protocal required")
-        slurm_host = hpc_host[1]
-        protocol_type = hpc_host[0]
-        url = ConfigClass.HPC_SERVICE + f"/v1/hpc/partitions/{partition_name}"
-        headers = {
-            "Authorization": hpc_token
-        }
-        params = {
-            "slurm_host": slurm_host,
-            "username": username,
-            "protocol": protocol_type
-        }
-        _logger.info(f"Request url: {url}")
-        _logger.info(f"Request headers: {headers}")
-        _logger.info(f"Request params: {params}")
-        with httpx.Client() as client:
-            res = client.get(url, headers=headers, params=params)
-        _logger.info(f"Response: {res.text}")
-        response = res.json()
+        session = get_hpc_session(host, username, hpc_token)
+        partition = await lookup_hpc_inventory(session, "partitions", partition_name)
+        if partition is not None:
+            return partition
+        response = await session.get(f"/v1/hpc/partitions/{partition_name}")
         status_code = response.get('code')
         if status_code == 200:
             result = response.get('result')
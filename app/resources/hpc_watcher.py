@@ -0,0 +1,180 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+import time
+import asyncio
+from collections import Counter
+from logger import LoggerFactory
+from ..config import ConfigClass
+from .hpc import get_hpc_session, get_hpc_jobs_status
+
+_logger = LoggerFactory("HPCWatcher").get_logger()
+
+TERMINAL_JOB_STATES = frozenset([
+    "COMPLETED", "FAILED", "CANCELLED", "TIMEOUT", "NODE_FAIL",
+    "PREEMPTED", "OUT_OF_MEMORY", "BOOT_FAIL", "DEADLINE"
+])
+
+_watchers = {}
+
+
+def is_terminal(status) -> bool:
+    return status["code"] != 200 or status["job_state"] in TERMINAL_JOB_STATES
+
+
+class JobWatcher:
+    """
+    Background poller of the watched jobs of one (host, username, token),
+    all watched jobs are queried in one batch per round and the round interval
+    backs off while no state changes, waiters are woken on state transitions
+    """
+
+    def __init__(self, host, username, token):
+        self.key = (host, username, token)
+        self.host = host
+        self.username = username
+        self.token = token
+        self.states = {}
+        self.polls = 0
+        self._interest = {}
+        self._waiting = Counter()
+        self._changed = asyncio.Condition()
+        self._wake = asyncio.Event()
+        self._task = None
+
+    @staticmethod
+    def next_interval(interval, changed) -> float:
+        if changed:
+            return ConfigClass.HPC_WATCH_MIN_INTERVAL
+        return min(interval * ConfigClass.HPC_WATCH_BACKOFF, ConfigClass.HPC_WATCH_MAX_INTERVAL)
+
+    def _touch(self, job_ids) -> bool:
+        now = time.monotonic()
+        new_job = False
+        for job_id in job_ids:
+            new_job = new_job or job_id not in self._interest
+            self._interest[job_id] = now
+        return new_job
+
+    def watch(self, job_ids):
+        """
+        keep job_ids polled for HPC_WATCH_IDLE_TTL, new jobs are polled right away
+        """
+        if self._touch(job_ids):
+            self._wake.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    def _active_jobs(self) -> list:
+        expire = time.monotonic() - ConfigClass.HPC_WATCH_IDLE_TTL
+        return [job_id for job_id, seen in self._interest.items()
+                if (self._waiting[job_id] or seen > expire)
+                and not (job_id in self.states and is_terminal(self.states[job_id]))]
+
+    def _diff(self, job_ids, known) -> dict:
+        return {job_id: self.states[job_id] for job_id in job_ids
+                if job_id in self.states
+                and (self.states[job_id]["code"] != 200 or self.states[job_id]["job_state"] != known.get(job_id))}
+
+    async def wait_for_change(self, job_ids, known: dict, timeout: float) -> dict:
+        """
+        states of job_ids whose job_state differs from known, waits up to
+        timeout for a transition and returns {} if none happened
+        """
+        self.watch(job_ids)
+        self._waiting.update(job_ids)
+        try:
+            async with self._changed:
+                try:
+                    await asyncio.wait_for(self._changed.wait_for(lambda: self._diff(job_ids, known)), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                return self._diff(job_ids, known)
+        finally:
+            self._waiting.subtract(job_ids)
+            self._touch(job_ids)
+
+    async def _poll(self, job_ids) -> bool:
+        statuses = await get_hpc_jobs_status(job_ids, self.host, self.username, self.token)
+        self.polls += 1
+        changed = False
+        for job_id, status in statuses.items():
+            # transient upstream errors keep the last known state
+            if status["code"] not in (200, 404):
+                _logger.info(f"Job {job_id} status error: {status['error_msg']}")
+                continue
+            if status != self.states.get(job_id):
+                self.states[job_id] = status
+                changed = True
+        if changed:
+            async with self._changed:
+                self._changed.notify_all()
+        return changed
+
+    async def _run(self):
+        interval = ConfigClass.HPC_WATCH_MIN_INTERVAL
+        try:
+            while True:
+                job_ids = self._active_jobs()
+                if not job_ids:
+                    break
+                self._wake.clear()
+                try:
+                    changed = await self._poll(job_ids)
+                except Exception as e:
+                    _logger.error(f"Error polling HPC jobs of {self.username}: {e}")
+                    changed = False
+                interval = self.next_interval(interval, changed)
+                try:
+                    await asyncio.wait_for(self._wake.wait(), interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            if _watchers.get(self.key) is self:
+                del _watchers[self.key]
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+
+
+def get_job_watcher(host, username, token) -> JobWatcher:
+    get_hpc_session(host, username, token)
+    key = (host, username, token)
+    watcher = _watchers.get(key)
+    if watcher is None:
+        watcher = _watchers[key] = JobWatcher(host, username, token)
+    return watcher
+
+
+async def stop_job_watchers():
+    watchers = list(_watchers.values())
+    for watcher in watchers:
+        watcher.stop()
+    await asyncio.gather(*[watcher._task for watcher in watchers if watcher._task], return_exceptions=True)
+    _watchers.clear()
+
+
+def job_watcher_stats() -> dict:
+    return {
+        "watchers": len(_watchers),
+        "watched_jobs": sum(len(watcher._active_jobs()) for watcher in _watchers.values()),
+        "polls": sum(watcher.polls for watcher in _watchers.values())
+    }
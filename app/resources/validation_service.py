@@ -21,16 +21,41 @@
 from ..resources. error_handler import customized_error_template, ECustomizedError
 from ..models.error_model import InvalidEncryptionError
 from .database_service import RDConnection
+from ..commons.cache import TTLCache
 from .helpers import *
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from cryptography.fernet import Fernet
+from functools import lru_cache
 import base64
 from logger import LoggerFactory
 
 
 _logger = LoggerFactory("validation_service").get_logger()
+compiled_manifest_cache = TTLCache("compiled_manifest", maxsize=ConfigClass.MANIFEST_CACHE_SIZE * 4,
+                                   ttl=ConfigClass.MANIFEST_CACHE_TTL)
+
+
+@lru_cache(maxsize=8)
+def derive_fernet(secret):
+    """
+    derive the Fernet cipher for the given secret, the 100,000 iteration KDF
+    only runs once per secret
+    secret: the string type secret key used as salt
+    return: Fernet instance
+    """
+    kdf = PBKDF2HMAC(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=base64.b64decode(secret),
+        iterations=100000,
+        backend=default_backend()
+    )
+    # use the key from current device information
+    key = base64.urlsafe_b64encode(kdf.derive('SECRETKEYPASSWORD'.encode()))
+    return Fernet(key)
+
 
 def decryption(encrypted_message, secret):
     """
@@ -40,74 +65,107 @@ def decryption(encrypted_message, secret):
     return: string of the message
     """
     try:
-        kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=base64.b64decode(secret),
-            iterations=100000,
-            backend=default_backend()
-        )
-        # use the key from current device information
-        key = base64.urlsafe_b64encode(kdf.derive('SECRETKEYPASSWORD'.encode()))
-        f = Fernet(key)
+        f = derive_fernet(secret)
         decrypted = f.decrypt(base64.b64decode(encrypted_message))
         return decrypted.decode()
     except Exception as e:
         raise InvalidEncryptionError("Invalid encryption, could not decrypt message")
 
+class CompiledManifest:
+    """
+    Manifest definition prepared once for validation, attribute names are
+    kept in a set and multiple choice values are split ahead of time
+    """
+
+    def __init__(self, exist_attributes: list):
+        self.names = frozenset(attr.get('name') for attr in exist_attributes)
+        self.rules = []
+        for attr in exist_attributes:
+            choices = None
+            if attr.get('type') == 'multiple_choice':
+                choices = frozenset((attr.get('value') or '').split(","))
+            self.rules.append((attr.get('name'), attr.get('optional'), attr.get('type'), choices))
+
+    def iter_errors(self, input_attributes: dict):
+        """
+        yield the validation errors of input_attributes in the order
+        they are reported, the first one is the validation result
+        """
+        for key in input_attributes:
+            if key not in self.names:
+                yield customized_error_template(ECustomizedError.INVALID_ATTRIBUTE) % key
+        for name, optional, attr_type, choices in self.rules:
+            if name not in input_attributes:
+                if not optional:
+                    yield customized_error_template(ECustomizedError.MISSING_REQUIRED_ATTRIBUTES) % name
+                    continue
+                value = None
+            else:
+                value = input_attributes[name]
+            if value and attr_type == "text":
+                if len(value) > 100:
+                    yield customized_error_template(ECustomizedError.TEXT_TOO_LONG) % name
+            elif value and attr_type == 'multiple_choice':
+                try:
+                    valid_choice = value in choices
+                except TypeError:
+                    valid_choice = False
+                if not valid_choice:
+                    yield customized_error_template(ECustomizedError.INVALID_CHOICE) % name
+            elif not optional:
+                yield customized_error_template(ECustomizedError.FIELD_REQUIRED) % name
+
+    def validate(self, input_attributes: dict):
+        return next(self.iter_errors(input_attributes), None)
+
+
+def validate_manifest_entries(compiled: CompiledManifest, entries: list) -> list:
+    """
+    validate every entry against the compiled manifest and
+    collect all errors of each entry
+    """
+    results = []
+    for entry in entries:
+        errors = list(compiled.iter_errors(entry.get('attributes') or {}))
+        results.append({"file": entry.get('file'), "valid": not errors, "errors": errors})
+    return results
+
+
 class ManifestValidator:
 
-    def __init__(self):
-        self.db = RDConnection()
+    def __init__(self, db: RDConnection):
+        self.db = db
 
-    @staticmethod
-    def validate_has_non_optional_attribute_field(input_attributes, compare_attr):
-        if not compare_attr.get('optional') and not compare_attr.get('name') in input_attributes:
-            return customized_error_template(ECustomizedError.MISSING_REQUIRED_ATTRIBUTES)
+    async def get_compiled_manifest(self, project_code, manifest_name):
+        """
+        return the compiled validator of a manifest or None when the project
+        has no such manifest, the manifest is looked up once
+        """
+        exist_manifest = await self.db.get_manifests_with_attributes_in_db(project_code, manifest_name)
+        _logger.info(f"existing manifest: {exist_manifest}")
+        if not exist_manifest:
+            return None
+        return self.compile_manifest(project_code, exist_manifest[0])
 
     @staticmethod
-    def validate_attribute_field_by_value(input_attributes, compare_attr):
-        attr_name = compare_attr.get('name')
-        value = input_attributes.get(attr_name)
-        if value and compare_attr.get('type') == "text":
-            if len(value) > 100:
-                return customized_error_template(ECustomizedError.TEXT_TOO_LONG) % attr_name
-        elif value and compare_attr.get('type') == 'multiple_choice':
-            if value not in compare_attr.get('value').split(","):
-                return customized_error_template(ECustomizedError.INVALID_CHOICE) % attr_name
-        else:
-            if not compare_attr.get('optional'):
-                return customized_error_template(ECustomizedError.FIELD_REQUIRED) % attr_name
+    def compile_manifest(project_code, manifest):
+        """
+        return the compiled validator of a manifest definition, it is rebuilt
+        when the cached manifest definition it was compiled from is replaced
+        """
+        key = (project_code, manifest.get('id'))
+        cached = compiled_manifest_cache.get(key)
+        if cached is not None and cached[0] is manifest:
+            return cached[1]
+        compiled = CompiledManifest(manifest.get('attributes'))
+        compiled_manifest_cache.set(key, (manifest, compiled))
+        return compiled
 
-    @staticmethod
-    def validate_attribute_name(input_attributes, exist_attributes):
-        _logger.info("validate attribute name")
-        valid_attributes = [attr.get('name') for attr in exist_attributes]
-        for key, value in input_attributes.items():
-            if key not in valid_attributes:
-                return customized_error_template(ECustomizedError.INVALID_ATTRIBUTE) % key
-
-    def has_valid_attributes(self, event):
+    async def has_valid_attributes(self, event):
         _logger.info(f"received event: {event}")
-        attributes = event.get('attributes')
         manifest = event.get('manifest')
-        exist_manifest = self.db.get_attributes_in_manifest_in_db(manifest)
-        _logger.info(f"existing manifest: {exist_manifest}")
-        exist_attributes = exist_manifest[0].get('attributes')
-        _name_error = self.validate_attribute_name(attributes, exist_attributes)
-        _logger.info(f"validation name error: {_name_error}")
-        if _name_error:
-            return _name_error
-        for attr in exist_attributes:
-            required_attr = attr.get('name')
-            if not attr.get('optional') and required_attr not in attributes:
-                return customized_error_template(ECustomizedError.MISSING_REQUIRED_ATTRIBUTES) % required_attr
-            elif attr not in exist_attributes:
-                return customized_error_template(ECustomizedError.INVALID_ATTRIBUTE) % attr
-            else:
-                _optional_error = self.validate_has_non_optional_attribute_field(attributes, attr)
-                if _optional_error:
-                    return _optional_error
-                _value_error = self.validate_attribute_field_by_value(attributes, attr)
-                if _value_error:
-                    return _value_error
\ No newline at end of file
+        if manifest is not None:
+            compiled = self.compile_manifest(event.get('project_code'), manifest)
+        else:
+            compiled = await self.get_compiled_manifest(event.get('project_code'), event.get('manifest_name'))
+        return compiled.validate(event.get('attributes'))
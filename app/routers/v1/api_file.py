@@ -18,15 +18,17 @@
 # permissions and limitations under the Licence.
 # 
 
+import json
 from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
 from fastapi_utils.cbv import cbv
 from ...models.file_models import QueryDataInfoResponse, QueryDataInfo, GetProjectFileListResponse
 from ...resources.error_handler import catch_internal, customized_error_template, ECustomizedError, EAPIResponseCode
 from ...resources.dependencies import jwt_required, check_permission
-from ...resources.helpers import batch_query_node_by_geid, verify_list_event, separate_rel_path, get_zone, get_parent_label, check_folder_exist
+from ...resources.helpers import batch_query_node_by_geid, verify_list_event, separate_rel_path, get_zone, get_parent_label, check_folder_exist, \
+    query_relation_nodes, iter_relation_nodes, iter_relation_nodes_concurrently
 from ...config import ConfigClass
 from logger import LoggerFactory
-import httpx
 
 router = APIRouter()
 _API_TAG = 'V1 files'
@@ -60,7 +62,8 @@ class APIFile:
         self._logger.info(f"Received information geid: {geid_list}")
         self._logger.info(f"User request with identity: {self.current_identity}")
         response_list = []
-        located_geid, query_result = batch_query_node_by_geid(geid_list)
+        permissions = {}
+        located_geid, query_result = await batch_query_node_by_geid(geid_list)
         for global_entity_id in geid_list:
             self._logger.info(f'Query geid: {global_entity_id}')
             if global_entity_id not in located_geid:
@@ -87,14 +90,17 @@ class APIFile:
                 zone = ConfigClass.CORE_ZONE_LABEL if ConfigClass.CORE_ZONE_LABEL in labels \
                     else ConfigClass.GREEN_ZONE_LABEL
                 self._logger.info(f'File zone: {zone}')
-                permission_event = {'user_id': user_id,
-                                    'username': user_name,
-                                    'role': role,
-                                    'project_code': project_code,
-                                    'zone': zone}
-                permission = check_permission(permission_event)
-                self._logger.info(f"Permission check event: {permission_event}")
-                self._logger.info(f"Permission check result: {permission}")
+                permission = permissions.get((project_code, zone))
+                if permission is None:
+                    permission_event = {'user_id': user_id,
+                                        'username': user_name,
+                                        'role': role,
+                                        'project_code': project_code,
+                                        'zone': zone}
+                    permission = await check_permission(permission_event)
+                    permissions[(project_code, zone)] = permission
+                    self._logger.info(f"Permission check event: {permission_event}")
+                    self._logger.info(f"Permission check result: {permission}")
                 error_msg = permission.get('error_msg', '')
                 uploader = permission.get('uploader')
                 if error_msg:
@@ -118,9 +124,13 @@ class APIFile:
                 response_model=GetProjectFileListResponse,
                 summary="Get files and folders in the project/folder")
     @catch_internal(_API_NAMESPACE)
-    async def get_file_folders(self, project_code, zone, folder, source_type):
+    async def get_file_folders(self, project_code, zone, folder, source_type,
+                               page: int = 1, page_size: int = None, cursor: str = None, stream: bool = False,
+                               recursive: bool = False, max_depth: int = None):
         """
-        List files and folders in project
+        List files and folders in project, page_size enables paging with page or
+        the returned next_cursor, stream returns the nodes as NDJSON and recursive
+        streams the whole tree below the folder down to max_depth levels
         """
         file_response = GetProjectFileListResponse()
         try:
@@ -135,6 +145,11 @@ class APIFile:
                           f"folder: {folder}, source_type: {source_type}")
         self._logger.info(f"User request with identity: {self.current_identity}")
         self._logger.info(f"Verified list event: {code}, {error_msg}")
+        if not error_msg and ((cursor and not cursor.isdigit()) or page < 1 or
+                              (page_size is not None and page_size < 1) or
+                              (max_depth is not None and max_depth < 1)):
+            code = EAPIResponseCode.bad_request
+            error_msg = customized_error_template(ECustomizedError.INVALID_VARIABLE)
         if error_msg:
             file_response.error_msg = error_msg
             file_response.code = code
@@ -146,7 +161,7 @@ class APIFile:
                             'role': role,
                             'project_code': project_code,
                             'zone': zone}
-        permission = check_permission(permission_event)
+        permission = await check_permission(permission_event)
         self._logger.info(f"Permission check event: {permission_event}")
         self._logger.info(f"Permission check result: {permission}")
         error_msg = permission.get('error_msg', '')
@@ -181,7 +196,7 @@ class APIFile:
                                 'name': folder_name,
                                 'folder_relative_path': rel_path}
         if source_type == 'Folder':
-            code, error_msg = check_folder_exist(zone, project_code, folder)
+            code, error_msg = await check_folder_exist(zone, project_code, folder)
             self._logger.info(f"Check folder exist payload: 'zone':{zone}, 'project_code':{project_code}, 'folder_name':{folder_name}, 'rel_path':{rel_path}")
             self._logger.info(f"Check folder exist response: {code}, {error_msg}")
             self._logger.debug(
@@ -204,20 +219,25 @@ class APIFile:
                 self._logger.error(f'Returning subfolder not in correct name folder error: {EAPIResponseCode.forbidden}, '
                                    f'{customized_error_template(ECustomizedError.PERMISSION_DENIED)}')
                 return file_response.json_response()
-        url = ConfigClass.NEO4J_SERVICE + "/v1/neo4j/relations/query"
         payload = {"start_label": parent_label,
                    "start_params": parent_attribute,
                    "end_label": zone_label,
                    "end_params": child_attribute}
         self._logger.info(f"Query file/folder payload: {payload}")
-        self._logger.info(f"Query file/folder API: {url}")
+        if recursive:
+            depth = min(max_depth or ConfigClass.FILE_TREE_MAX_DEPTH, ConfigClass.FILE_TREE_MAX_DEPTH)
+            return StreamingResponse(self._stream_tree(payload, project_code, zone_type, depth),
+                                     media_type="application/x-ndjson")
+        if stream:
+            return StreamingResponse(self._stream_nodes(payload), media_type="application/x-ndjson")
         try:
-            with httpx.Client() as client:
-                res = client.post(url, json=payload)
-            res = res.json()
-            query_result = []
-            for f in res:
-                query_result.append(f.get('end_node'))
+            if page_size:
+                skip = int(cursor) if cursor else (page - 1) * page_size
+                query_result = await query_relation_nodes(payload, skip, page_size)
+                if len(query_result) == page_size:
+                    file_response.next_cursor = str(skip + page_size)
+            else:
+                query_result = await query_relation_nodes(payload)
             file_response.result = query_result
             file_response.code = EAPIResponseCode.success
             return file_response.json_response()
@@ -226,3 +246,39 @@ class APIFile:
             file_response.error_msg = str(e)
             file_response.code = EAPIResponseCode.internal_error
             return file_response.json_response()
+
+    async def _stream_nodes(self, payload):
+        try:
+            async for node in iter_relation_nodes(payload, ConfigClass.FILE_LIST_STREAM_PAGE_SIZE):
+                yield json.dumps(node) + "\n"
+        except Exception as e:
+            self._logger.error(f"Error streaming files: {str(e)}")
+            yield json.dumps({"error_msg": str(e)}) + "\n"
+
+    async def _stream_tree(self, payload, project_code, zone_type, max_depth):
+        """
+        Walk the folder tree level by level, the folders of a level are paged
+        through concurrently and their children streamed as they arrive
+        """
+        try:
+            level = [payload]
+            for depth in range(max_depth):
+                self._logger.info(f"Query tree level {depth + 1}: {len(level)} folders")
+                folders = level
+                level = []
+                async for node in iter_relation_nodes_concurrently(folders, ConfigClass.FILE_LIST_STREAM_PAGE_SIZE,
+                                                                   ConfigClass.FILE_TREE_CONCURRENCY):
+                    yield json.dumps(node) + "\n"
+                    if 'Folder' in node.get('labels', []):
+                        level.append({"start_label": ['Folder', zone_type],
+                                      "start_params": {'project_code': project_code,
+                                                       'name': node.get('name'),
+                                                       'folder_relative_path': node.get('folder_relative_path')},
+                                      "end_label": [zone_type],
+                                      "end_params": {'project_code': project_code,
+                                                     'archived': False}})
+                if not level:
+                    break
+        except Exception as e:
+            self._logger.error(f"Error streaming folder tree: {str(e)}")
+            yield json.dumps({"error_msg": str(e)}) + "\n"
@@ -18,15 +18,16 @@
 # permissions and limitations under the Licence.
 # 
 
+import httpx
 from fastapi import APIRouter, Depends
 from fastapi.responses import JSONResponse
 from fastapi_utils.cbv import cbv
 from ...resources.error_handler import catch_internal
 from ...resources.dependencies import jwt_required
 from ...resources.helpers import *
-from ...models.entity_info_models import CheckFileResponse
+from ...models.entity_info_models import CheckFileResponse, CheckFilesPost, CheckFilesResponse
+from ...commons.data_providers.http_client import get_async_client
 from logger import LoggerFactory
-import httpx
 
 router = APIRouter()
 
@@ -54,6 +55,49 @@ class APIEntityInfo:
             "zone": zone,
             "file_relative_path": file_relative_path
         }
-        with httpx.Client() as client:
-            fw_response = client.get(ConfigClass.FILEINFO_HOST + "/v1/project/{}/file/exist".format(project_code), params=query)
+        client = get_async_client()
+        fw_response = await client.get(ConfigClass.FILEINFO_HOST + "/v1/project/{}/file/exist".format(project_code), params=query)
         return JSONResponse(content=fw_response.json(), status_code=fw_response.status_code)
+
+    @router.post("/project/{project_code}/files/exist", tags=[_API_TAG],
+                 response_model=CheckFilesResponse,
+                 summary="Check source files in bulk")
+    @catch_internal(_API_NAMESPACE)
+    async def check_source_files(self, project_code, data: CheckFilesPost,
+                                 current_identity: dict = Depends(jwt_required)):
+        """
+        Check existence of a list of files in one request, returns path -> {exists, geid}
+        """
+        api_response = CheckFilesResponse()
+        if not isinstance(current_identity, dict):
+            return current_identity
+        self._logger.info("API /project/{project_code}/files/exist".center(80, '-'))
+        file_paths = list(dict.fromkeys(data.file_relative_paths))
+        self._logger.info(f"Checking {len(file_paths)} files in {project_code} {data.zone}")
+        client = get_async_client()
+        url = ConfigClass.FILEINFO_HOST + "/v1/project/{}/file/exist".format(project_code)
+
+        async def check_file(file_relative_path):
+            query = {
+                "project_code": project_code,
+                "zone": data.zone,
+                "file_relative_path": file_relative_path
+            }
+            try:
+                fw_response = await client.get(url, params=query)
+            except httpx.HTTPError as e:
+                self._logger.error(f"Check file {file_relative_path} error: {e}")
+                return {"exists": None, "geid": None, "error_msg": str(e)}
+            if fw_response.status_code == 200:
+                node = fw_response.json().get('result') or {}
+                return {"exists": True, "geid": node.get('global_entity_id')}
+            elif fw_response.status_code == 404:
+                return {"exists": False, "geid": None}
+            self._logger.error(f"Check file {file_relative_path} error: {fw_response.text}")
+            return {"exists": None, "geid": None, "error_msg": fw_response.text}
+
+        results = await gather_with_concurrency(ConfigClass.FILE_EXIST_CHECK_CONCURRENCY,
+                                                [check_file(path) for path in file_paths])
+        api_response.result = dict(zip(file_paths, results))
+        api_response.code = EAPIResponseCode.success
+        return api_response.json_response()
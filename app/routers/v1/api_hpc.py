@@ -18,7 +18,10 @@
 # permissions and limitations under the Licence.
 # 
 
-from fastapi import APIRouter, Depends
+import json
+import time
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import StreamingResponse
 from fastapi_utils.cbv import cbv
 from ...models.hpc_models import *
 from ...models.error_model import HPCError
@@ -26,9 +29,10 @@ from logger import LoggerFactory
 from ...resources.error_handler import catch_internal
 from ...resources.dependencies import *
 from ...resources.helpers import *
-from ...resources.hpc import submit_hpc_job, get_hpc_job_info
+from ...resources.hpc import submit_hpc_job, get_hpc_job_info, get_hpc_jobs_status
 from ...resources.hpc import get_hpc_nodes, get_hpc_node_by_name, get_hpc_jwt_token
 from ...resources.hpc import get_hpc_partitions, get_hpc_partition_by_name
+from ...resources.hpc_watcher import get_job_watcher, is_terminal
 
 router = APIRouter()
 _API_TAG = 'V1 HPC'
@@ -55,7 +59,7 @@ class APIProject:
             token_issuer = request_payload.token_issuer
             username = request_payload.username
             password = request_payload.password
-            token = get_hpc_jwt_token(token_issuer, username, password)
+            token = await get_hpc_jwt_token(token_issuer, username, password)
             if token:
                 error = ""
                 code = EAPIResponseCode.success
@@ -88,9 +92,8 @@ class APIProject:
         api_response = HPCJobResponse()
         result = {}
         try:
-            self._logger.info(f"SUBMITTING JOB: {request_payload}")
-            self._logger.info(f"SUBMITTING JOB: {type(request_payload)}")
-            response = submit_hpc_job(request_payload)
+            self._logger.info(f"SUBMITTING JOB: {request_payload.job_info}")
+            response = await submit_hpc_job(request_payload)
             if response:
                 error_msg = ""
                 result = response
@@ -122,7 +125,7 @@ class APIProject:
         result = {}
         try:
         
-            information = get_hpc_job_info(job_id, host, username, token)
+            information = await get_hpc_job_info(job_id, host, username, token)
             if information:
                 error = ""
                 code = EAPIResponseCode.success
@@ -144,6 +147,119 @@ class APIProject:
         api_response.code = code
         return api_response.json_response()
 
+    @router.post("/hpc/jobs/status", tags=[_API_TAG],
+                 response_model=HPCJobStatusResponse,
+                 summary="Get the state of multiple HPC jobs")
+    @catch_internal(_API_NAMESPACE)
+    async def hpc_get_jobs_status(self, request_payload: HPCJobStatusPost):
+        '''
+        Get the state of multiple HPC jobs of one host and user
+        '''
+        self._logger.info("API hpc_get_jobs_status".center(80, '-'))
+        api_response = HPCJobStatusResponse()
+        result = {}
+        try:
+            job_ids = request_payload.job_ids
+            if not job_ids or len(job_ids) > ConfigClass.HPC_JOB_STATUS_MAX_JOBS:
+                raise HPCError(EAPIResponseCode.bad_request,
+                               f"job_ids requires 1 to {ConfigClass.HPC_JOB_STATUS_MAX_JOBS} job ids")
+            result = await get_hpc_jobs_status(job_ids, request_payload.host,
+                                               request_payload.username, request_payload.token)
+            error = ""
+            code = EAPIResponseCode.success
+        except HPCError as job_error:
+            self._logger.info(f"ERROR GETTING HPC jobs status: {job_error}")
+            code = job_error.code
+            error = job_error.message
+        except Exception as e:
+            self._logger.info(f"ERROR GETTING HPC jobs status: {e}")
+            code = EAPIResponseCode.internal_error
+            error = str(e)
+        api_response.result = result
+        api_response.error_msg = error
+        api_response.code = code
+        return api_response.json_response()
+
+    @router.get("/hpc/job/{job_id}/watch", tags=[_API_TAG],
+                response_model=HPCJobWatchResponse,
+                summary="Wait for the state of an HPC job to change")
+    @catch_internal(_API_NAMESPACE)
+    async def hpc_watch_job(self, job_id, host, username, token, state: str = None, timeout: int = None):
+        '''
+        Long-poll an HPC job, returns as soon as its state differs from state
+        or with changed false after timeout seconds
+        '''
+        self._logger.info("API hpc_watch_job".center(80, '-'))
+        api_response = HPCJobWatchResponse()
+        result = {}
+        try:
+            watcher = get_job_watcher(host, username, token)
+            timeout = max(0, min(timeout if timeout is not None else ConfigClass.HPC_WATCH_TIMEOUT,
+                                 ConfigClass.HPC_WATCH_TIMEOUT))
+            changed = await watcher.wait_for_change([job_id], {job_id: state}, timeout)
+            status = changed.get(job_id) or watcher.states.get(job_id) or \
+                {"code": EAPIResponseCode.success.value, "job_state": state, "error_msg": ""}
+            result = {"job_id": job_id, "changed": job_id in changed, **status}
+            error = ""
+            code = EAPIResponseCode.success
+        except HPCError as job_error:
+            self._logger.info(f"ERROR WATCHING HPC job: {job_error}")
+            code = job_error.code
+            error = job_error.message
+        api_response.result = result
+        api_response.error_msg = error
+        api_response.code = code
+        return api_response.json_response()
+
+    @router.get("/hpc/jobs/events", tags=[_API_TAG],
+                summary="Stream state transitions of HPC jobs as Server-Sent Events")
+    @catch_internal(_API_NAMESPACE)
+    async def hpc_job_events(self, request: Request, job_ids: str, host, username, token):
+        '''
+        Stream a job_state event for every state transition of the comma separated
+        job_ids, the stream ends once every job reached a final state, the client
+        disconnects or HPC_WATCH_STREAM_MAX_AGE seconds have passed
+        '''
+        self._logger.info("API hpc_job_events".center(80, '-'))
+        api_response = HPCJobWatchResponse()
+        try:
+            job_ids = list(dict.fromkeys(job_id.strip() for job_id in job_ids.split(',') if job_id.strip()))
+            if not job_ids or len(job_ids) > ConfigClass.HPC_JOB_STATUS_MAX_JOBS:
+                raise HPCError(EAPIResponseCode.bad_request,
+                               f"job_ids requires 1 to {ConfigClass.HPC_JOB_STATUS_MAX_JOBS} job ids")
+            watcher = get_job_watcher(host, username, token)
+        except HPCError as job_error:
+            self._logger.info(f"ERROR WATCHING HPC jobs: {job_error}")
+            api_response.error_msg = job_error.message
+            api_response.code = job_error.code
+            return api_response.json_response()
+        return StreamingResponse(self._job_events(request, watcher, job_ids), media_type="text/event-stream")
+
+    async def _job_events(self, request, watcher, job_ids):
+        # the streaming response does not watch for disconnects, an abandoned
+        # stream would otherwise keep its jobs polled until they all finish
+        known = {}
+        pending = list(job_ids)
+        deadline = time.monotonic() + ConfigClass.HPC_WATCH_STREAM_MAX_AGE
+        while pending:
+            if await request.is_disconnected():
+                self._logger.info(f"Job events client disconnected, pending jobs: {pending}")
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                yield f"event: timeout\ndata: {json.dumps({'pending': pending})}\n\n"
+                break
+            changed = await watcher.wait_for_change(pending, known,
+                                                    min(ConfigClass.HPC_WATCH_HEARTBEAT, remaining))
+            if not changed:
+                yield ": keepalive\n\n"
+                continue
+            for job_id, status in changed.items():
+                known[job_id] = status["job_state"]
+                yield f"event: job_state\ndata: {json.dumps({'job_id': job_id, **status})}\n\n"
+                if is_terminal(status):
+                    pending.remove(job_id)
+
     @router.get("/hpc/nodes", tags=[_API_TAG],
                 response_model=HPCNodesResponse,
                 summary="Get HPC nodes")
@@ -156,7 +272,7 @@ class APIProject:
         api_response = HPCNodesResponse()
         result = {}
         try:
-            information = get_hpc_nodes(host, username, token)
+            information = await get_hpc_nodes(host, username, token)
             if information:
                 error = ""
                 code = EAPIResponseCode.success
@@ -191,7 +307,7 @@ class APIProject:
         api_response = HPCNodeInfoResponse()
         result = {}
         try:
-            information = get_hpc_node_by_name(host, username, token, node_name)
+            information = await get_hpc_node_by_name(host, username, token, node_name)
             if information:
                 error = ""
                 code = EAPIResponseCode.success
@@ -225,7 +341,7 @@ class APIProject:
         api_response = HPCPartitonsResponse()
         result = {}
         try:
-            information = get_hpc_partitions(host, username, token)
+            information = await get_hpc_partitions(host, username, token)
             if information:
                 error = ""
                 code = EAPIResponseCode.success
@@ -259,7 +375,7 @@ class APIProject:
         api_response = HPCPartitionInfoResponse()
         result = {}
         try:
-            information = get_hpc_partition_by_name(host, username, token, partition_name)
+            information = await get_hpc_partition_by_name(host, username, token, partition_name)
             if information:
                 error = ""
                 code = EAPIResponseCode.success
@@ -25,7 +25,7 @@ from logger import LoggerFactory
 from ...resources.error_handler import catch_internal
 from ...resources.dependencies import jwt_required
 from ...config import ConfigClass
-import httpx
+from ...commons.data_providers.http_client import get_async_client
 from fastapi.security import HTTPBasicCredentials, HTTPBearer
 
 router = APIRouter()
@@ -59,8 +59,8 @@ class APIProject:
         headers = {"Authorization": "Bearer " + token}
         self._logger.info(f'Request payload: {payload}')
         self._logger.info(f'Request headers: {headers}')
-        with httpx.Client() as client:
-            response = client.post(url, json=payload, headers=headers)
+        client = get_async_client()
+        response = await client.post(url, json=payload, headers=headers)
         self._logger.info(f'Response: {response.text}')
         content=response.json()
         self._logger.info(f'Response content: {content}')
@@ -26,7 +26,7 @@ from logger import LoggerFactory
 from ...resources.error_handler import catch_internal
 from ...resources.dependencies import jwt_required
 from ...config import ConfigClass
-import httpx
+from ...commons.data_providers.http_client import get_async_client
 
 router = APIRouter()
 
@@ -50,6 +50,6 @@ class APILineage:
         url = ConfigClass.PROVENANCE_SERVICE + "/v1/lineage"
         self._logger.info(f"url: {url}")
         self._logger.info(f"payload: {proxy_payload}")
-        with httpx.Client() as client:
-            fw_response = client.post(url, json=proxy_payload, timeout=100, follow_redirects=True)
+        client = get_async_client()
+        fw_response = await client.post(url, json=proxy_payload, timeout=100, follow_redirects=True)
         return JSONResponse(content=fw_response.json(), status_code=fw_response.status_code)
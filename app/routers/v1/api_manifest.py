@@ -24,7 +24,7 @@ from ...models.manifest_models import *
 from ...resources.error_handler import catch_internal
 from ...resources.dependencies import jwt_required, check_permission
 from ...resources.helpers import *
-from ...resources.database_service import RDConnection
+from ...resources.database_service import RDConnection, invalidate_manifest_cache
 from ...resources. error_handler import customized_error_template, ECustomizedError
 from logger import LoggerFactory
 
@@ -63,7 +63,7 @@ class APIManifest:
                         'role': _user_role,
                         'project_code': project_code,
                         'zone': ConfigClass.GREEN_ZONE_LABEL}
-            permission = check_permission(permission_event)
+            permission = await check_permission(permission_event)
             self._logger.info(f"Permission check event: {permission_event}")
             self._logger.info(f"Permission check result: {permission}")
             error_msg = permission.get('error_msg', '')
@@ -72,13 +72,10 @@ class APIManifest:
                 api_response.code = permission.get('code')
                 api_response.result = permission.get('result')
                 return api_response.json_response()
-            mani_project_event = {"project_code": project_code}
-            self._logger.info("Getiting project manifests")
-            manifests = self.db.get_manifest_name_from_project_in_db(mani_project_event)
-            self._logger.info(f"Manifest in project check result: {manifests}")
-            self._logger.info("Getting attributes for manifests")
-            manifest_list = self.db.get_attributes_in_manifest_in_db(manifests)
-            api_response.result = manifest_list
+            self._logger.info("Getting project manifests with attributes")
+            manifest_list = await self.db.get_manifests_with_attributes_in_db(project_code)
+            self._logger.info(f"Manifest in project check result: {len(manifest_list)}")
+            api_response.result = manifest_list if manifest_list else {}
             api_response.code = EAPIResponseCode.success
             return api_response.json_response()
         except Exception as e:
@@ -115,7 +112,7 @@ class APIManifest:
                             'role': _user_role,
                             'project_code': project_code,
                             'zone': zone}
-            permission = check_permission(permission_event)
+            permission = await check_permission(permission_event)
             self._logger.info(f"Permission check event: {permission_event}")
             self._logger.info(f"Permission check result: {permission}")
             error_msg = permission.get('error_msg', '')
@@ -133,7 +130,7 @@ class APIManifest:
             api_response.result = str(e)
             return api_response.json_response()
         self._logger.info(f"Getting info for file: {file_name} IN {project_code}")
-        file_node = query_file_in_project(project_code, file_name, zone_type)
+        file_node = await query_file_in_project(project_code, file_name, zone_type)
         if not file_node:
             api_response.error_msg = customized_error_template(ECustomizedError.FILE_NOT_FOUND)
             api_response.code = EAPIResponseCode.not_found
@@ -148,7 +145,7 @@ class APIManifest:
         attributes = manifests.get("attributes", {})
         mani_project_event = {"project_code": project_code, "manifest_name": manifest_name}
         self._logger.info(f"Getting manifest from project event: {mani_project_event}")
-        manifest_info = self.db.get_manifest_name_from_project_in_db(mani_project_event)
+        manifest_info = await self.db.get_manifest_name_from_project_in_db(mani_project_event)
         self._logger.info(f"Manifest information: {manifest_info}")
         if not manifest_info:
             api_response.error_msg = customized_error_template(ECustomizedError.MANIFEST_NOT_FOUND) % manifest_name
@@ -163,7 +160,7 @@ class APIManifest:
                             "attributes": attributes,
                             "username": _username,
                             "project_role": project_role}
-        response = attach_manifest_to_file(annotation_event)
+        response = await attach_manifest_to_file(annotation_event)
         self._logger.info(f"Attach manifest result: {response}")
         if not response:
             api_response.error_msg = customized_error_template(ECustomizedError.FILE_NOT_FOUND)
@@ -174,6 +171,99 @@ class APIManifest:
             api_response.code = EAPIResponseCode.success
             return api_response.json_response()
 
+    @router.post("/manifest/attach/bulk", tags=[_API_TAG],
+                 response_model=ManifestBulkAttachResponse,
+                 summary="Attach manifest to many files")
+    @catch_internal(_API_NAMESPACE)
+    async def attach_manifest_bulk(self, request_payload: ManifestBulkAttachPost,
+                                   current_identity: dict = Depends(jwt_required)):
+        """Attach one manifest with the same attributes to a list of files, returns per file outcome"""
+        api_response = ManifestBulkAttachResponse()
+        try:
+            _username = current_identity['username']
+            _user_id = current_identity["user_id"]
+            _user_role = current_identity['role']
+        except (AttributeError, TypeError):
+            return current_identity
+        self._logger.info("API attach_manifest_bulk".center(80, '-'))
+        self._logger.info(f"User request with identity: {current_identity}")
+        project_code = request_payload.project_code
+        manifest_name = request_payload.manifest_name
+        file_names = list(dict.fromkeys(request_payload.file_names))
+        self._logger.info(f"Attach {manifest_name} to {len(file_names)} files in {project_code}")
+        permission_event = {'user_id': _user_id,
+                        'username': _username,
+                        'role': _user_role,
+                        'project_code': project_code,
+                        'zone': request_payload.zone}
+        permission = await check_permission(permission_event)
+        self._logger.info(f"Permission check event: {permission_event}")
+        self._logger.info(f"Permission check result: {permission}")
+        error_msg = permission.get('error_msg', '')
+        if error_msg:
+            api_response.error_msg = error_msg
+            api_response.code = permission.get('code')
+            api_response.result = permission.get('result')
+            return api_response.json_response()
+        project_role = permission.get('project_role')
+        zone_type = get_zone(request_payload.zone)
+        mani_project_event = {"project_code": project_code, "manifest_name": manifest_name}
+        manifest_info = await self.db.get_manifest_name_from_project_in_db(mani_project_event)
+        self._logger.info(f"Manifest information: {manifest_info}")
+        if not manifest_info:
+            api_response.error_msg = customized_error_template(ECustomizedError.MANIFEST_NOT_FOUND) % manifest_name
+            api_response.code = EAPIResponseCode.bad_request
+            return api_response.json_response()
+        manifest_id = manifest_info[0].get('id')
+
+        file_nodes = await gather_with_concurrency(
+            ConfigClass.MANIFEST_ATTACH_CONCURRENCY,
+            [query_file_in_project(project_code, file_name, zone_type) for file_name in file_names])
+        outcomes = {}
+        located = {}
+        for file_name, file_node in zip(file_names, file_nodes):
+            if not file_node:
+                outcomes[file_name] = {"file_name": file_name,
+                                       "status": customized_error_template(ECustomizedError.FILE_NOT_FOUND),
+                                       "global_entity_id": None}
+            else:
+                located[file_name] = file_node.get('result')[0].get('global_entity_id')
+        self._logger.info(f"Located {len(located)} of {len(file_names)} files")
+
+        located_files = list(located)
+        batch_size = ConfigClass.MANIFEST_ATTACH_BATCH_SIZE
+        batches = [located_files[i:i + batch_size] for i in range(0, len(located_files), batch_size)]
+
+        async def attach_batch(batch):
+            annotation_event = {"project_code": project_code,
+                                "global_entity_id": [located[file_name] for file_name in batch],
+                                "manifest_id": manifest_id,
+                                "attributes": request_payload.attributes,
+                                "username": _username,
+                                "project_role": project_role}
+            try:
+                response = await attach_manifest_to_file(annotation_event)
+                if not response:
+                    status = customized_error_template(ECustomizedError.FILE_NOT_FOUND)
+                elif response.get('code') == EAPIResponseCode.success.value:
+                    status = 'success'
+                else:
+                    self._logger.error(f"Attach manifest batch upstream error: {response}")
+                    status = customized_error_template(ECustomizedError.INTERNAL) % \
+                        (response.get('error_msg') or response)
+            except Exception as e:
+                self._logger.error(f"Attach manifest batch error: {e}")
+                status = customized_error_template(ECustomizedError.INTERNAL) % str(e)
+            for file_name in batch:
+                outcomes[file_name] = {"file_name": file_name, "status": status,
+                                       "global_entity_id": located[file_name]}
+
+        await gather_with_concurrency(ConfigClass.MANIFEST_ATTACH_CONCURRENCY,
+                                      [attach_batch(batch) for batch in batches])
+        api_response.result = [outcomes[file_name] for file_name in file_names]
+        api_response.code = EAPIResponseCode.success
+        return api_response.json_response()
+
     @router.get("/manifest/export", tags=[_API_TAG],
                 response_model=ManifestExportResponse,
                 summary="Export manifest from project")
@@ -199,7 +289,7 @@ class APIManifest:
                     'role': _user_role,
                     'project_code': project_code,
                     'zone': ConfigClass.GREEN_ZONE_LABEL}
-        permission = check_permission(permission_event)
+        permission = await check_permission(permission_event)
         self._logger.info(f"Permission check event: {permission_event}")
         self._logger.info(f"Permission check result: {permission}")
         error_msg = permission.get('error_msg', '')
@@ -208,16 +298,58 @@ class APIManifest:
             api_response.code = permission.get('code')
             api_response.result = permission.get('result')
             return api_response.json_response()
-        manifest_event = {"project_code": project_code,
-                          "manifest_name": manifest_name}
-        manifest = self.db.get_manifest_name_from_project_in_db(manifest_event)
+        manifest = await self.db.get_manifests_with_attributes_in_db(project_code, manifest_name)
         self._logger.info(f"Matched manifest in database: {manifest}")
         if not manifest:
             api_response.code = EAPIResponseCode.not_found
             api_response.error_msg = customized_error_template(ECustomizedError.MANIFEST_NOT_FOUND) % manifest_name
             return api_response.json_response()
         else:
-            result = self.db.get_attributes_in_manifest_in_db(manifest)[0]
+            result = manifest[0]
             api_response.code = EAPIResponseCode.success
             api_response.result = result
             return api_response.json_response()
+
+    @router.delete("/manifest/cache", tags=[_API_TAG],
+                   response_model=ManifestCacheInvalidateResponse,
+                   summary="Drop cached manifest definitions of a project")
+    @catch_internal(_API_NAMESPACE)
+    async def invalidate_manifest(self, project_code, current_identity: dict = Depends(jwt_required)):
+        """
+        Called after manifest definitions change so they are reloaded on next use,
+        only the cache of the worker serving the call is dropped, the other workers
+        reload on their next read when the project version stamp has changed
+        """
+        api_response = ManifestCacheInvalidateResponse()
+        try:
+            _username = current_identity['username']
+            _user_role = current_identity['role']
+            _user_id = current_identity["user_id"]
+        except (AttributeError, TypeError):
+            return current_identity
+        self._logger.info("API invalidate_manifest".center(80, '-'))
+        self._logger.info(f"User request with identity: {current_identity}")
+        permission_event = {'user_id': _user_id,
+                    'username': _username,
+                    'role': _user_role,
+                    'project_code': project_code,
+                    'zone': ConfigClass.GREEN_ZONE_LABEL}
+        permission = await check_permission(permission_event)
+        self._logger.info(f"Permission check event: {permission_event}")
+        self._logger.info(f"Permission check result: {permission}")
+        error_msg = permission.get('error_msg', '')
+        if error_msg:
+            api_response.error_msg = error_msg
+            api_response.code = permission.get('code')
+            api_response.result = permission.get('result')
+            return api_response.json_response()
+        elif permission.get('project_role') != 'admin':
+            api_response.error_msg = customized_error_template(ECustomizedError.PERMISSION_DENIED)
+            api_response.code = EAPIResponseCode.forbidden
+            api_response.result = permission.get('project_role')
+            return api_response.json_response()
+        invalidated = invalidate_manifest_cache(project_code)
+        self._logger.info(f"Invalidated manifest cache of {project_code}: {invalidated}")
+        api_response.result = {"project_code": project_code, "invalidated": invalidated}
+        api_response.code = EAPIResponseCode.success
+        return api_response.json_response()
@@ -0,0 +1,72 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+
+from fastapi import APIRouter
+from fastapi_utils.cbv import cbv
+from ...models.metrics_models import CacheMetricsResponse, PoolMetricsResponse
+from ...models.base_models import EAPIResponseCode
+from ...resources.error_handler import catch_internal
+from ...commons.cache import cache_stats
+from ...commons.worker_pool import worker_pool_stats
+from ...commons.data_providers.database import async_pool_stats
+from ...resources.hpc_watcher import job_watcher_stats
+from logger import LoggerFactory
+
+router = APIRouter()
+_API_TAG = 'V1 Metrics'
+_API_NAMESPACE = "api_metrics"
+
+
+@cbv(router)
+class APIMetrics:
+
+    def __init__(self):
+        self._logger = LoggerFactory(_API_NAMESPACE).get_logger()
+
+    @router.get("/metrics/cache", tags=[_API_TAG],
+                response_model=CacheMetricsResponse,
+                summary="Get hit/miss statistics of the in-process caches")
+    @catch_internal(_API_NAMESPACE)
+    async def cache_metrics(self):
+        '''
+        Get in-process cache statistics
+        '''
+        api_response = CacheMetricsResponse()
+        api_response.result = cache_stats()
+        api_response.code = EAPIResponseCode.success
+        return api_response.json_response()
+
+    @router.get("/metrics/pools", tags=[_API_TAG],
+                response_model=PoolMetricsResponse,
+                summary="Get usage statistics of the worker and connection pools")
+    @catch_internal(_API_NAMESPACE)
+    async def pool_metrics(self):
+        '''
+        Get pool size and queue depth
+        '''
+        api_response = PoolMetricsResponse()
+        api_response.result = {
+            "worker": worker_pool_stats(),
+            "database": async_pool_stats(),
+            "hpc_watcher": job_watcher_stats()
+        }
+        api_response.code = EAPIResponseCode.success
+        return api_response.json_response()
@@ -23,11 +23,11 @@ from app.models.error_model import InvalidEncryptionError
 from fastapi import APIRouter, Depends
 from fastapi_utils.cbv import cbv
 from logger import LoggerFactory
-from ...commons.data_providers.database import DBConnection
 from ...resources.error_handler import catch_internal
 from ...resources.helpers import *
-from ...resources.validation_service import ManifestValidator, decryption
+from ...resources.validation_service import ManifestValidator, decryption, validate_manifest_entries
 from ...resources.database_service import RDConnection
+from ...commons.worker_pool import run_in_worker
 from ...models.validation_models import *
 import re
 
@@ -78,15 +78,15 @@ class APIValidation:
                             "manifest_name": manifest_name,
                             "attributes": attributes}
         self._logger.info(f"Validation event: {validation_event}")                    
-        manifest_info = self.db.get_manifest_name_from_project_in_db(validation_event)
+        manifest_info = await self.db.get_manifests_with_attributes_in_db(project_code, manifest_name)
         self._logger.info(f"manifest_info: {manifest_info}")  
         if not manifest_info:
             api_response.result = customized_error_template(ECustomizedError.MANIFEST_NOT_FOUND) % manifest_name
             api_response.code = EAPIResponseCode.not_found
             return api_response.json_response()
-        validation_event["manifest"] = manifest_info
-        validator = ManifestValidator()
-        attribute_validation_error_msg = validator.has_valid_attributes(validation_event)
+        validation_event["manifest"] = manifest_info[0]
+        validator = ManifestValidator(self.db)
+        attribute_validation_error_msg = await validator.has_valid_attributes(validation_event)
         if attribute_validation_error_msg:
             api_response.result = attribute_validation_error_msg
             api_response.code = EAPIResponseCode.bad_request
@@ -95,6 +95,34 @@ class APIValidation:
         api_response.result = 'Valid'
         return api_response.json_response()
 
+    @router.post("/validate/manifests", tags=[_API_TAG],
+                 response_model=ManifestBatchValidateResponse,
+                 summary="Validate attributes of many files against one manifest")
+    @catch_internal(_API_NAMESPACE)
+    async def validate_manifest_batch(self, request_payload: ManifestBatchValidatePost):
+        """Validate a list of file attributes, every error of each entry is returned"""
+        self._logger.info("API validate_manifest_batch".center(80, '-'))
+        api_response = ManifestBatchValidateResponse()
+        manifest_name = request_payload.manifest_name
+        project_code = request_payload.project_code
+        entries = [entry.dict() for entry in request_payload.entries]
+        validation_event = {"project_code": project_code,
+                            "manifest_name": manifest_name}
+        self._logger.info(f"Validation event: {validation_event}, entries: {len(entries)}")
+        validator = ManifestValidator(self.db)
+        compiled = await validator.get_compiled_manifest(project_code, manifest_name)
+        if compiled is None:
+            api_response.result = customized_error_template(ECustomizedError.MANIFEST_NOT_FOUND) % manifest_name
+            api_response.code = EAPIResponseCode.not_found
+            return api_response.json_response()
+        if len(entries) >= ConfigClass.BATCH_VALIDATION_WORKER_THRESHOLD:
+            result = await run_in_worker(validate_manifest_entries, compiled, entries)
+        else:
+            result = validate_manifest_entries(compiled, entries)
+        api_response.code = EAPIResponseCode.success
+        api_response.result = result
+        return api_response.json_response()
+
     @router.post("/validate/env", tags=[_API_TAG],
                  response_model=EnvValidateResponse,
                  summary="Validate env for CLI commands")
@@ -123,7 +151,7 @@ class APIValidation:
         }
         if encrypted_msg:
             try:
-                current_zone = decryption(encrypted_msg, ConfigClass.CLI_SECRET)
+                current_zone = await run_in_worker(decryption, encrypted_msg, ConfigClass.CLI_SECRET)
             except InvalidEncryptionError as e:
                 self._logger.debug(e)
                 api_response.code = EAPIResponseCode.bad_request
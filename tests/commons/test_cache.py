@@ -0,0 +1,85 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+
+import time
+from app.commons.cache import TTLCache, cache_stats
+
+
+def test_ttl_cache_should_count_hits_and_misses():
+    cache = TTLCache("test_counters", maxsize=10, ttl=60)
+    assert cache.get("key") is None
+    cache.set("key", "value")
+    assert cache.get("key") == "value"
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hit_ratio"] == 0.5
+
+
+def test_ttl_cache_should_expire_entries(mocker):
+    cache = TTLCache("test_expire", maxsize=10, ttl=60)
+    now = time.monotonic()
+    mocker.patch("app.commons.cache.time.monotonic", return_value=now)
+    cache.set("key", "value", ttl=5)
+    mocker.patch("app.commons.cache.time.monotonic", return_value=now + 6)
+    assert cache.get("key") is None
+    assert len(cache) == 0
+
+
+def test_ttl_cache_should_not_extend_default_ttl(mocker):
+    cache = TTLCache("test_cap", maxsize=10, ttl=10)
+    now = time.monotonic()
+    mocker.patch("app.commons.cache.time.monotonic", return_value=now)
+    cache.set("key", "value", ttl=1000)
+    mocker.patch("app.commons.cache.time.monotonic", return_value=now + 11)
+    assert cache.get("key") is None
+
+
+def test_ttl_cache_should_skip_non_positive_ttl():
+    cache = TTLCache("test_skip", maxsize=10, ttl=60)
+    cache.set("key", "value", ttl=-1)
+    assert "key" not in cache
+
+
+def test_ttl_cache_should_evict_least_recently_used():
+    cache = TTLCache("test_lru", maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert "a" in cache
+    assert "b" not in cache
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl_cache_should_invalidate_matching_keys():
+    cache = TTLCache("test_invalidate", maxsize=10, ttl=60)
+    cache.set((1, "project_a"), True)
+    cache.set((2, "project_a"), True)
+    cache.set((1, "project_b"), True)
+    removed = cache.invalidate_where(lambda key: key[1] == "project_a")
+    assert removed == 2
+    assert (1, "project_b") in cache
+
+
+def test_cache_stats_should_list_registered_caches():
+    TTLCache("test_registry", maxsize=1, ttl=1)
+    assert "test_registry" in cache_stats()
@@ -0,0 +1,55 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+import asyncio
+import pytest
+from app.config import ConfigClass
+from app.commons.data_providers.database import get_async_pool, close_async_pool, async_pool_stats
+
+
+def test_async_pool_stats_before_first_use():
+    stats = async_pool_stats()
+    assert stats["started"] is False
+    assert stats["max_size"] == ConfigClass.DB_ASYNC_POOL_MAX_SIZE
+    assert stats["size"] == 0
+
+
+@pytest.mark.asyncio
+async def test_get_async_pool_should_create_pool_once(mocker):
+    pool = mocker.MagicMock()
+    pool.get_size.return_value = 3
+    pool.get_idle_size.return_value = 2
+    pool.close = mocker.AsyncMock()
+    create_pool = mocker.patch('app.commons.data_providers.database.asyncpg.create_pool',
+                               mocker.AsyncMock(return_value=pool))
+    pools = await asyncio.gather(*[get_async_pool() for _ in range(5)])
+    assert all(created is pool for created in pools)
+    assert create_pool.call_count == 1
+    options = create_pool.call_args.kwargs
+    assert options["max_size"] == ConfigClass.DB_ASYNC_POOL_MAX_SIZE
+    assert options["max_queries"] == ConfigClass.DB_ASYNC_POOL_MAX_QUERIES
+    assert options["max_inactive_connection_lifetime"] == ConfigClass.DB_ASYNC_POOL_MAX_INACTIVE_LIFETIME
+    assert options["command_timeout"] == ConfigClass.DB_ASYNC_COMMAND_TIMEOUT
+    stats = async_pool_stats()
+    assert stats["started"] is True
+    assert (stats["size"], stats["idle"]) == (3, 2)
+    await close_async_pool()
+    pool.close.assert_awaited_once()
+    assert async_pool_stats()["started"] is False
@@ -0,0 +1,75 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+
+import httpx
+import pytest
+from app.commons.data_providers.http_client import get_async_client, close_async_client
+from app.resources.helpers import get_node
+
+
+@pytest.mark.asyncio
+async def test_get_async_client_should_return_same_client():
+    client = get_async_client()
+    assert get_async_client() is client
+    assert not client.is_closed
+
+
+@pytest.mark.asyncio
+async def test_close_async_client_should_recreate_client_on_next_use():
+    client = get_async_client()
+    await close_async_client()
+    assert client.is_closed
+    new_client = get_async_client()
+    assert new_client is not client
+    assert not new_client.is_closed
+
+
+@pytest.mark.asyncio
+async def test_helpers_should_reuse_pooled_client(httpx_mock, mocker):
+    await close_async_client()
+    client_init = mocker.spy(httpx.AsyncClient, '__init__')
+    httpx_mock.add_response(
+        method='POST',
+        url='http://neo4j_service/v1/neo4j/nodes/Container/query',
+        json=[{"id": 1}],
+        status_code=200,
+    )
+    for _ in range(10):
+        result = await get_node({'code': 'test_project'}, 'Container')
+        assert result == {"id": 1}
+    assert client_init.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_pooled_client_should_not_replay_upstream_cookies(httpx_mock):
+    httpx_mock.add_response(
+        method='POST',
+        url='http://neo4j_service/v1/neo4j/nodes/Container/query',
+        json=[{"id": 1}],
+        headers={"Set-Cookie": "session=user_a; Path=/"},
+        status_code=200,
+    )
+    await get_node({'code': 'project_a'}, 'Container')
+    await get_node({'code': 'project_b'}, 'Container')
+    requests = httpx_mock.get_requests()
+    assert len(requests) == 2
+    assert "cookie" not in requests[1].headers
+    assert len(get_async_client().cookies.jar) == 0
@@ -0,0 +1,74 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+import asyncio
+import time
+import pytest
+from app.commons.worker_pool import run_in_worker, worker_pool_stats
+
+
+def blocking_task(value, delay=0.2):
+    time.sleep(delay)
+    return value
+
+
+@pytest.mark.asyncio
+async def test_run_in_worker_should_return_result():
+    result = await run_in_worker(blocking_task, "done", delay=0)
+    assert result == "done"
+
+
+@pytest.mark.asyncio
+async def test_run_in_worker_should_not_block_event_loop():
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    ticker_task = asyncio.ensure_future(ticker())
+    await run_in_worker(blocking_task, "done")
+    ticker_task.cancel()
+    assert ticks >= 10
+
+
+@pytest.mark.asyncio
+async def test_run_in_worker_should_raise_task_error():
+    def failing_task():
+        raise ValueError("failed")
+
+    with pytest.raises(ValueError):
+        await run_in_worker(failing_task)
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_stats_should_report_pending_tasks():
+    completed = worker_pool_stats()["completed"]
+    tasks = [asyncio.ensure_future(run_in_worker(blocking_task, index)) for index in range(3)]
+    await asyncio.sleep(0.05)
+    stats = worker_pool_stats()
+    assert stats["started"]
+    assert stats["pending"] == 3
+    await asyncio.gather(*tasks)
+    stats = worker_pool_stats()
+    assert stats["pending"] == 0
+    assert stats["completed"] == completed + 3
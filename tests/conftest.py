@@ -27,6 +27,7 @@ from async_asgi_testclient import TestClient as TestAsyncClient
 from fastapi import Request
 from app.config import ConfigClass
 from app.resources.dependencies import jwt_required
+from app.commons.cache import clear_caches
 from run import app
 from app.routers.v1.api_kg import APIProject
 
@@ -113,3 +114,10 @@ def mock_settings(monkeypatch):
         ConfigClass, 'DATA_UPLOAD_SERVICE_GREENROOM', 'http://data_upload_gr')
     monkeypatch.setattr(
         ConfigClass, 'HPC_SERVICE', 'http://service_hpc')
+
+
+@pytest.fixture(autouse=True)
+def reset_caches():
+    clear_caches()
+    yield
+    clear_caches()
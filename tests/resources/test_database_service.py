@@ -0,0 +1,189 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+import datetime
+import time
+import pytest
+import app.resources.database_service
+from app.config import ConfigClass
+from app.resources.database_service import RDConnection, invalidate_manifest_cache
+
+
+class FakePool:
+    def __init__(self, rows, version=((0, None), (0, None))):
+        self.rows = rows
+        self.version = version
+        self.queries = []
+        self.version_queries = []
+
+    async def fetch(self, query, *args):
+        if "xmin" in query:
+            self.version_queries.append((query, args))
+            return self.version
+        self.queries.append((query, args))
+        return self.rows
+
+    async def fetchrow(self, query, *args):
+        self.queries.append((query, args))
+        return self.rows[0] if self.rows else None
+
+
+def mock_pool(mocker, rows, version=((0, None), (0, None))):
+    pool = FakePool(rows, version)
+
+    async def get_async_pool():
+        return pool
+
+    mocker.patch.object(app.resources.database_service, "get_async_pool", get_async_pool)
+    return pool
+
+
+@pytest.mark.asyncio
+async def test_get_manifest_by_name_should_return_manifest(mocker):
+    pool = mock_pool(mocker, [(1, "fake_manifest", None, None, None, None, None),
+                              (2, "other_manifest", None, None, None, None, None)])
+    event = {"project_code": "test_project", "manifest_name": "fake_manifest"}
+    result = await RDConnection().get_manifest_name_from_project_in_db(event)
+    assert result == [{"name": "fake_manifest", "id": 1}]
+    assert pool.queries[0][1] == ("test_project",)
+
+
+@pytest.mark.asyncio
+async def test_get_manifest_by_name_not_found_should_return_empty_list(mocker):
+    mock_pool(mocker, [])
+    event = {"project_code": "test_project", "manifest_name": "fake_manifest"}
+    result = await RDConnection().get_manifest_name_from_project_in_db(event)
+    assert result == []
+
+
+@pytest.mark.asyncio
+async def test_get_manifests_in_project_should_return_all(mocker):
+    mock_pool(mocker, [(1, "manifest_1", None, None, None, None, None),
+                       (2, "manifest_2", None, None, None, None, None)])
+    result = await RDConnection().get_manifest_name_from_project_in_db({"project_code": "test_project"})
+    assert result == [{"name": "manifest_1", "id": 1}, {"name": "manifest_2", "id": 2}]
+
+
+@pytest.mark.asyncio
+async def test_get_attributes_in_manifest_should_group_by_manifest(mocker):
+    pool = mock_pool(mocker, [("attr_1", "text", False, None, 1),
+                              ("attr_2", "multiple_choice", True, "a,b", 2)])
+    manifests = [{"name": "manifest_1", "id": 1}, {"name": "manifest_2", "id": 2}]
+    result = await RDConnection().get_attributes_in_manifest_in_db(manifests)
+    assert result == [
+        {"id": 1, "manifest_name": "manifest_1",
+         "attributes": [{"name": "attr_1", "type": "text", "optional": False, "value": None}]},
+        {"id": 2, "manifest_name": "manifest_2",
+         "attributes": [{"name": "attr_2", "type": "multiple_choice", "optional": True, "value": "a,b"}]},
+    ]
+    assert sorted(pool.queries[0][1][0]) == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_get_dataset_versions_should_return_versions(mocker):
+    created_at = datetime.datetime(2021, 11, 1, 12, 0, 0)
+    mock_pool(mocker, [("dataset", "dataset_geid", "1.0", "admin", created_at, "minio://location", "notes")])
+    result = await RDConnection().get_dataset_versions({"dataset_geid": "dataset_geid"})
+    assert result == [{"dataset_code": "dataset",
+                       "dataset_geid": "dataset_geid",
+                       "version": "1.0",
+                       "created_by": "admin",
+                       "created_at": str(created_at),
+                       "location": "minio://location",
+                       "notes": "notes"}]
+
+
+def manifest_rows(manifest_count, attribute_count):
+    return [(manifest_id, f"manifest_{manifest_id}", manifest_id * attribute_count + index,
+             f"attr_{index}", "text", False, None)
+            for manifest_id in range(manifest_count) for index in range(attribute_count)]
+
+
+@pytest.mark.asyncio
+async def test_get_manifests_with_attributes_should_use_single_joined_query(mocker):
+    pool = mock_pool(mocker, [(1, "manifest_1", 10, "attr_1", "text", False, None),
+                              (1, "manifest_1", 11, "attr_2", "multiple_choice", True, "a,b"),
+                              (2, "manifest_2", None, None, None, None, None)])
+    result = await RDConnection().get_manifests_with_attributes_in_db("test_project")
+    assert len(pool.queries) == 1
+    query, args = pool.queries[0]
+    assert "JOIN" in query
+    assert args == ("test_project",)
+    assert result == [
+        {"id": 1, "manifest_name": "manifest_1",
+         "attributes": [{"name": "attr_1", "type": "text", "optional": False, "value": None},
+                        {"name": "attr_2", "type": "multiple_choice", "optional": True, "value": "a,b"}]},
+        {"id": 2, "manifest_name": "manifest_2", "attributes": []},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_get_manifests_with_attributes_should_be_served_from_cache(mocker):
+    pool = mock_pool(mocker, [(1, "manifest_1", 10, "attr_1", "text", False, None),
+                              (2, "manifest_2", None, None, None, None, None)])
+    db = RDConnection()
+    for _ in range(5):
+        result = await db.get_manifests_with_attributes_in_db("test_project", "manifest_1")
+        assert [m["id"] for m in result] == [1]
+        result = await db.get_manifest_name_from_project_in_db({"project_code": "test_project"})
+        assert result == [{"name": "manifest_1", "id": 1}, {"name": "manifest_2", "id": 2}]
+    assert len(pool.queries) == 1
+    assert len(pool.version_queries) == 1
+    assert invalidate_manifest_cache("test_project") == 1
+    await db.get_manifests_with_attributes_in_db("test_project", "manifest_1")
+    assert len(pool.queries) == 2
+
+
+@pytest.mark.asyncio
+async def test_get_manifests_with_attributes_should_reload_when_version_changes(mocker, monkeypatch):
+    pool = mock_pool(mocker, [(1, "manifest_1", 10, "attr_1", "text", False, None)],
+                     version=((1, 100), (1, 100)))
+    db = RDConnection()
+    await db.get_manifests_with_attributes_in_db("test_project")
+    await db.get_manifests_with_attributes_in_db("test_project")
+    assert (len(pool.queries), len(pool.version_queries)) == (1, 1)
+    # an attribute edited by another worker bumps the row xmin
+    pool.rows = [(1, "manifest_1", 10, "attr_1", "text", True, None)]
+    pool.version = ((1, 100), (1, 101))
+    result = await db.get_manifests_with_attributes_in_db("test_project")
+    assert len(pool.queries) == 1
+    assert result[0]["attributes"][0]["optional"] is False
+    monkeypatch.setattr(ConfigClass, "MANIFEST_VERSION_CHECK_INTERVAL", 0)
+    result = await db.get_manifests_with_attributes_in_db("test_project")
+    assert (len(pool.queries), len(pool.version_queries)) == (2, 2)
+    assert result[0]["attributes"][0]["optional"] is True
+    await db.get_manifests_with_attributes_in_db("test_project")
+    assert (len(pool.queries), len(pool.version_queries)) == (2, 3)
+    assert pool.version_queries[0][1] == ("test_project",)
+
+
+def test_group_manifest_rows_should_scale_linearly():
+    timings = {}
+    for manifest_count in [250, 500]:
+        rows = manifest_rows(manifest_count, 50)
+        timings[manifest_count] = float("inf")
+        for _ in range(3):
+            start = time.perf_counter()
+            result = RDConnection.group_manifest_rows(rows)
+            timings[manifest_count] = min(timings[manifest_count], time.perf_counter() - start)
+        assert len(result) == manifest_count
+        assert all(len(manifest["attributes"]) == 50 for manifest in result)
+    # quadratic grouping would take ~4x as long for twice the manifests
+    assert timings[500] < timings[250] * 3
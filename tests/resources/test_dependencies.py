@@ -18,6 +18,8 @@
 # permissions and limitations under the Licence.
 # 
 
+import asyncio
+import httpx
 import pytest
 import jwt
 import app.resources.dependencies
@@ -29,32 +31,35 @@ from app.resources.dependencies import *
 project_code = "test_project"
 
 
-def test_get_project_role_successed_should_project_role_and_200(mocker):
+@pytest.mark.asyncio
+async def test_get_project_role_successed_should_project_role_and_200(mocker):
     mocker.patch.object(app.resources.dependencies,
                         "get_node", mock_get_node)
     mocker.patch.object(app.resources.dependencies,
                         "get_user_role", mock_user_role)
-    role, code = get_project_role("fake_id", project_code)
+    role, code = await get_project_role("fake_id", project_code)
     print(role)
     print(code)
     assert role == "collaborator"
     assert code == EAPIResponseCode.success
 
 
-def test_get_project_role_with_project_not_found_should_return_404(mocker):
+@pytest.mark.asyncio
+async def test_get_project_role_with_project_not_found_should_return_404(mocker):
     mocker.patch.object(app.resources.dependencies,
                         "get_node", mock_get_node)
-    error_msg, code = get_project_role("fake_id", "fake_code")
+    error_msg, code = await get_project_role("fake_id", "fake_code")
     assert error_msg == "Project not found"
     assert code == EAPIResponseCode.not_found
 
 
-def test_get_project_role_with_user_not_found_should_return_403(mocker):
+@pytest.mark.asyncio
+async def test_get_project_role_with_user_not_found_should_return_403(mocker):
     mocker.patch.object(app.resources.dependencies,
                         "get_node", mock_get_node)
     mocker.patch.object(app.resources.dependencies,
                         "get_user_role", mock_user_role)
-    error_msg, code = get_project_role("fake_user_id", project_code)
+    error_msg, code = await get_project_role("fake_user_id", project_code)
     assert error_msg == 'User not in the project'
     assert code == EAPIResponseCode.forbidden
 
@@ -82,6 +87,57 @@ async def test_jwt_required_should_return_successed(httpx_mock):
     assert test_result["username"] == "test_user"
 
 
+@pytest.mark.asyncio
+async def test_jwt_required_should_reuse_cached_identity(httpx_mock):
+    encoded_jwt = jwt.encode(
+        {"preferred_username": "cached_user", "exp": time.time()+30}, key="unittest", algorithm="HS256").decode('utf-8')
+    httpx_mock.add_response(
+        method='POST',
+        url='http://neo4j_service/v1/neo4j/nodes/User/query',
+        json=[
+            {
+                "id": 2,
+                "role": "member"
+            }
+        ],
+        status_code=200,
+    )
+    hits = identity_cache.hits
+    for _ in range(3):
+        mock_request = Request(scope={"type": "http"})
+        mock_request._headers = {'Authorization': "Bearer " + encoded_jwt}
+        test_result = await jwt_required(mock_request)
+        assert test_result["user_id"] == 2
+        assert test_result["role"] == "member"
+    assert len(httpx_mock.get_requests()) == 1
+    assert identity_cache.hits == hits + 2
+
+
+@pytest.mark.asyncio
+async def test_jwt_required_should_coalesce_concurrent_user_lookups(httpx_mock):
+    encoded_jwt = jwt.encode(
+        {"preferred_username": "burst_user", "exp": time.time()+30}, key="unittest", algorithm="HS256").decode('utf-8')
+    httpx_mock.add_response(
+        method='POST',
+        url='http://neo4j_service/v1/neo4j/nodes/User/query',
+        json=[
+            {
+                "id": 3,
+                "role": "member"
+            }
+        ],
+        status_code=200,
+    )
+    requests = []
+    for _ in range(10):
+        mock_request = Request(scope={"type": "http"})
+        mock_request._headers = {'Authorization': "Bearer " + encoded_jwt}
+        requests.append(mock_request)
+    results = await asyncio.gather(*[jwt_required(mock_request) for mock_request in requests])
+    assert all(result["user_id"] == 3 for result in results)
+    assert len(httpx_mock.get_requests()) == 1
+
+
 @pytest.mark.asyncio
 async def test_jwt_required_without_token_should_return_unauthorized():
     mock_request = Request(scope={"type": "http"})
@@ -158,7 +214,8 @@ async def test_jwt_required_with_username_not_in_token_should_return_not_found(h
     assert response['status_code'] == 404
 
 
-def test_check_permission_should_return_correct_permission(mocker):
+@pytest.mark.asyncio
+async def test_check_permission_should_return_correct_permission(mocker):
     event = {'user_id': 1,
              'username': "test_user",
              'role': "admin",
@@ -168,11 +225,12 @@ def test_check_permission_should_return_correct_permission(mocker):
                         "get_project_role", mock_get_project_role)
     mocker.patch.object(app.resources.dependencies,
                         "get_node", mock_get_node_user)
-    result = check_permission(event)
+    result = await check_permission(event)
     assert result == {'project_role': 'admin', 'project_code': 'test_project'}
 
 
-def test_check_permission_with_user_not_in_project_should_return_contributor_project_role(mocker):
+@pytest.mark.asyncio
+async def test_check_permission_with_user_not_in_project_should_return_contributor_project_role(mocker):
     event = {'user_id': 1,
              'username': "test_user",
              'role': "contributor",
@@ -182,12 +240,13 @@ def test_check_permission_with_user_not_in_project_should_return_contributor_pro
                         "get_project_role", mock_get_project_role)
     mocker.patch.object(app.resources.dependencies,
                         "get_node", mock_get_node_user)
-    result = check_permission(event)
+    result = await check_permission(event)
     assert result["code"] == EAPIResponseCode.success
     assert result["result"] == "User not in the project"
 
 
-def test_check_permission_with_project_not_found_should_return_project_not_found(mocker):
+@pytest.mark.asyncio
+async def test_check_permission_with_project_not_found_should_return_project_not_found(mocker):
     event = {'user_id': 1,
              'username': "test_user",
              'role': "admin",
@@ -197,12 +256,13 @@ def test_check_permission_with_project_not_found_should_return_project_not_found
                         "get_project_role", mock_get_project_role)
     mocker.patch.object(app.resources.dependencies,
                         "get_node", mock_get_node_user)
-    result = check_permission(event)
+    result = await check_permission(event)
     assert result["code"] == EAPIResponseCode.not_found
     assert result["result"] == {}
 
 
-def test_check_permission_for_contributor_should_return_correct_permission(mocker):
+@pytest.mark.asyncio
+async def test_check_permission_for_contributor_should_return_correct_permission(mocker):
     event = {'user_id': 2,
              'username': "test_user",
              'role': "contributor",
@@ -212,14 +272,15 @@ def test_check_permission_for_contributor_should_return_correct_permission(mocke
                         "get_project_role", mock_get_project_role)
     mocker.patch.object(app.resources.dependencies,
                         "get_node", mock_get_node_user)
-    result = check_permission(event)
+    result = await check_permission(event)
     print(result)
     assert result == {'project_role': 'contributor',
                       'project_code': 'test_project', 
                       'uploader': 'test_user'}
 
 
-def test_check_permission_for_contributor_in_core_should_return_forbidden(mocker):
+@pytest.mark.asyncio
+async def test_check_permission_for_contributor_in_core_should_return_forbidden(mocker):
     event = {'user_id': 2,
              'username': "test_user",
              'role': "contributor",
@@ -229,12 +290,72 @@ def test_check_permission_for_contributor_in_core_should_return_forbidden(mocker
                         "get_project_role", mock_get_project_role)
     mocker.patch.object(app.resources.dependencies,
                         "get_node", mock_get_node_user)
-    result = check_permission(event)
+    result = await check_permission(event)
     assert result["code"] == EAPIResponseCode.forbidden
     assert result["result"] == {}
 
 
-def test_void_check_file_in_zone_should_return_bad_request(httpx_mock):
+@pytest.mark.asyncio
+async def test_check_permission_should_reuse_cached_decision(mocker):
+    event = {'user_id': 2,
+             'username': "test_user",
+             'role': "contributor",
+             'project_code': project_code,
+             'zone': "gr"}
+    project_role = mocker.patch.object(app.resources.dependencies,
+                                       "get_project_role", side_effect=mock_get_project_role)
+    mocker.patch.object(app.resources.dependencies,
+                        "get_node", mock_get_node_user)
+    hits = permission_cache.hits
+    for _ in range(5):
+        result = await check_permission(event)
+        assert result == {'project_role': 'contributor',
+                          'project_code': 'test_project',
+                          'uploader': 'test_user'}
+    assert project_role.call_count == 1
+    assert permission_cache.hits == hits + 4
+
+
+@pytest.mark.asyncio
+async def test_invalidate_permission_should_drop_cached_decision(mocker):
+    event = {'user_id': 2,
+             'username': "test_user",
+             'role': "contributor",
+             'project_code': project_code,
+             'zone': "gr"}
+    project_role = mocker.patch.object(app.resources.dependencies,
+                                       "get_project_role", side_effect=mock_get_project_role)
+    mocker.patch.object(app.resources.dependencies,
+                        "get_node", mock_get_node_user)
+    await check_permission(event)
+    assert invalidate_permission(user_id=1) == 0
+    assert invalidate_permission(project_code="other_project") == 0
+    assert invalidate_permission(user_id=2, project_code=project_code) == 1
+    await check_permission(event)
+    assert project_role.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_check_permission_should_not_cache_denial(mocker):
+    event = {'user_id': 1,
+             'username': "test_user",
+             'role': "admin",
+             'project_code': "fake_wrong_project",
+             'zone': "gr"}
+    project_role = mocker.patch.object(app.resources.dependencies,
+                                       "get_project_role", side_effect=mock_get_project_role)
+    mocker.patch.object(app.resources.dependencies,
+                        "get_node", mock_get_node_user)
+    for _ in range(2):
+        result = await check_permission(event)
+        assert result["code"] == EAPIResponseCode.not_found
+    assert project_role.call_count == 2
+    assert len(permission_cache) == 0
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("status_code, expected", [(200, True), (404, False), (500, None)])
+async def test_check_file_in_zone_should_classify_upstream_status(httpx_mock, status_code, expected):
     mock_post_model = POSTProjectFile
     mock_post_model.type = "type"
     mock_post_model.zone = "gr"
@@ -245,16 +366,16 @@ def test_void_check_file_in_zone_should_return_bad_request(httpx_mock):
     httpx_mock.add_response(
         method='GET',
         url='http://fileinfo_service/v1/project/test_project/file/exist/?type=type&zone=gr&file_relative_path=relative_path%2Ffile_name&project_code=test_project',
-        json={"code": 200},
-        status_code=200,
+        json={"code": status_code},
+        status_code=status_code,
     )
+    exists, error_msg = await check_file_in_zone(mock_post_model, mock_file, project_code)
+    assert exists is expected
+    assert bool(error_msg) == (expected is None)
 
-    result = void_check_file_in_zone(mock_post_model, mock_file, project_code)
-    response = result.__dict__
-    assert response['status_code'] == 400
 
-
-def test_void_check_file_in_zone_with_external_service_error_should_return_forbidden(httpx_mock):
+@pytest.mark.asyncio
+async def test_check_file_in_zone_with_connection_error_should_return_error(httpx_mock):
     mock_post_model = POSTProjectFile
     mock_post_model.type = "type"
     mock_post_model.zone = "gr"
@@ -262,9 +383,10 @@ def test_void_check_file_in_zone_with_external_service_error_should_return_forbi
         "resumable_relative_path": "relative_path",
         "resumable_filename": "file_name"
     }
-    result = void_check_file_in_zone(mock_post_model, mock_file, project_code)
-    response = result.__dict__
-    assert response['status_code'] == 403
+    httpx_mock.add_exception(httpx.ConnectTimeout("timed out"))
+    exists, error_msg = await check_file_in_zone(mock_post_model, mock_file, project_code)
+    assert exists is None
+    assert "timed out" in error_msg
 
 
 @pytest.mark.parametrize("test_zone, data_type", [("cr", "fake"), ("gr", "fake")])
@@ -278,7 +400,8 @@ def test_validate_upload_event_should_return_invalid_zone():
     assert result == "Invalid Zone"
 
 
-def test_transfer_to_pre_success(httpx_mock):
+@pytest.mark.asyncio
+async def test_transfer_to_pre_success(httpx_mock):
     mock_post_model = POSTProjectFile
     mock_post_model.current_folder_node = "current_folder_node"
     mock_post_model.operator = "operator"
@@ -292,11 +415,12 @@ def test_transfer_to_pre_success(httpx_mock):
         json={},
         status_code=200,
     )
-    result = transfer_to_pre(mock_post_model, project_code, "session_id")
+    result = await transfer_to_pre(mock_post_model, project_code, "session_id")
     assert result.json() == {}
 
 
-def test_transfer_to_pre_with_external_service_fail():
+@pytest.mark.asyncio
+async def test_transfer_to_pre_with_external_service_fail():
     mock_post_model = POSTProjectFile
     mock_post_model.current_folder_node = "current_folder_node"
     mock_post_model.operator = "operator"
@@ -304,12 +428,12 @@ def test_transfer_to_pre_with_external_service_fail():
     mock_post_model.data = "data"
     mock_post_model.zone = "cr"
     mock_post_model.job_type = "job_type"
-    result = transfer_to_pre(mock_post_model, project_code, "session_id")
+    result = await transfer_to_pre(mock_post_model, project_code, "session_id")
     response = result.__dict__
     assert response['status_code'] == 403
 
 
-def mock_get_project_role(arg1, arg2):
+async def mock_get_project_role(arg1, arg2):
     if arg2 == "fake_code":
         return ("User not in the project", EAPIResponseCode.success)
     elif arg2 == "fake_wrong_project":
@@ -321,13 +445,13 @@ def mock_get_project_role(arg1, arg2):
 
 
 
-def mock_get_node(arg1, arg2):
+async def mock_get_node(arg1, arg2):
     if arg1['code'] == project_code:
         return {"id": "test_project"}
     return None
 
 
-def mock_user_role(arg1, arg2):
+async def mock_user_role(arg1, arg2):
     mock_user_role_result = {
         "r": {
             "type": "collaborator",
@@ -339,7 +463,7 @@ def mock_user_role(arg1, arg2):
     return None
 
 
-def mock_get_node_user(arg1, arg2):
+async def mock_get_node_user(arg1, arg2):
     if arg1['name'] == "test_user":
         return {'status':'active'}
     return {'status': 'disabled'}
@@ -18,6 +18,8 @@
 # permissions and limitations under the Licence.
 # 
 
+import asyncio
+import json
 import pytest
 import app.resources.helpers
 from app.resources.helpers import *
@@ -25,71 +27,80 @@ from tests.helper import EAPIResponseCode
 from requests.models import Response
 
 
-def test_get_user_role_successed(httpx_mock):
+@pytest.mark.asyncio
+async def test_get_user_role_successed(httpx_mock):
     httpx_mock.add_response(
         method='GET',
         url='http://neo4j_service/v1/neo4j/relations?start_id=1&end_id=1086',
         json=[{"node":"fake_node"}],
         status_code=200,
     )
-    result = get_user_role(1, 1086)
+    result = await get_user_role(1, 1086)
     assert result["node"] == "fake_node"
 
 
-def test_get_user_role_failed():
-    result = get_user_role(1, 1086)
+@pytest.mark.asyncio
+async def test_get_user_role_failed():
+    result = await get_user_role(1, 1086)
     assert result == None
 
 
-def test_query__node_has_relation_with_admin_successed(httpx_mock):
+@pytest.mark.asyncio
+async def test_query__node_has_relation_with_admin_successed(httpx_mock):
     httpx_mock.add_response(
         method='POST',
         url='http://neo4j_service/v1/neo4j/nodes/Container/query',
         json=[{"node": "fake_node"}],
         status_code=200,
     )
-    result = query__node_has_relation_with_admin()
+    result = await query__node_has_relation_with_admin()
     assert result[0]["node"] == "fake_node"
 
 
-def test_query__node_has_relation_with_admin_failed(httpx_mock):
-    result = query__node_has_relation_with_admin()
+@pytest.mark.asyncio
+async def test_query__node_has_relation_with_admin_failed(httpx_mock):
+    result = await query__node_has_relation_with_admin()
     assert result == []
 
 
-def test_query_node_has_relation_for_user_successed(httpx_mock):
+@pytest.mark.asyncio
+async def test_query_node_has_relation_for_user_successed(httpx_mock):
     httpx_mock.add_response(
         method='POST',
         url='http://neo4j_service/v1/neo4j/relations/query',
         json=[{"node": "fake_node"}],
         status_code=200,
     )
-    result = query_node_has_relation_for_user("test_user", "Container")
+    result = await query_node_has_relation_for_user("test_user", "Container")
     assert result[0]["node"] == "fake_node"
 
 
-def test_query_node_has_relation_for_user_failed():
-    result = query_node_has_relation_for_user("test_user", "Container")
+@pytest.mark.asyncio
+async def test_query_node_has_relation_for_user_failed():
+    result = await query_node_has_relation_for_user("test_user", "Container")
     assert result == []
 
 
-def test_get_node_by_geid_successed(httpx_mock):
+@pytest.mark.asyncio
+async def test_get_node_by_geid_successed(httpx_mock):
     httpx_mock.add_response(
         method='GET',
         url='http://neo4j_service/v1/neo4j/nodes/geid/fake_geid',
         json=[{"node": "fake_node"}],
         status_code=200,
     )
-    result = get_node_by_geid("fake_geid")
+    result = await get_node_by_geid("fake_geid")
     assert result[0]["node"] == "fake_node"
 
 
-def test_get_node_by_geid_failed():
-    result = get_node_by_geid("fake_geid")
+@pytest.mark.asyncio
+async def test_get_node_by_geid_failed():
+    result = await get_node_by_geid("fake_geid")
     assert result == None
 
 
-def test_batch_query_node_by_geid_successed(httpx_mock):
+@pytest.mark.asyncio
+async def test_batch_query_node_by_geid_successed(httpx_mock):
     geid_list = ["fake_geid"]
     httpx_mock.add_response(
         method='POST',
@@ -97,12 +108,13 @@ def test_batch_query_node_by_geid_successed(httpx_mock):
         json={"result": [{"global_entity_id": "fake_geid"}]},
         status_code=200,
     )
-    result_geid_list, query_node = batch_query_node_by_geid(geid_list)
+    result_geid_list, query_node = await batch_query_node_by_geid(geid_list)
     assert result_geid_list == geid_list
     assert query_node == {'fake_geid': {'global_entity_id': 'fake_geid'}}
 
 
-def test_query_file_in_project_successed(httpx_mock):
+@pytest.mark.asyncio
+async def test_query_file_in_project_successed(httpx_mock):
     httpx_mock.add_response(
         method='POST',
         url='http://neo4j_service/v2/neo4j/nodes/query',
@@ -112,11 +124,12 @@ def test_query_file_in_project_successed(httpx_mock):
             },
         status_code=200,
     )
-    result = query_file_in_project("test_project", "testfolder/testfile")
+    result = await query_file_in_project("test_project", "testfolder/testfile")
     assert result['code'] == 200
 
 
-def test_query_file_in_project_return_empty(httpx_mock):
+@pytest.mark.asyncio
+async def test_query_file_in_project_return_empty(httpx_mock):
     httpx_mock.add_response(
         method='POST',
         url='http://neo4j_service/v2/neo4j/nodes/query',
@@ -126,16 +139,18 @@ def test_query_file_in_project_return_empty(httpx_mock):
         },
         status_code=200,
     )
-    result = query_file_in_project("test_project", "testfolder/testfile")
+    result = await query_file_in_project("test_project", "testfolder/testfile")
     assert result == []
 
 
-def test_query_file_in_project_return_failed():
-    result = query_file_in_project("test_project", "testfolder/testfile")
+@pytest.mark.asyncio
+async def test_query_file_in_project_return_failed():
+    result = await query_file_in_project("test_project", "testfolder/testfile")
     assert result == []
 
 
-def test_get_node_successed(httpx_mock):
+@pytest.mark.asyncio
+async def test_get_node_successed(httpx_mock):
     httpx_mock.add_response(
         method='POST',
         url='http://neo4j_service/v1/neo4j/nodes/Container/query',
@@ -145,46 +160,86 @@ def test_get_node_successed(httpx_mock):
         }],
         status_code=200,
     )
-    result = get_node(123, "Container")
+    result = await get_node(123, "Container")
     assert result == {
         "code": 200,
         "result": {}
     }
 
 
-def test_get_node_with_response_json_as_none(httpx_mock):
+@pytest.mark.asyncio
+async def test_get_node_with_response_json_as_none(httpx_mock):
     httpx_mock.add_response(
         method='POST',
         url='http://neo4j_service/v1/neo4j/nodes/Container/query',
         json=None,
         status_code=200,
     )
-    result = get_node(123, "Container")
+    result = await get_node(123, "Container")
     assert result == None
 
 
-def test_get_node_by_code_failed():
-    result = get_node(123, "Container")
+@pytest.mark.asyncio
+async def test_get_node_by_code_failed():
+    result = await get_node(123, "Container")
     assert result == None
 
 
-def test_get_user_admin_projects_successed(mocker):
+@pytest.mark.asyncio
+async def test_get_node_should_coalesce_concurrent_identical_lookups(httpx_mock):
+    httpx_mock.add_response(
+        method='POST',
+        url='http://neo4j_service/v1/neo4j/nodes/Container/query',
+        json=[{"code": "fake_project"}],
+        status_code=200,
+    )
+    results = await asyncio.gather(*[get_node({"code": "fake_project"}, "Container") for _ in range(10)])
+    assert results == [{"code": "fake_project"}] * 10
+    assert len(httpx_mock.get_requests()) == 1
+    await get_node({"code": "fake_project"}, "Container")
+    assert len(httpx_mock.get_requests()) == 2
+
+
+@pytest.mark.asyncio
+async def test_single_flight_should_share_errors_and_keep_keys_apart():
+    flight = SingleFlight()
+    calls = []
+
+    async def lookup(key):
+        calls.append(key)
+        await asyncio.sleep(0)
+        if key == "broken":
+            raise ValueError(key)
+        return key
+
+    results = await asyncio.gather(*[flight.do(key, lookup, key) for key in ["a", "b", "a", "broken", "broken"]],
+                                   return_exceptions=True)
+    assert results[:3] == ["a", "b", "a"]
+    assert all(isinstance(result, ValueError) for result in results[3:])
+    assert sorted(calls) == ["a", "b", "broken"]
+    assert (flight.calls, flight.shared) == (3, 2)
+
+
+@pytest.mark.asyncio
+async def test_get_user_admin_projects_successed(mocker):
     mocker.patch.object(app.resources.helpers,
                         "query__node_has_relation_with_admin", mock_query__node_has_relation_with_admin)
-    result = get_user_projects('admin', 'test_user')
+    result = await get_user_projects('admin', 'test_user')
     assert result[0]['name'] == 'test_user'
     assert result[0]['code'] == 123
 
 
-def test_get_user_project_user_projects_successed(mocker):
+@pytest.mark.asyncio
+async def test_get_user_project_user_projects_successed(mocker):
     mocker.patch.object(app.resources.helpers,
                         "query_node_has_relation_for_user", mock_query_node_has_relation_for_user)
-    result = get_user_projects('contributor', 'test_user')
+    result = await get_user_projects('contributor', 'test_user')
     assert result[0]['name'] == 'test_user'
     assert result[0]['code'] == 123
 
 
-def test_attach_manifest_to_file_successed(httpx_mock):
+@pytest.mark.asyncio
+async def test_attach_manifest_to_file_successed(httpx_mock):
     event = {
         'project_code':'project_code',
         'global_entity_id': 'geid',
@@ -199,11 +254,12 @@ def test_attach_manifest_to_file_successed(httpx_mock):
         json={"node": "fake_node"},
         status_code=200,
     )
-    result = attach_manifest_to_file(event)
+    result = await attach_manifest_to_file(event)
     assert result == {"node": "fake_node"}
 
 
-def test_attach_manifest_to_file_failed(httpx_mock):
+@pytest.mark.asyncio
+async def test_attach_manifest_to_file_failed(httpx_mock):
     event = {
         'project_code': 'project_code',
         'global_entity_id': 'geid',
@@ -218,11 +274,34 @@ def test_attach_manifest_to_file_failed(httpx_mock):
         json={},
         status_code=400,
     )
-    result = attach_manifest_to_file(event)
+    result = await attach_manifest_to_file(event)
     assert result == None
 
 
-def test_http_query_node_zone(httpx_mock):
+@pytest.mark.asyncio
+async def test_attach_manifest_to_file_with_geid_list(httpx_mock):
+    event = {
+        'project_code': 'project_code',
+        'global_entity_id': ['geid_1', 'geid_2'],
+        'manifest_id': 'mani_id',
+        'attributes': 'attr',
+        'username': 'test_user',
+        'project_role': 'admin',
+    }
+    httpx_mock.add_response(
+        method='POST',
+        url='http://fileinfo_service/v1/files/attributes/attach',
+        json={"result": ["fake_node_1", "fake_node_2"]},
+        status_code=200,
+    )
+    result = await attach_manifest_to_file(event)
+    assert result == {"result": ["fake_node_1", "fake_node_2"]}
+    request = httpx_mock.get_request()
+    assert json.loads(request.content)["global_entity_id"] == ['geid_1', 'geid_2']
+
+
+@pytest.mark.asyncio
+async def test_http_query_node_zone(httpx_mock):
     event = {
         'project_code': 'project_code',
         'namespace': 'gr',
@@ -237,10 +316,75 @@ def test_http_query_node_zone(httpx_mock):
         json={"node": "fake_node"},
         status_code=200,
     )
-    result = http_query_node_zone(event)
+    result = await http_query_node_zone(event)
     assert result.json() == {"node": "fake_node"}
 
 
+@pytest.mark.asyncio
+@pytest.mark.parametrize("status_code, result, expected_requests", [
+    (200, ["fake_folder"], 1),
+    (200, [], 1),
+    (500, None, 2),
+])
+async def test_http_query_node_zone_should_cache_successful_lookups(httpx_mock, status_code, result,
+                                                                    expected_requests):
+    event = {
+        'project_code': 'project_code',
+        'namespace': 'gr',
+        'folder_name': 'folder_name',
+        'display_path': 'user/folder_name',
+        'folder_relative_path': 'user',
+    }
+    httpx_mock.add_response(
+        method='POST',
+        url='http://neo4j_service/v2/neo4j/nodes/query',
+        json={"result": result, "error_msg": "neo4j error"},
+        status_code=status_code,
+    )
+    hits = folder_cache.hits
+    responses = []
+    for _ in range(3 if expected_requests == 1 else 2):
+        response = await http_query_node_zone(event)
+        assert response.status_code == status_code
+        assert response.json()["result"] == result
+        responses.append(response)
+    assert len(httpx_mock.get_requests()) == expected_requests
+    assert len({id(response) for response in responses}) == len(responses)
+    if status_code == 200:
+        assert folder_cache.hits - hits == 2
+        cached = folder_cache.get(('project_code', get_zone('gr'), 'user/folder_name'))
+        assert cached == (200, {"result": result, "error_msg": "neo4j error"})
+
+
+@pytest.mark.asyncio
+async def test_iter_relation_nodes_concurrently_should_page_and_bound_folders(mocker):
+    folders = {f"folder_{index}": [f"folder_{index}/file_{n}" for n in range(25)] for index in range(5)}
+    calls = []
+    running = {"now": 0, "max": 0}
+
+    async def mock_fetch_relation_nodes(payload, skip=None, limit=None):
+        calls.append((payload["name"], skip, limit))
+        running["now"] += 1
+        running["max"] = max(running["max"], running["now"])
+        await asyncio.sleep(0)
+        running["now"] -= 1
+        if payload["name"] == "broken":
+            raise ValueError("neo4j error")
+        return folders[payload["name"]][skip:skip + limit]
+
+    mocker.patch.object(app.resources.helpers, "_fetch_relation_nodes", mock_fetch_relation_nodes)
+    payloads = [{"name": name} for name in folders]
+    nodes = [node async for node in iter_relation_nodes_concurrently(payloads, 10, 2)]
+    assert sorted(nodes) == sorted(node for children in folders.values() for node in children)
+    assert len(calls) == 15
+    assert all(limit == 10 for _, _, limit in calls)
+    assert running["max"] == 2
+
+    with pytest.raises(ValueError):
+        async for _ in iter_relation_nodes_concurrently(payloads + [{"name": "broken"}], 10, 2):
+            pass
+
+
 @pytest.mark.parametrize("test_source, expect_result", [("folder", "Folder"), ("container", "Container"), ("File", None)])
 def test_get_parent_label(test_source, expect_result):
     result = get_parent_label(test_source)
@@ -268,18 +412,19 @@ def test_verify_list_event(test_source, test_folder, expect_result):
     assert error_msg == expect_result
 
 
+@pytest.mark.asyncio
 @pytest.mark.parametrize("test_zone, folder, expect_result",
                          [("gr", "test_user/folder", ''),
                           ("zone", "test_user/folder", 'mock_error'),
                           ("cr", "test_user/not_exist_folder", 'Folder not exist')])
-def test_check_folder_exist(mocker, test_zone, folder, expect_result):
+async def test_check_folder_exist(mocker, test_zone, folder, expect_result):
     mocker.patch.object(app.resources.helpers,
                         "http_query_node_zone", mock_http_query_node_zone)
-    code, error_msg = check_folder_exist(test_zone, "test_project", folder)
+    code, error_msg = await check_folder_exist(test_zone, "test_project", folder)
     assert error_msg == expect_result
 
 
-def mock_http_query_node_zone(arg1):
+async def mock_http_query_node_zone(arg1):
     mock_response = Response()
     if arg1['namespace'] == 'gr':
         mock_response.status_code = 200
@@ -293,7 +438,7 @@ def mock_http_query_node_zone(arg1):
     return mock_response
 
 
-def mock_query__node_has_relation_with_admin():
+async def mock_query__node_has_relation_with_admin():
     return [{
         'name': 'test_user',
         'code':123,
@@ -302,8 +447,24 @@ def mock_query__node_has_relation_with_admin():
     }]
 
 
-def mock_query_node_has_relation_for_user(arg1):
+async def mock_query_node_has_relation_for_user(arg1):
     return [{'r': {'status':'active'}, 'end_node': {'name': 'test_user',
                                                        'code': 123,
                                                        'id': 'fake_id',
                                                        'global_entity_id': 'geid'}}]
+
+
+@pytest.mark.asyncio
+async def test_gather_with_concurrency_should_keep_order_and_limit():
+    in_flight = {"current": 0, "peak": 0}
+
+    async def task(index):
+        in_flight["current"] += 1
+        in_flight["peak"] = max(in_flight["peak"], in_flight["current"])
+        await asyncio.sleep(0.01 * (10 - index))
+        in_flight["current"] -= 1
+        return index
+
+    result = await gather_with_concurrency(3, [task(index) for index in range(10)])
+    assert result == list(range(10))
+    assert in_flight["peak"] == 3
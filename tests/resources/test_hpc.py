@@ -18,28 +18,73 @@
 # permissions and limitations under the Licence.
 # 
 
+import asyncio
+import time
+import httpx
+import jwt
 import pytest
 from app.resources.hpc import *
+from app.resources.hpc import _refresh_tasks
 from app.models.hpc_models import HPCJobSubmitPost
 
 
-def test_get_hpc_jwt_token_successed(httpx_mock):
+@pytest.mark.asyncio
+async def test_get_hpc_jwt_token_successed(httpx_mock):
     httpx_mock.add_response(
         method='POST',
         url='http://service_hpc/v1/hpc/auth',
         json={"result": "hpc_token"},
         status_code=200,
     )
-    result = get_hpc_jwt_token("issuer", "username", "pwd")
+    result = await get_hpc_jwt_token("issuer", "username", "pwd")
     assert result == "hpc_token"
 
 
-def test_get_hpc_jwt_token_failed(httpx_mock):
-    result = get_hpc_jwt_token("issuer", "username", "pwd")
+@pytest.mark.asyncio
+async def test_get_hpc_jwt_token_failed(httpx_mock):
+    result = await get_hpc_jwt_token("issuer", "username", "pwd")
     assert result == ''
 
 
-def test_submit_hpc_job_successed(httpx_mock):
+def encode_hpc_token(lifetime):
+    return jwt.encode({"preferred_username": "username", "exp": time.time() + lifetime},
+                      key="unittest", algorithm="HS256").decode('utf-8')
+
+
+@pytest.mark.asyncio
+async def test_get_hpc_jwt_token_should_reuse_token_until_expiry(httpx_mock):
+    token = encode_hpc_token(3600)
+    httpx_mock.add_response(
+        method='POST',
+        url='http://service_hpc/v1/hpc/auth',
+        json={"result": token},
+        status_code=200,
+    )
+    results = await asyncio.gather(*[get_hpc_jwt_token("issuer", "username", "pwd") for _ in range(5)])
+    assert results == [token] * 5
+    assert await get_hpc_jwt_token("issuer", "username", "pwd") == token
+    assert len(httpx_mock.get_requests()) == 1
+    await get_hpc_jwt_token("issuer", "username", "other_pwd")
+    assert len(httpx_mock.get_requests()) == 2
+    assert all("pwd" not in str(key) for key in hpc_tokens._data)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("token", ["hpc_token", encode_hpc_token(30)])
+async def test_get_hpc_jwt_token_should_not_cache_token_without_usable_expiry(httpx_mock, token):
+    httpx_mock.add_response(
+        method='POST',
+        url='http://service_hpc/v1/hpc/auth',
+        json={"result": token},
+        status_code=200,
+    )
+    for _ in range(2):
+        assert await get_hpc_jwt_token("issuer", "username", "pwd") == token
+    assert len(httpx_mock.get_requests()) == 2
+
+
+@pytest.mark.asyncio
+async def test_submit_hpc_job_successed(httpx_mock):
     mock_request = HPCJobSubmitPost
     mock_request.token = 'token'
     mock_request.host = 'http://hpc_host'
@@ -52,35 +97,38 @@ def test_submit_hpc_job_successed(httpx_mock):
               "code": 200},
         status_code=200,
     )
-    result = submit_hpc_job(mock_request)
+    result = await submit_hpc_job(mock_request)
     assert result == "hpc"
 
 
-def test_submit_hpc_job_with_hpc_host_without_protocal():
+@pytest.mark.asyncio
+async def test_submit_hpc_job_with_hpc_host_without_protocal():
     mock_request = HPCJobSubmitPost
     mock_request.token = 'token'
     mock_request.host = 'hpc_host'
     mock_request.username = 'user'
     mock_request.job_info = {'script': 'script'}
     try:
-        submit_hpc_job(mock_request)
+        await submit_hpc_job(mock_request)
     except HPCError as e:
         assert e.code == EAPIResponseCode.bad_request
 
 
-def test_submit_hpc_job_without_job_script():
+@pytest.mark.asyncio
+async def test_submit_hpc_job_without_job_script():
     mock_request = HPCJobSubmitPost
     mock_request.token = 'token'
     mock_request.host = 'http://hpc_host'
     mock_request.username = 'user'
     mock_request.job_info = {'script': ''}
     try:
-        submit_hpc_job(mock_request)
+        await submit_hpc_job(mock_request)
     except HPCError as e:
         assert e.code == EAPIResponseCode.bad_request
 
 
-def test_submit_hpc_job_with_job_error(httpx_mock):
+@pytest.mark.asyncio
+async def test_submit_hpc_job_with_job_error(httpx_mock):
     mock_request = HPCJobSubmitPost
     mock_request.token = 'token'
     mock_request.host = 'http://hpc_host'
@@ -94,12 +142,13 @@ def test_submit_hpc_job_with_job_error(httpx_mock):
         status_code=400,
     )
     try:
-        submit_hpc_job(mock_request)
+        await submit_hpc_job(mock_request)
     except HPCError as e:
         assert e.code == EAPIResponseCode.bad_request
 
 
-def test_submit_hpc_job_with_job_token_expired(httpx_mock):
+@pytest.mark.asyncio
+async def test_submit_hpc_job_with_job_token_expired(httpx_mock):
     mock_request = HPCJobSubmitPost
     mock_request.token = 'token'
     mock_request.host = 'http://hpc_host'
@@ -113,12 +162,13 @@ def test_submit_hpc_job_with_job_token_expired(httpx_mock):
         status_code=500,
     )
     try:
-        submit_hpc_job(mock_request)
+        await submit_hpc_job(mock_request)
     except HPCError as e:
         assert e.code == EAPIResponseCode.forbidden
 
 
-def test_submit_hpc_job_with_job_token_expired(httpx_mock):
+@pytest.mark.asyncio
+async def test_submit_hpc_job_with_job_token_expired(httpx_mock):
     mock_request = HPCJobSubmitPost
     mock_request.token = 'token'
     mock_request.host = 'http://hpc_host'
@@ -132,12 +182,13 @@ def test_submit_hpc_job_with_job_token_expired(httpx_mock):
         status_code=403,
     )
     try:
-        submit_hpc_job(mock_request)
+        await submit_hpc_job(mock_request)
     except HPCError as e:
         assert e.code == EAPIResponseCode.internal_error
 
 
-def test_get_hpc_job_info_successed(httpx_mock):
+@pytest.mark.asyncio
+async def test_get_hpc_job_info_successed(httpx_mock):
     httpx_mock.add_response(
         method='GET',
         url='http://service_hpc/v1/hpc/job/123?slurm_host=hpc_host&username=test_user&protocol=http',
@@ -145,18 +196,39 @@ def test_get_hpc_job_info_successed(httpx_mock):
               "code": 200},
         status_code=200,
     )
-    result = get_hpc_job_info(123, "http://hpc_host", "test_user", "token")
+    result = await get_hpc_job_info(123, "http://hpc_host", "test_user", "token")
     assert result == "hpc"
 
 
-def test_get_hpc_job_info_with_hpc_host_error(httpx_mock):
+@pytest.mark.asyncio
+async def test_get_hpc_jobs_status_should_report_each_job(httpx_mock):
+    for job_id, json_body in [("1", {"result": {"job_id": "1", "job_state": "RUNNING"}, "code": 200}),
+                              ("2", {"error_msg": "unknown job 2", "code": 500}),
+                              ("3", {"result": {"job_id": "3", "job_state": "COMPLETED"}, "code": 200})]:
+        httpx_mock.add_response(
+            method='GET',
+            url=f'http://service_hpc/v1/hpc/job/{job_id}?slurm_host=hpc_host&username=test_user&protocol=http',
+            json=json_body,
+            status_code=200,
+        )
+    result = await get_hpc_jobs_status(["1", "2", "3", "1"], "http://hpc_host", "test_user", "token")
+    assert list(result) == ["1", "2", "3"]
+    assert result["1"] == {"code": 200, "job_state": "RUNNING", "error_msg": ""}
+    assert result["2"] == {"code": 404, "job_state": None, "error_msg": "Job ID not found"}
+    assert result["3"]["job_state"] == "COMPLETED"
+    assert len(httpx_mock.get_requests()) == 3
+
+
+@pytest.mark.asyncio
+async def test_get_hpc_job_info_with_hpc_host_error(httpx_mock):
     try:
-        get_hpc_job_info(123, "hpc_host", "test_user", "token")
+        await get_hpc_job_info(123, "hpc_host", "test_user", "token")
     except HPCError as e:
         assert e.code == EAPIResponseCode.bad_request
 
 
-def test_get_hpc_job_info_with_job_id_not_found(httpx_mock):
+@pytest.mark.asyncio
+async def test_get_hpc_job_info_with_job_id_not_found(httpx_mock):
     httpx_mock.add_response(
         method='GET',
         url='http://service_hpc/v1/hpc/job/123?slurm_host=hpc_host&username=test_user&protocol=http',
@@ -164,12 +236,13 @@ def test_get_hpc_job_info_with_job_id_not_found(httpx_mock):
         status_code=400,
     )
     try:
-        get_hpc_job_info(123, "http://hpc_host", "test_user", "token")
+        await get_hpc_job_info(123, "http://hpc_host", "test_user", "token")
     except HPCError as e:
         assert e.code == EAPIResponseCode.not_found
 
 
-def test_get_hpc_job_info_with_request_url_not_found(httpx_mock):
+@pytest.mark.asyncio
+async def test_get_hpc_job_info_with_request_url_not_found(httpx_mock):
     httpx_mock.add_response(
         method='GET',
         url='http://service_hpc/v1/hpc/job/123?slurm_host=hpc_host&username=test_user&protocol=http',
@@ -177,12 +250,13 @@ def test_get_hpc_job_info_with_request_url_not_found(httpx_mock):
         status_code=400,
     )
     try:
-        get_hpc_job_info(123, "http://hpc_host", "test_user", "token")
+        await get_hpc_job_info(123, "http://hpc_host", "test_user", "token")
     except HPCError as e:
         assert e.code == EAPIResponseCode.not_found
 
 
-def test_get_hpc_job_info_with_request_url_not_found(httpx_mock):
+@pytest.mark.asyncio
+async def test_get_hpc_job_info_with_request_url_not_found(httpx_mock):
     httpx_mock.add_response(
         method='GET',
         url='http://service_hpc/v1/hpc/job/123?slurm_host=hpc_host&username=test_user&protocol=http',
@@ -191,12 +265,13 @@ def test_get_hpc_job_info_with_request_url_not_found(httpx_mock):
         status_code=500,
     )
     try:
-        get_hpc_job_info(123, "http://hpc_host", "test_user", "token")
+        await get_hpc_job_info(123, "http://hpc_host", "test_user", "token")
     except Exception as e:
         assert str(e) == "(500, 'mock error')"
 
 
-def test_get_hpc_nodes_successed(httpx_mock):
+@pytest.mark.asyncio
+async def test_get_hpc_nodes_successed(httpx_mock):
     httpx_mock.add_response(
         method='GET',
         url='http://service_hpc/v1/hpc/nodes?slurm_host=hpc_host&username=test_user&protocol=http',
@@ -204,18 +279,20 @@ def test_get_hpc_nodes_successed(httpx_mock):
               "code": 200},
         status_code=200,
     )
-    result = get_hpc_nodes("http://hpc_host", "test_user", "token")
+    result = await get_hpc_nodes("http://hpc_host", "test_user", "token")
     assert result == "hpc"
 
 
-def test_get_hpc_nodes_hpc_host_error(httpx_mock):
+@pytest.mark.asyncio
+async def test_get_hpc_nodes_hpc_host_error(httpx_mock):
     try:
-        get_hpc_nodes("hpc_host", "test_user", "token")
+        await get_hpc_nodes("hpc_host", "test_user", "token")
     except HPCError as e:
         assert e.code == EAPIResponseCode.bad_request
 
 
-def test_get_hpc_nodes_failed(httpx_mock):
+@pytest.mark.asyncio
+async def test_get_hpc_nodes_failed(httpx_mock):
     httpx_mock.add_response(
         method='GET',
         url='http://service_hpc/v1/hpc/nodes?slurm_host=hpc_host&username=test_user&protocol=http',
@@ -224,12 +301,84 @@ def test_get_hpc_nodes_failed(httpx_mock):
         status_code=500,
     )
     try:
-        get_hpc_nodes("http://hpc_host", "test_user", "token")
+        await get_hpc_nodes("http://hpc_host", "test_user", "token")
     except HPCError as e:
         assert e.code == EAPIResponseCode.internal_error
 
 
-def test_get_hpc_node_by_name_successed(httpx_mock):
+def test_get_hpc_session_should_reuse_session_per_host_user_token():
+    session = get_hpc_session("http://hpc_host", "test_user", "token")
+    assert get_hpc_session("http://hpc_host", "test_user", "token") is session
+    assert get_hpc_session("http://hpc_host", "test_user", "other_token") is not session
+    assert session.protocol == "http"
+    assert session.slurm_host == "hpc_host"
+    assert session.headers == {"Authorization": "token"}
+
+
+@pytest.mark.asyncio
+async def test_hpc_calls_should_share_session(httpx_mock):
+    httpx_mock.add_response(
+        method='GET',
+        url='http://service_hpc/v1/hpc/nodes?slurm_host=hpc_host&username=test_user&protocol=http',
+        json={"result": "nodes",
+              "code": 200},
+        status_code=200,
+    )
+    httpx_mock.add_response(
+        method='GET',
+        url='http://service_hpc/v1/hpc/partitions?slurm_host=hpc_host&username=test_user&protocol=http',
+        json={"result": "partitions",
+              "code": 200},
+        status_code=200,
+    )
+    assert await get_hpc_nodes("http://hpc_host", "test_user", "token") == "nodes"
+    assert await get_hpc_partitions("http://hpc_host", "test_user", "token") == "partitions"
+    assert len(hpc_sessions) == 1
+    assert all(request.headers["Authorization"] == "token" for request in httpx_mock.get_requests())
+
+
+@pytest.mark.asyncio
+async def test_get_hpc_nodes_should_serve_cached_inventory(httpx_mock):
+    httpx_mock.add_response(
+        method='GET',
+        url='http://service_hpc/v1/hpc/nodes?slurm_host=hpc_host&username=test_user&protocol=http',
+        json={"result": [{"node1": {"state": "idle"}}, {"node2": {"state": "down"}}],
+              "code": 200},
+        status_code=200,
+    )
+    for _ in range(3):
+        result = await get_hpc_nodes("http://hpc_host", "test_user", "token")
+        assert result == [{"node1": {"state": "idle"}}, {"node2": {"state": "down"}}]
+    node = await get_hpc_node_by_name("http://hpc_host", "test_user", "token", "node2")
+    assert node == [{"node2": {"state": "down"}}]
+    assert len(httpx_mock.get_requests()) == 1
+
+
+@pytest.mark.asyncio
+async def test_get_hpc_partitions_should_revalidate_stale_inventory(httpx_mock, monkeypatch):
+    monkeypatch.setattr(ConfigClass, 'HPC_INVENTORY_TTL', 0)
+    listings = [[{"parti1": {"nodes": ["node1"]}}], [{"parti2": {"nodes": ["node2"]}}]]
+
+    def callback(request):
+        listing = listings[min(len(httpx_mock.get_requests()), 2) - 1]
+        return httpx.Response(status_code=200, json={"result": listing, "code": 200})
+
+    httpx_mock.add_callback(
+        callback,
+        method='GET',
+        url='http://service_hpc/v1/hpc/partitions?slurm_host=hpc_host&username=test_user&protocol=http',
+    )
+    first = await get_hpc_partitions("http://hpc_host", "test_user", "token")
+    stale = await get_hpc_partitions("http://hpc_host", "test_user", "token")
+    assert first == stale == [{"parti1": {"nodes": ["node1"]}}]
+    await asyncio.gather(*_refresh_tasks)
+    fresh = await get_hpc_partitions("http://hpc_host", "test_user", "token")
+    assert fresh == [{"parti2": {"nodes": ["node2"]}}]
+    await asyncio.gather(*_refresh_tasks)
+
+
+@pytest.mark.asyncio
+async def test_get_hpc_node_by_name_successed(httpx_mock):
     httpx_mock.add_response(
         method='GET',
         url='http://service_hpc/v1/hpc/nodes/node123?slurm_host=hpc_host&username=test_user&protocol=http',
@@ -237,19 +386,21 @@ def test_get_hpc_node_by_name_successed(httpx_mock):
               "code": 200},
         status_code=200,
     )
-    result = get_hpc_node_by_name(
+    result = await get_hpc_node_by_name(
         "http://hpc_host", "test_user", "token", "node123")
     assert result == "hpc"
 
 
-def test_hpc_node_by_name_hpc_host_error():
+@pytest.mark.asyncio
+async def test_hpc_node_by_name_hpc_host_error():
     try:
-        get_hpc_node_by_name("hpc_host", "test_user", "token", "node123")
+        await get_hpc_node_by_name("hpc_host", "test_user", "token", "node123")
     except HPCError as e:
         assert e.code == EAPIResponseCode.bad_request
 
 
-def test_get_hpc_node_by_name_failed(httpx_mock):
+@pytest.mark.asyncio
+async def test_get_hpc_node_by_name_failed(httpx_mock):
     httpx_mock.add_response(
         method='GET',
         url='http://service_hpc/v1/hpc/nodes/node123?slurm_host=hpc_host&username=test_user&protocol=http',
@@ -258,13 +409,14 @@ def test_get_hpc_node_by_name_failed(httpx_mock):
         status_code=400,
     )
     try:
-        get_hpc_node_by_name(
+        await get_hpc_node_by_name(
             "http://hpc_host", "test_user", "token", "node123")
     except HPCError as e:
         assert e.code == EAPIResponseCode.not_found
 
 
-def test_get_hpc_node_by_name_failed(httpx_mock):
+@pytest.mark.asyncio
+async def test_get_hpc_node_by_name_failed(httpx_mock):
     httpx_mock.add_response(
         method='GET',
         url='http://service_hpc/v1/hpc/nodes/node123?slurm_host=hpc_host&username=test_user&protocol=http',
@@ -273,13 +425,14 @@ def test_get_hpc_node_by_name_failed(httpx_mock):
         status_code=400,
     )
     try:
-        get_hpc_node_by_name(
+        await get_hpc_node_by_name(
             "http://hpc_host", "test_user", "token", "node123")
     except HPCError as e:
         assert e.code == EAPIResponseCode.internal_error
 
 
-def test_get_hpc_partitions_successed(httpx_mock):
+@pytest.mark.asyncio
+async def test_get_hpc_partitions_successed(httpx_mock):
     httpx_mock.add_response(
         method='GET',
         url='http://service_hpc/v1/hpc/partitions?slurm_host=hpc_host&username=test_user&protocol=http',
@@ -287,18 +440,20 @@ def test_get_hpc_partitions_successed(httpx_mock):
               "code": 200},
         status_code=200,
     )
-    result = get_hpc_partitions("http://hpc_host", "test_user", "token")
+    result = await get_hpc_partitions("http://hpc_host", "test_user", "token")
     assert result == "hpc"
 
 
-def test_get_hpc_partitions_hpc_host_error():
+@pytest.mark.asyncio
+async def test_get_hpc_partitions_hpc_host_error():
     try:
-        get_hpc_partitions("hpc_host", "test_user", "token")
+        await get_hpc_partitions("hpc_host", "test_user", "token")
     except HPCError as e:
         assert e.code == EAPIResponseCode.bad_request
 
 
-def test_get_hpc_partitions_retrieval_failed(httpx_mock):
+@pytest.mark.asyncio
+async def test_get_hpc_partitions_retrieval_failed(httpx_mock):
     httpx_mock.add_response(
         method='GET',
         url='http://service_hpc/v1/hpc/partitions?slurm_host=hpc_host&username=test_user&protocol=http',
@@ -307,12 +462,13 @@ def test_get_hpc_partitions_retrieval_failed(httpx_mock):
         status_code=400,
     )
     try:
-        get_hpc_partitions("http://hpc_host", "test_user", "token")
+        await get_hpc_partitions("http://hpc_host", "test_user", "token")
     except HPCError as e:
         assert e.code == EAPIResponseCode.bad_request
 
 
-def test_get_hpc_partitions_internal_failed(httpx_mock):
+@pytest.mark.asyncio
+async def test_get_hpc_partitions_internal_failed(httpx_mock):
     httpx_mock.add_response(
         method='GET',
         url='http://service_hpc/v1/hpc/partitions?slurm_host=hpc_host&username=test_user&protocol=http',
@@ -321,12 +477,13 @@ def test_get_hpc_partitions_internal_failed(httpx_mock):
         status_code=500,
     )
     try:
-        get_hpc_partitions("http://hpc_host", "test_user", "token")
+        await get_hpc_partitions("http://hpc_host", "test_user", "token")
     except HPCError as e:
         assert e.code == EAPIResponseCode.internal_error
 
 
-def test_get_hpc_partition_by_name_successed(httpx_mock):
+@pytest.mark.asyncio
+async def test_get_hpc_partition_by_name_successed(httpx_mock):
     httpx_mock.add_response(
         method='GET',
         url='http://service_hpc/v1/hpc/partitions/parti123?slurm_host=hpc_host&username=test_user&protocol=http',
@@ -334,19 +491,21 @@ def test_get_hpc_partition_by_name_successed(httpx_mock):
               "code": 200},
         status_code=200,
     )
-    result = get_hpc_partition_by_name(
+    result = await get_hpc_partition_by_name(
         "http://hpc_host", "test_user", "token", "parti123")
     assert result == "hpc"
 
 
-def test_get_hpc_partition_by_name_hpc_host_error():
+@pytest.mark.asyncio
+async def test_get_hpc_partition_by_name_hpc_host_error():
     try:
-        get_hpc_partition_by_name("hpc_host", "test_user", "token", "parti123")
+        await get_hpc_partition_by_name("hpc_host", "test_user", "token", "parti123")
     except HPCError as e:
         assert e.code == EAPIResponseCode.bad_request
 
 
-def test_get_hpc_partition_by_name_with_partition_not_found(httpx_mock):
+@pytest.mark.asyncio
+async def test_get_hpc_partition_by_name_with_partition_not_found(httpx_mock):
     httpx_mock.add_response(
         method='GET',
         url='http://service_hpc/v1/hpc/partitions/parti123?slurm_host=hpc_host&username=test_user&protocol=http',
@@ -355,13 +514,14 @@ def test_get_hpc_partition_by_name_with_partition_not_found(httpx_mock):
         status_code=400,
     )
     try:
-        get_hpc_partition_by_name(
+        await get_hpc_partition_by_name(
         "http://hpc_host", "test_user", "token", "parti123")
     except HPCError as e:
         assert e.code == EAPIResponseCode.not_found
 
 
-def test_get_hpc_partition_by_name_with_internal_error(httpx_mock):
+@pytest.mark.asyncio
+async def test_get_hpc_partition_by_name_with_internal_error(httpx_mock):
     httpx_mock.add_response(
         method='GET',
         url='http://service_hpc/v1/hpc/partitions/parti123?slurm_host=hpc_host&username=test_user&protocol=http',
@@ -370,7 +530,7 @@ def test_get_hpc_partition_by_name_with_internal_error(httpx_mock):
         status_code=500,
     )
     try:
-        get_hpc_partition_by_name(
+        await get_hpc_partition_by_name(
             "http://hpc_host", "test_user", "token", "parti123")
     except HPCError as e:
         assert e.code == EAPIResponseCode.internal_error
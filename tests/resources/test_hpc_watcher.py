@@ -0,0 +1,112 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+import asyncio
+import pytest
+from app.config import ConfigClass
+from app.models.error_model import HPCError
+from app.resources.hpc_watcher import *
+from app.resources.hpc_watcher import _watchers
+from app.models.base_models import EAPIResponseCode
+
+
+@pytest.fixture
+def fast_watcher(monkeypatch):
+    monkeypatch.setattr(ConfigClass, 'HPC_WATCH_MIN_INTERVAL', 0.01)
+    monkeypatch.setattr(ConfigClass, 'HPC_WATCH_MAX_INTERVAL', 0.08)
+    monkeypatch.setattr(ConfigClass, 'HPC_WATCH_IDLE_TTL', 0.05)
+
+
+def mock_job_states(mocker, states):
+    calls = []
+
+    async def get_hpc_jobs_status(job_ids, host, username, token):
+        calls.append(list(job_ids))
+        result = {}
+        for job_id in job_ids:
+            sequence = states[job_id]
+            job_state = sequence.pop(0) if len(sequence) > 1 else sequence[0]
+            result[job_id] = {"code": 200, "job_state": job_state, "error_msg": ""}
+        return result
+
+    mocker.patch('app.resources.hpc_watcher.get_hpc_jobs_status', get_hpc_jobs_status)
+    return calls
+
+
+async def follow(watcher, job_ids):
+    known = {}
+    seen = []
+    pending = list(job_ids)
+    while pending:
+        changed = await watcher.wait_for_change(pending, known, 1)
+        for job_id, status in changed.items():
+            known[job_id] = status["job_state"]
+            seen.append((job_id, status["job_state"]))
+            if is_terminal(status):
+                pending.remove(job_id)
+    return seen
+
+
+@pytest.mark.asyncio
+async def test_job_watcher_should_share_one_poller_between_waiters(mocker, fast_watcher):
+    calls = mock_job_states(mocker, {"1": ["PENDING", "PENDING", "RUNNING", "RUNNING", "COMPLETED"],
+                                     "2": ["RUNNING", "RUNNING", "RUNNING", "FAILED"]})
+    watcher = get_job_watcher("http://hpc_host", "test_user", "token")
+    assert get_job_watcher("http://hpc_host", "test_user", "token") is watcher
+    first, second = await asyncio.gather(follow(watcher, ["1"]), follow(watcher, ["1", "2"]))
+    assert first == [("1", "PENDING"), ("1", "RUNNING"), ("1", "COMPLETED")]
+    assert [state for job_id, state in second if job_id == "2"] == ["RUNNING", "FAILED"]
+    assert len(calls) == 5
+    assert all(len(set(job_ids)) == len(job_ids) for job_ids in calls)
+    await stop_job_watchers()
+
+
+@pytest.mark.asyncio
+async def test_job_watcher_should_stop_polling_when_jobs_are_done(mocker, fast_watcher):
+    calls = mock_job_states(mocker, {"1": ["COMPLETED"]})
+    watcher = get_job_watcher("http://hpc_host", "test_user", "token")
+    changed = await watcher.wait_for_change(["1"], {}, 1)
+    assert changed["1"]["job_state"] == "COMPLETED"
+    await asyncio.sleep(0.1)
+    assert len(calls) == 1
+    assert _watchers == {}
+
+
+@pytest.mark.asyncio
+async def test_job_watcher_should_time_out_without_transition(mocker, fast_watcher):
+    mock_job_states(mocker, {"1": ["RUNNING"]})
+    watcher = get_job_watcher("http://hpc_host", "test_user", "token")
+    changed = await watcher.wait_for_change(["1"], {"1": "RUNNING"}, 0.05)
+    assert changed == {}
+    await stop_job_watchers()
+
+
+def test_job_watcher_should_back_off_while_unchanged(fast_watcher):
+    intervals = [ConfigClass.HPC_WATCH_MIN_INTERVAL]
+    for _ in range(4):
+        intervals.append(JobWatcher.next_interval(intervals[-1], False))
+    assert intervals == [0.01, 0.02, 0.04, 0.08, 0.08]
+    assert JobWatcher.next_interval(0.08, True) == 0.01
+
+
+def test_get_job_watcher_without_protocol_should_raise():
+    with pytest.raises(HPCError) as e:
+        get_job_watcher("hpc_host", "test_user", "token")
+    assert e.value.code == EAPIResponseCode.bad_request
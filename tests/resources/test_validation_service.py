@@ -0,0 +1,114 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+import base64
+import time
+import pytest
+from cryptography.fernet import Fernet
+from app.models.error_model import InvalidEncryptionError
+from app.resources.validation_service import decryption, derive_fernet
+from app.resources.validation_service import CompiledManifest, ManifestValidator
+
+secret = base64.b64encode(b"fake_cli_secret").decode()
+
+
+def encrypt(message, secret):
+    return base64.b64encode(derive_fernet(secret).encrypt(message.encode())).decode()
+
+
+def test_decryption_should_return_original_message():
+    assert decryption(encrypt("gr", secret), secret) == "gr"
+
+
+def test_decryption_with_invalid_message_should_raise_error():
+    with pytest.raises(InvalidEncryptionError):
+        decryption(base64.b64encode(b"not encrypted").decode(), secret)
+
+
+def test_derive_fernet_should_run_kdf_once_per_secret():
+    derive_fernet.cache_clear()
+    message = encrypt("cr", secret)
+    for _ in range(10):
+        assert decryption(message, secret) == "cr"
+    cache_info = derive_fernet.cache_info()
+    assert cache_info.misses == 1
+    assert cache_info.hits == 10
+    assert isinstance(derive_fernet(secret), Fernet)
+
+
+def test_decryption_should_be_under_1ms_after_warm_up():
+    message = encrypt("gr", secret)
+    decryption(message, secret)
+    rounds = 200
+    start = time.perf_counter()
+    for _ in range(rounds):
+        decryption(message, secret)
+    assert (time.perf_counter() - start) / rounds < 0.001
+
+
+exist_attributes = [
+    {"name": "attr1", "type": "multiple_choice", "optional": False, "value": "a1,a2"},
+    {"name": "attr2", "type": "text", "optional": False, "value": None},
+    {"name": "attr3", "type": "text", "optional": True, "value": None},
+]
+
+
+@pytest.mark.parametrize("input_attributes, error", [
+    ({"attr1": "a1", "attr2": "text", "attr3": "text"}, None),
+    ({"attr1": "a2", "attr2": "text"}, None),
+    ({"attr1": "a1", "attr2": "text", "fake": "1", "other": "2"}, "Invalid Attribute fake"),
+    ({"attr2": "text"}, "Missing Required Attribute attr1"),
+    ({"attr1": "a3", "attr2": "text"}, "Invalid Choice Field attr1"),
+    ({"attr1": "a1", "attr2": ""}, "Field Required attr2"),
+    ({"attr1": "a1", "attr2": "t" * 101}, "Text Too Long attr2"),
+    ({"attr1": "a1", "attr2": "text", "attr3": "t" * 101}, "Text Too Long attr3"),
+    ({"attr1": ["a1"], "attr2": "text"}, "Invalid Choice Field attr1"),
+])
+def test_compiled_manifest_should_return_first_error(input_attributes, error):
+    assert CompiledManifest(exist_attributes).validate(input_attributes) == error
+
+
+def test_compiled_manifest_should_list_every_error():
+    errors = list(CompiledManifest(exist_attributes).iter_errors({"attr1": "a3", "fake": "1"}))
+    assert errors == ["Invalid Attribute fake",
+                      "Invalid Choice Field attr1",
+                      "Missing Required Attribute attr2"]
+
+
+class FakeRDConnection:
+    def __init__(self):
+        self.manifests = [{"id": 1, "manifest_name": "fake_manifest", "attributes": exist_attributes}]
+
+    async def get_manifests_with_attributes_in_db(self, project_code, manifest_name=None):
+        return [m for m in self.manifests if m["manifest_name"] == manifest_name]
+
+
+@pytest.mark.asyncio
+async def test_manifest_validator_should_reuse_compiled_manifest(mocker):
+    compile_manifest = mocker.spy(CompiledManifest, "__init__")
+    db = FakeRDConnection()
+    event = {"project_code": "test_project", "manifest_name": "fake_manifest",
+             "attributes": {"attr1": "a1", "attr2": "text"}}
+    for _ in range(5):
+        assert await ManifestValidator(db).has_valid_attributes(event) is None
+    assert compile_manifest.call_count == 1
+    db.manifests = [dict(db.manifests[0])]
+    assert await ManifestValidator(db).has_valid_attributes(event) is None
+    assert compile_manifest.call_count == 2
@@ -18,9 +18,12 @@
 # permissions and limitations under the Licence.
 # 
 
+import json
+import httpx
 import pytest
 from pytest_httpx import HTTPXMock
 from tests.helper import EAPIResponseCode
+from app.config import ConfigClass
 
 test_query_geid_api = "/v1/query/geid"
 test_get_file_api = "/v1/test_project/files/query"
@@ -109,6 +112,164 @@ async def test_get_files_in_folder_should_return_200(test_async_client_auth, moc
     assert 'fake_file' in files
 
 
+def mock_list_dependencies(mocker):
+    mocker.patch('app.routers.v1.api_file.check_permission',
+                 return_value={"code": 200,
+                               'project_code': project_code,
+                               'uploader': 'fake_user'})
+    mocker.patch('app.routers.v1.api_file.check_folder_exist',
+                 return_value=(EAPIResponseCode.success, ''))
+
+
+def paged_relation_callback(nodes, honour_paging=True):
+    def callback(request: httpx.Request):
+        payload = json.loads(request.content)
+        if honour_paging and "limit" in payload:
+            skip, limit = payload["skip"], payload["limit"]
+            page = nodes[skip:skip + limit]
+        else:
+            page = nodes
+        return httpx.Response(status_code=200, json=[{'end_node': node} for node in page])
+    return callback
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("honour_paging", [True, False])
+async def test_get_files_with_page_size_should_return_page_and_cursor(test_async_client_auth, mocker,
+                                                                      httpx_mock: HTTPXMock, honour_paging):
+    nodes = [{"name": f"file_{index}"} for index in range(25)]
+    mock_list_dependencies(mocker)
+    httpx_mock.add_callback(paged_relation_callback(nodes, honour_paging),
+                            method='POST', url='http://neo4j_service/v1/neo4j/relations/query')
+    param = {"project_code": project_code, "zone": "gr", "folder": 'fake_user/fake_folder',
+             "source_type": 'Folder', "page": 2, "page_size": 10}
+    header = {'Authorization': 'fake token'}
+    res = await test_async_client_auth.get(test_get_file_api, headers=header, query_string=param)
+    res_json = res.json()
+    assert res_json.get('code') == 200
+    assert [f["name"] for f in res_json.get('result')] == [f"file_{index}" for index in range(10, 20)]
+    assert res_json.get('next_cursor') == "20"
+    request = httpx_mock.get_requests()[0]
+    assert json.loads(request.content)["skip"] == 10
+    assert json.loads(request.content)["limit"] == 10
+
+    param.pop("page")
+    param["cursor"] = res_json.get('next_cursor')
+    res = await test_async_client_auth.get(test_get_file_api, headers=header, query_string=param)
+    res_json = res.json()
+    assert [f["name"] for f in res_json.get('result')] == [f"file_{index}" for index in range(20, 25)]
+    assert res_json.get('next_cursor') is None
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("node_count", [5, 10])
+async def test_get_files_with_page_size_should_stop_when_upstream_ignores_paging(test_async_client_auth, mocker,
+                                                                                 httpx_mock: HTTPXMock, node_count):
+    nodes = [{"name": f"file_{index}"} for index in range(node_count)]
+    mock_list_dependencies(mocker)
+    httpx_mock.add_callback(paged_relation_callback(nodes, honour_paging=False),
+                            method='POST', url='http://neo4j_service/v1/neo4j/relations/query')
+    param = {"project_code": project_code, "zone": "gr", "folder": 'fake_user/fake_folder',
+             "source_type": 'Folder', "page_size": 10}
+    header = {'Authorization': 'fake token'}
+    res = await test_async_client_auth.get(test_get_file_api, headers=header, query_string=param)
+    res_json = res.json()
+    assert [f["name"] for f in res_json.get('result')] == [node["name"] for node in nodes]
+    if node_count < 10:
+        assert res_json.get('next_cursor') is None
+        return
+    assert res_json.get('next_cursor') == "10"
+    param["cursor"] = res_json.get('next_cursor')
+    res = await test_async_client_auth.get(test_get_file_api, headers=header, query_string=param)
+    res_json = res.json()
+    assert res_json.get('code') == 200
+    assert res_json.get('result') == []
+    assert res_json.get('next_cursor') is None
+
+
+@pytest.mark.asyncio
+async def test_get_files_with_invalid_cursor_should_return_400(test_async_client_auth):
+    param = {"project_code": project_code, "zone": "gr", "folder": 'fake_user/fake_folder',
+             "source_type": 'Folder', "page_size": 10, "cursor": "abc"}
+    header = {'Authorization': 'fake token'}
+    res = await test_async_client_auth.get(test_get_file_api, headers=header, query_string=param)
+    res_json = res.json()
+    assert res_json.get('code') == 400
+    assert res_json.get('error_msg') == "Invalid variable"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("node_count, honour_paging, upstream_calls", [
+    (25, True, 3),
+    (25, False, 1),
+    (10, False, 2),
+])
+async def test_get_files_with_stream_should_return_ndjson(test_async_client_auth, mocker, monkeypatch,
+                                                          httpx_mock: HTTPXMock, node_count, honour_paging,
+                                                          upstream_calls):
+    monkeypatch.setattr(ConfigClass, 'FILE_LIST_STREAM_PAGE_SIZE', 10)
+    nodes = [{"name": f"file_{index}"} for index in range(node_count)]
+    mock_list_dependencies(mocker)
+    httpx_mock.add_callback(paged_relation_callback(nodes, honour_paging),
+                            method='POST', url='http://neo4j_service/v1/neo4j/relations/query')
+    param = {"project_code": project_code, "zone": "gr", "folder": 'fake_user/fake_folder',
+             "source_type": 'Folder', "stream": "true"}
+    header = {'Authorization': 'fake token'}
+    res = await test_async_client_auth.get(test_get_file_api, headers=header, query_string=param)
+    assert res.status_code == 200
+    assert res.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in res.text.splitlines()]
+    assert lines == nodes
+    assert len(httpx_mock.get_requests()) == upstream_calls
+
+
+def tree_relation_callback(tree):
+    def callback(request: httpx.Request):
+        payload = json.loads(request.content)
+        children = tree[payload["start_params"]["name"]]
+        return httpx.Response(status_code=200, json=[{'end_node': node} for node in children])
+    return callback
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("max_depth, expected", [
+    (None, ["folder_a", "file_1", "folder_b", "file_2", "file_3"]),
+    (2, ["folder_a", "file_1", "folder_b", "file_2"]),
+])
+async def test_get_files_recursive_should_stream_tree(test_async_client_auth, mocker, httpx_mock: HTTPXMock,
+                                                      max_depth, expected):
+    tree = {
+        "fake_folder": [{"name": "folder_a", "labels": ["Folder", "Greenroom"], "folder_relative_path": "fake_user/fake_folder"},
+                        {"name": "file_1", "labels": ["File", "Greenroom"]}],
+        "folder_a": [{"name": "folder_b", "labels": ["Folder", "Greenroom"],
+                      "folder_relative_path": "fake_user/fake_folder/folder_a"},
+                     {"name": "file_2", "labels": ["File", "Greenroom"]}],
+        "folder_b": [{"name": "file_3", "labels": ["File", "Greenroom"]}],
+    }
+    permission = mocker.patch('app.routers.v1.api_file.check_permission',
+                              return_value={"code": 200,
+                                            'project_code': project_code,
+                                            'uploader': 'fake_user'})
+    folder_exist = mocker.patch('app.routers.v1.api_file.check_folder_exist',
+                                return_value=(EAPIResponseCode.success, ''))
+    httpx_mock.add_callback(tree_relation_callback(tree),
+                            method='POST', url='http://neo4j_service/v1/neo4j/relations/query')
+    param = {"project_code": project_code, "zone": "gr", "folder": 'fake_user/fake_folder',
+             "source_type": 'Folder', "recursive": "true"}
+    if max_depth:
+        param["max_depth"] = max_depth
+    header = {'Authorization': 'fake token'}
+    res = await test_async_client_auth.get(test_get_file_api, headers=header, query_string=param)
+    assert res.status_code == 200
+    assert res.headers["content-type"] == "application/x-ndjson"
+    assert [json.loads(line)["name"] for line in res.text.splitlines()] == expected
+    assert permission.call_count == 1
+    assert folder_exist.call_count == 1
+    child_query = json.loads(httpx_mock.get_requests()[1].content)
+    assert child_query["start_label"] == ["Folder", ConfigClass.GREEN_ZONE_LABEL]
+    assert child_query["start_params"] == {"project_code": project_code, "name": "folder_a",
+                                           "folder_relative_path": "fake_user/fake_folder"}
+
 @pytest.mark.asyncio
 async def test_get_folder_without_token(test_async_client):
     param = {
@@ -302,6 +463,37 @@ async def test_query_file_by_geid_should_get_200(test_async_client_auth, mocker)
         assert entity["geid"] in payload['geid']
     
 
+@pytest.mark.asyncio
+@pytest.mark.parametrize("geid_count", [2, 50, 500])
+async def test_query_file_by_geid_should_check_permission_once_per_project_zone(
+        test_async_client_auth, mocker, geid_count):
+    geid_list = [f"geid_{index}" for index in range(geid_count)]
+    payload = {'geid': geid_list}
+    header = {'Authorization': 'fake token'}
+    nodes = {}
+    for index, geid in enumerate(geid_list):
+        zone_label = "cr" if index % 2 else "gr"
+        nodes[geid] = {
+            "labels": ["File", zone_label],
+            "archived": False,
+            "project_code": project_code,
+            "display_path": f"fake_user/fake_file_{index}"
+        }
+    mocker.patch('app.routers.v1.api_file.batch_query_node_by_geid',
+                 return_value=(geid_list, nodes))
+    permission = mocker.patch('app.routers.v1.api_file.check_permission',
+                              return_value={"code": 200,
+                                            'project_code': project_code,
+                                            'uploader': 'fake_user'})
+    res = await test_async_client_auth.post(test_query_geid_api, headers=header, json=payload)
+    assert res.status_code == 200
+    result = res.json().get('result')
+    assert len(result) == geid_count
+    assert [entity["geid"] for entity in result] == geid_list
+    assert all(entity["status"] == 'success' for entity in result)
+    assert permission.call_count == 2
+
+
 @pytest.mark.asyncio
 async def test_query_file_by_geid_wiht_token(test_async_client):
     payload = {'geid': ["file_geid", "folder_file_geid"]}
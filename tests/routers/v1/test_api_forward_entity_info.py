@@ -18,10 +18,13 @@
 # permissions and limitations under the Licence.
 # 
 
+import re
+import httpx
 import pytest
 from pytest_httpx import HTTPXMock
 
 test_file_exist_api = "/v1/project/test_project/file/exist"
+test_files_exist_api = "/v1/project/test_project/files/exist"
 project_code = "test_project"
 
 @pytest.mark.asyncio
@@ -58,3 +61,72 @@ async def test_file_exist_without_token_should_return_200(test_async_client):
     assert res_json.get('code') == 401
     assert res_json.get('error_msg') == "Token required"
 
+
+@pytest.mark.asyncio
+async def test_files_exist_should_return_map_of_path_to_geid(test_async_client_auth, httpx_mock: HTTPXMock):
+    existing = {"fake_user/file_1": "geid_1", "fake_user/file_3": "geid_3"}
+
+    def file_exist_callback(request: httpx.Request):
+        file_relative_path = request.url.params["file_relative_path"]
+        if file_relative_path in existing:
+            return httpx.Response(status_code=200, json={
+                "code": 200,
+                "result": {"global_entity_id": existing[file_relative_path]}})
+        return httpx.Response(status_code=404, json={"code": 404, "result": {}})
+
+    httpx_mock.add_callback(
+        file_exist_callback,
+        method='GET',
+        url=re.compile(r'^http://fileinfo_service/v1/project/test_project/file/exist.*'),
+    )
+    payload = {
+        "zone": "zone",
+        "file_relative_paths": ["fake_user/file_1", "fake_user/file_2", "fake_user/file_3", "fake_user/file_1"]
+    }
+    header = {'Authorization': 'fake token'}
+    res = await test_async_client_auth.post(test_files_exist_api, headers=header, json=payload)
+    assert res.status_code == 200
+    result = res.json()["result"]
+    assert result == {
+        "fake_user/file_1": {"exists": True, "geid": "geid_1"},
+        "fake_user/file_2": {"exists": False, "geid": None},
+        "fake_user/file_3": {"exists": True, "geid": "geid_3"},
+    }
+    assert len(httpx_mock.get_requests()) == 3
+
+
+@pytest.mark.asyncio
+async def test_files_exist_should_report_upstream_errors_per_path(test_async_client_auth, httpx_mock: HTTPXMock):
+    def file_exist_callback(request: httpx.Request):
+        file_relative_path = request.url.params["file_relative_path"]
+        if file_relative_path == "fake_user/file_2":
+            raise httpx.ReadTimeout("timed out", request=request)
+        if file_relative_path == "fake_user/file_3":
+            return httpx.Response(status_code=500, text="upstream error")
+        return httpx.Response(status_code=404, json={"code": 404, "result": {}})
+
+    httpx_mock.add_callback(
+        file_exist_callback,
+        method='GET',
+        url=re.compile(r'^http://fileinfo_service/v1/project/test_project/file/exist.*'),
+    )
+    payload = {
+        "zone": "zone",
+        "file_relative_paths": ["fake_user/file_1", "fake_user/file_2", "fake_user/file_3"]
+    }
+    header = {'Authorization': 'fake token'}
+    res = await test_async_client_auth.post(test_files_exist_api, headers=header, json=payload)
+    assert res.status_code == 200
+    result = res.json()["result"]
+    assert result["fake_user/file_1"] == {"exists": False, "geid": None}
+    assert result["fake_user/file_2"] == {"exists": None, "geid": None, "error_msg": "timed out"}
+    assert result["fake_user/file_3"] == {"exists": None, "geid": None, "error_msg": "upstream error"}
+
+
+@pytest.mark.asyncio
+async def test_files_exist_without_token_should_return_401(test_async_client):
+    payload = {"zone": "zone", "file_relative_paths": ["fake_user/fake_file"]}
+    res = await test_async_client.post(test_files_exist_api, json=payload)
+    res_json = res.json()
+    assert res_json.get('code') == 401
+    assert res_json.get('error_msg') == "Token required"
@@ -21,6 +21,10 @@
 from sre_constants import IN
 import pytest
 from unittest.mock import patch
+import json
+from app.config import ConfigClass
+from app.resources.hpc_watcher import stop_job_watchers, get_job_watcher
+from app.routers.v1.api_hpc import APIProject
 from app.models.error_model import HPCError
 from tests.helper import EAPIResponseCode
 
@@ -145,6 +149,138 @@ async def test_hpc_get_job_wrong_id_should_return_404(test_async_client, mocker)
     assert response.get('error_msg') == "Job ID not found"
 
 
+@pytest.mark.asyncio
+async def test_hpc_get_jobs_status_should_return_200(test_async_client, mocker):
+    payload = {
+        "host": "http://host",
+        "username": "username",
+        "token": "fake-hpc-token",
+        "job_ids": ["12345", "12346"]
+    }
+    status = {
+        "12345": {"code": 200, "job_state": "COMPLETED", "error_msg": ""},
+        "12346": {"code": 404, "job_state": None, "error_msg": "Job ID not found"}
+    }
+    mocker.patch('app.routers.v1.api_hpc.get_hpc_jobs_status', return_value=status)
+    header = {'Authorization': 'fake token'}
+    res = await test_async_client.post("/v1/hpc/jobs/status", headers=header, json=payload)
+    response = res.json()
+    assert response.get('code') == 200
+    assert response.get('result') == status
+
+
+@pytest.mark.asyncio
+async def test_hpc_get_jobs_status_with_too_many_jobs_should_return_400(test_async_client, monkeypatch):
+    monkeypatch.setattr(ConfigClass, 'HPC_JOB_STATUS_MAX_JOBS', 2)
+    payload = {
+        "host": "http://host",
+        "username": "username",
+        "token": "fake-hpc-token",
+        "job_ids": ["1", "2", "3"]
+    }
+    header = {'Authorization': 'fake token'}
+    res = await test_async_client.post("/v1/hpc/jobs/status", headers=header, json=payload)
+    response = res.json()
+    assert response.get('code') == 400
+    assert response.get('result') == {}
+
+
+@pytest.fixture
+def watched_jobs(mocker, monkeypatch):
+    monkeypatch.setattr(ConfigClass, 'HPC_WATCH_MIN_INTERVAL', 0.01)
+    monkeypatch.setattr(ConfigClass, 'HPC_WATCH_IDLE_TTL', 0.05)
+    states = {"1": ["PENDING", "RUNNING", "COMPLETED"], "2": ["RUNNING", "FAILED"]}
+
+    async def get_hpc_jobs_status(job_ids, host, username, token):
+        return {job_id: {"code": 200,
+                         "job_state": states[job_id].pop(0) if len(states[job_id]) > 1 else states[job_id][0],
+                         "error_msg": ""}
+                for job_id in job_ids}
+
+    mocker.patch('app.resources.hpc_watcher.get_hpc_jobs_status', get_hpc_jobs_status)
+    return states
+
+
+@pytest.mark.asyncio
+async def test_hpc_watch_job_should_return_on_transition(test_async_client, watched_jobs):
+    params = {
+        "host": "http://host",
+        "username": "username",
+        "token": "fake-hpc-token",
+        "state": "PENDING"
+    }
+    header = {'Authorization': 'fake token'}
+    res = await test_async_client.get("/v1/hpc/job/1/watch", headers=header, query_string=params)
+    response = res.json()
+    assert response.get('code') == 200
+    assert response.get('result')["changed"] is True
+    assert response.get('result')["job_state"] == "RUNNING"
+    await stop_job_watchers()
+
+
+@pytest.mark.asyncio
+async def test_hpc_watch_job_without_protocol_should_return_400(test_async_client):
+    params = {
+        "host": "host",
+        "username": "username",
+        "token": "fake-hpc-token"
+    }
+    header = {'Authorization': 'fake token'}
+    res = await test_async_client.get("/v1/hpc/job/1/watch", headers=header, query_string=params)
+    assert res.json().get('code') == 400
+
+
+@pytest.mark.asyncio
+async def test_hpc_job_events_should_stream_transitions(test_async_client, watched_jobs):
+    params = {
+        "host": "http://host",
+        "username": "username",
+        "token": "fake-hpc-token",
+        "job_ids": "1,2"
+    }
+    header = {'Authorization': 'fake token'}
+    res = await test_async_client.get("/v1/hpc/jobs/events", headers=header, query_string=params)
+    assert res.status_code == 200
+    assert res.headers["content-type"].startswith("text/event-stream")
+    events = [json.loads(line[len("data: "):]) for line in res.text.splitlines() if line.startswith("data: ")]
+    assert [event["job_state"] for event in events if event["job_id"] == "1"] == ["PENDING", "RUNNING", "COMPLETED"]
+    assert [event["job_state"] for event in events if event["job_id"] == "2"] == ["RUNNING", "FAILED"]
+    await stop_job_watchers()
+
+
+class FakeRequest:
+    def __init__(self, disconnect_after=None):
+        self.disconnect_after = disconnect_after
+        self.checks = 0
+
+    async def is_disconnected(self):
+        self.checks += 1
+        return self.disconnect_after is not None and self.checks > self.disconnect_after
+
+
+@pytest.mark.asyncio
+async def test_hpc_job_events_should_stop_when_client_disconnects(watched_jobs, monkeypatch):
+    monkeypatch.setattr(ConfigClass, 'HPC_WATCH_HEARTBEAT', 0.01)
+    watched_jobs["3"] = ["RUNNING"]
+    watcher = get_job_watcher("http://host", "username", "fake-hpc-token")
+    request = FakeRequest(disconnect_after=2)
+    events = [event async for event in APIProject()._job_events(request, watcher, ["3"])]
+    assert len(events) == 2
+    assert request.checks == 3
+    assert watcher._waiting["3"] == 0
+    await stop_job_watchers()
+
+
+@pytest.mark.asyncio
+async def test_hpc_job_events_should_end_after_max_age(watched_jobs, monkeypatch):
+    monkeypatch.setattr(ConfigClass, 'HPC_WATCH_STREAM_MAX_AGE', 0)
+    watched_jobs["3"] = ["RUNNING"]
+    watcher = get_job_watcher("http://host", "username", "fake-hpc-token")
+    events = [event async for event in APIProject()._job_events(FakeRequest(), watcher, ["3"])]
+    assert events == ['event: timeout\ndata: {"pending": ["3"]}\n\n']
+    await stop_job_watchers()
+
+
 @pytest.mark.asyncio
 async def test_hpc_list_nodes_should_return_200(test_async_client, mocker):
     params = {
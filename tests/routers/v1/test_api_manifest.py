@@ -20,10 +20,14 @@
 
 import pytest
 from tests.helper import EAPIResponseCode
+from app.config import ConfigClass
+from app.resources.database_service import manifest_cache
 
 test_api = "/v1/manifest"
 test_export_api = "/v1/manifest/export"
 test_manifest_attach_api = "/v1/manifest/attach"
+test_manifest_cache_api = "/v1/manifest/cache"
+test_manifest_bulk_attach_api = "/v1/manifest/attach/bulk"
 project_code = "cli"
 
 @pytest.mark.asyncio
@@ -40,10 +44,8 @@ async def test_get_attributes_should_return_200(test_async_client_auth, mocker):
     header = {'Authorization': 'fake token'}
     mocker.patch('app.routers.v1.api_manifest.check_permission',
                  return_value={'code': 200})
-    mocker.patch('app.routers.v1.api_manifest.RDConnection.get_manifest_name_from_project_in_db', \
-        mock_get_manifest_name_from_project_in_db)
-    mocker.patch('app.routers.v1.api_manifest.RDConnection.get_attributes_in_manifest_in_db', \
-        mock_get_attributes_in_manifest_in_db)
+    mocker.patch('app.routers.v1.api_manifest.RDConnection.get_manifests_with_attributes_in_db', \
+        mock_get_manifests_with_attributes_in_db)
     res = await test_async_client_auth.get(test_api, headers=header, query_string=payload)
     res_json = res.json()
     assert res_json.get('code')== 200
@@ -92,10 +94,8 @@ async def test_export_attributes_should_return_200(test_async_client_auth, mocke
     headers = {'Authorization': 'fake token'}
     mocker.patch('app.routers.v1.api_manifest.check_permission',\
         return_value={'code': 200})
-    mocker.patch('app.routers.v1.api_manifest.RDConnection.get_manifest_name_from_project_in_db', \
-        mock_get_manifest_name_from_project_in_db)
-    mocker.patch('app.routers.v1.api_manifest.RDConnection.get_attributes_in_manifest_in_db', \
-        mock_get_attributes_in_manifest_in_db)
+    mocker.patch('app.routers.v1.api_manifest.RDConnection.get_manifests_with_attributes_in_db', \
+        mock_get_manifests_with_attributes_in_db)
     res = await test_async_client_auth.get(test_export_api, headers=headers, query_string=param)
     res_json = res.json()
     assert res_json.get('code') == 200
@@ -122,8 +122,8 @@ async def test_export_attributes_not_exist_should_return_404(test_async_client_a
     headers = {'Authorization': 'fake token'}
     mocker.patch('app.routers.v1.api_manifest.check_permission',\
         return_value={'code': 200})
-    mocker.patch('app.routers.v1.api_manifest.RDConnection.get_manifest_name_from_project_in_db', \
-        mock_get_manifest_name_from_project_in_db)
+    mocker.patch('app.routers.v1.api_manifest.RDConnection.get_manifests_with_attributes_in_db', \
+        mock_get_manifests_with_attributes_in_db)
     res = await test_async_client_auth.get(test_export_api, headers=headers, query_string=param)
     res_json = res.json()
     assert res_json.get('code') == 404
@@ -319,16 +319,133 @@ async def test_fail_to_attach_attributes_return_404(test_async_client_auth, mock
     assert error == 'File Not Exist'
 
 
-def mock_get_manifest_name_from_project_in_db(arg1, arg2):
+@pytest.mark.asyncio
+async def test_bulk_attach_should_check_permission_once_and_batch_attach(test_async_client_auth, mocker,
+                                                                         monkeypatch):
+    monkeypatch.setattr(ConfigClass, 'MANIFEST_ATTACH_BATCH_SIZE', 2)
+    file_names = [f"fake_user/file_{index}" for index in range(5)]
+    payload = {
+        "manifest_name": "fake_manifest",
+        "project_code": project_code,
+        "zone": "gr",
+        "file_names": file_names,
+        "attributes": {"attr1": "a1"}
+    }
+    header = {'Authorization': 'fake token'}
+
+    async def mock_query_file_in_project(project_code, file_name, zone):
+        if file_name == "fake_user/file_2":
+            return []
+        return {"code": 200, "result": [{"global_entity_id": f"geid_{file_name[-1]}"}]}
+
+    permission = mocker.patch('app.routers.v1.api_manifest.check_permission',
+                              return_value={'project_role': 'admin', 'project_code': project_code})
+    mocker.patch('app.routers.v1.api_manifest.query_file_in_project', mock_query_file_in_project)
+    mocker.patch('app.routers.v1.api_manifest.RDConnection.get_manifest_name_from_project_in_db',
+                 mock_get_manifest_name_from_project_in_db)
+    attach = mocker.patch('app.routers.v1.api_manifest.attach_manifest_to_file',
+                          return_value={"code": 200, "result": []})
+    res = await test_async_client_auth.post(test_manifest_bulk_attach_api, headers=header, json=payload)
+    res_json = res.json()
+    assert res_json.get('code') == 200
+    assert [r["file_name"] for r in res_json.get('result')] == file_names
+    assert [r["status"] for r in res_json.get('result')] == \
+        ["success", "success", "File Not Exist", "success", "success"]
+    assert permission.call_count == 1
+    assert attach.call_count == 2
+    attached = sorted(geid for call in attach.call_args_list for geid in call.args[0]["global_entity_id"])
+    assert attached == ["geid_0", "geid_1", "geid_3", "geid_4"]
+
+
+@pytest.mark.asyncio
+async def test_bulk_attach_should_report_upstream_error_per_file(test_async_client_auth, mocker):
+    file_names = ["fake_user/file_0", "fake_user/file_1"]
+    payload = {
+        "manifest_name": "fake_manifest",
+        "project_code": project_code,
+        "zone": "gr",
+        "file_names": file_names,
+        "attributes": {"attr1": "a1"}
+    }
+    header = {'Authorization': 'fake token'}
+
+    async def mock_query_file_in_project(project_code, file_name, zone):
+        return {"code": 200, "result": [{"global_entity_id": f"geid_{file_name[-1]}"}]}
+
+    mocker.patch('app.routers.v1.api_manifest.check_permission',
+                 return_value={'project_role': 'admin', 'project_code': project_code})
+    mocker.patch('app.routers.v1.api_manifest.query_file_in_project', mock_query_file_in_project)
+    mocker.patch('app.routers.v1.api_manifest.RDConnection.get_manifest_name_from_project_in_db',
+                 mock_get_manifest_name_from_project_in_db)
+    mocker.patch('app.routers.v1.api_manifest.attach_manifest_to_file',
+                 return_value={"code": 500, "error_msg": "neo4j unavailable", "result": []})
+    res = await test_async_client_auth.post(test_manifest_bulk_attach_api, headers=header, json=payload)
+    res_json = res.json()
+    assert res_json.get('code') == 200
+    assert [r["status"] for r in res_json.get('result')] == ["[Internal] neo4j unavailable"] * 2
+    assert [r["global_entity_id"] for r in res_json.get('result')] == ["geid_0", "geid_1"]
+
+
+@pytest.mark.asyncio
+async def test_bulk_attach_no_access_should_return_403(test_async_client_auth, mocker):
+    payload = {
+        "manifest_name": "fake_manifest",
+        "project_code": project_code,
+        "zone": "gr",
+        "file_names": ["fake_user/file_1"],
+        "attributes": {"attr1": "a1"}
+    }
+    header = {'Authorization': 'fake token'}
+    mocker.patch('app.routers.v1.api_manifest.check_permission',
+                 return_value={'error_msg': "Permission Denied", 'code': EAPIResponseCode.forbidden, 'result': {}})
+    res = await test_async_client_auth.post(test_manifest_bulk_attach_api, headers=header, json=payload)
+    res_json = res.json()
+    assert res_json.get('code') == 403
+    assert res_json.get('error_msg') == 'Permission Denied'
+
+
+@pytest.mark.asyncio
+async def test_invalidate_manifest_cache_should_return_200(test_async_client_auth, mocker):
+    param = {'project_code': project_code}
+    headers = {'Authorization': 'fake token'}
+    mocker.patch('app.routers.v1.api_manifest.check_permission',
+                 return_value={'project_role': 'admin', 'project_code': project_code})
+    manifest_cache.set(project_code, (None, [], 0))
+    res = await test_async_client_auth.delete(test_manifest_cache_api, headers=headers, query_string=param)
+    res_json = res.json()
+    assert res_json.get('code') == 200
+    assert res_json.get('result') == {'project_code': project_code, 'invalidated': 1}
+    assert project_code not in manifest_cache
+
+
+@pytest.mark.asyncio
+async def test_invalidate_manifest_cache_without_admin_role_should_return_403(test_async_client_auth, mocker):
+    param = {'project_code': project_code}
+    headers = {'Authorization': 'fake token'}
+    mocker.patch('app.routers.v1.api_manifest.check_permission',
+                 return_value={'project_role': 'contributor', 'project_code': project_code,
+                               'uploader': 'test_user'})
+    manifest_cache.set(project_code, (None, [], 0))
+    res = await test_async_client_auth.delete(test_manifest_cache_api, headers=headers, query_string=param)
+    res_json = res.json()
+    assert res_json.get('code') == 403
+    assert res_json.get('error_msg') == "Permission Denied"
+    assert project_code in manifest_cache
+
+
+async def mock_get_manifest_name_from_project_in_db(arg1, arg2):
     if arg2.get("manifest_name", "") == "Manifest1":
         return ""
     result = [{'name': "fake_manifest", 'id': 1}]
     return result
 
 
-def mock_get_attributes_in_manifest_in_db(arg1, arg2):
+async def mock_get_manifests_with_attributes_in_db(arg1, project_code, manifest_name=None):
+    if manifest_name == "Manifest1":
+        return []
     result = [
         {
+            'id': 1,
             'manifest_name': 'fake_manifest',
             'attributes': [{"name": "fake_attribute", "type": "type", "optional": True,
                                 "value": ""}]
@@ -0,0 +1,51 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+
+import pytest
+from app.config import ConfigClass
+from app.commons.cache import TTLCache
+
+test_cache_metrics_api = "/v1/metrics/cache"
+test_pool_metrics_api = "/v1/metrics/pools"
+
+
+@pytest.mark.asyncio
+async def test_cache_metrics_should_return_200(test_async_client):
+    cache = TTLCache("test_metrics", maxsize=10, ttl=60)
+    cache.set("key", "value")
+    cache.get("key")
+    res = await test_async_client.get(test_cache_metrics_api)
+    assert res.status_code == 200
+    result = res.json().get('result')
+    assert result["test_metrics"]["hits"] == 1
+    assert "identity" in result
+
+
+@pytest.mark.asyncio
+async def test_pool_metrics_should_return_200(test_async_client):
+    res = await test_async_client.get(test_pool_metrics_api)
+    assert res.status_code == 200
+    worker = res.json().get('result')["worker"]
+    assert worker["size"] == 4
+    assert worker["pending"] == 0
+    database = res.json().get('result')["database"]
+    assert database["max_size"] == ConfigClass.DB_ASYNC_POOL_MAX_SIZE
+    assert "asyncpg" not in res.json().get('result')
@@ -18,16 +18,30 @@
 # permissions and limitations under the Licence.
 # 
 
+import re
+import asyncio
+import time
+import httpx
 import pytest
 from requests.models import Response
 from tests.helper import EAPIResponseCode
+from app.config import ConfigClass
 
 test_project_api = "/v1/projects"
 test_get_project_file_api = "/v1/project/test_project/files"
 test_get_project_folder_api = "/v1/project/test_project/folder"
+test_file_exist_url = re.compile(r"http://fileinfo_service/v1/project/test_project/file/exist/\?.*")
 project_code = "test_project"
 
 
+def mock_file_exist(httpx_mock, status_code=404, existing=()):
+    def callback(request: httpx.Request):
+        if request.url.params["file_relative_path"].split('/')[-1] in existing:
+            return httpx.Response(status_code=200, json={"code": 200, "result": {}})
+        return httpx.Response(status_code=status_code, json={"code": status_code, "result": []})
+    httpx_mock.add_callback(callback, method='GET', url=test_file_exist_url)
+
+
 @pytest.mark.asyncio
 async def test_get_project_list_should_return_200(test_async_client_auth, mocker):
     test_project = ["project1", "project2", "project3"]
@@ -49,8 +63,41 @@ async def test_get_project_list_without_token_should_return_401(test_async_clien
     assert res_json.get('error_msg') == "Token required"
 
 
+class DelayedUpstreamTransport(httpx.AsyncBaseTransport):
+    """
+    Upstream stub answering hpc job queries after 2 seconds and
+    everything else immediately
+    """
+
+    async def handle_async_request(self, request):
+        if request.url.path.startswith('/v1/hpc/job/'):
+            await asyncio.sleep(2)
+            return httpx.Response(200, json={"code": 200, "result": {"job_id": "1", "job_state": "RUNNING"}})
+        return httpx.Response(200, json=[{"name": "project1", "code": "project1",
+                                          "id": 1, "global_entity_id": "geid"}])
+
+
+@pytest.mark.asyncio
+async def test_slow_upstream_should_not_block_project_list(test_async_client_auth, monkeypatch):
+    monkeypatch.setattr(httpx.AsyncClient, "_transport_for_url",
+                        lambda self, url: DelayedUpstreamTransport())
+    header = {'Authorization': 'fake token'}
+    job_param = {'host': 'http://hpc_host', 'username': 'test_user', 'token': 'token'}
+    start = time.monotonic()
+    slow_request = asyncio.ensure_future(test_async_client_auth.get("/v1/hpc/job/1", query_string=job_param))
+    await asyncio.sleep(0.1)
+    responses = await asyncio.gather(*[test_async_client_auth.get(test_project_api, headers=header)
+                                       for _ in range(10)])
+    project_elapsed = time.monotonic() - start
+    slow_response = await slow_request
+    assert all(res.status_code == 200 for res in responses)
+    assert project_elapsed < 1
+    assert slow_response.status_code == 200
+    assert time.monotonic() - start >= 2
+
+
 @pytest.mark.asyncio
-async def test_upload_files_into_project_should_return_200(test_async_client_auth, mocker):
+async def test_upload_files_into_project_should_return_200(test_async_client_auth, mocker, httpx_mock):
     payload = {
         "operator": "test_user",
         "upload_message": "test",
@@ -64,8 +111,7 @@ async def test_upload_files_into_project_should_return_200(test_async_client_aut
         }
     mocker.patch('app.routers.v1.api_project.validate_upload_event',
                  return_value=None)
-    mocker.patch('app.routers.v1.api_project.void_check_file_in_zone',
-                 return_value={})
+    mock_file_exist(httpx_mock, status_code=404)
     mock_response = Response()
     mock_response.status_code = 200
     mock_response._content = b'{ "result" : "SUCCESSED" }'
@@ -114,8 +160,8 @@ async def test_upload_for_project_member_should_return_200(test_async_client_pro
     }
     mocker.patch('app.routers.v1.api_project.validate_upload_event',
                  return_value=None)
-    mocker.patch('app.routers.v1.api_project.void_check_file_in_zone',
-                 return_value={})
+    mocker.patch('app.routers.v1.api_project.check_file_in_zone',
+                 return_value=(False, ''))
     mocker.patch('app.routers.v1.api_project.get_project_role',
                  return_value=('User not in the project', 400))
     header = {'Authorization': 'fake token'}
@@ -141,8 +187,8 @@ async def test_upload_for_contributor_into_core_should_return_403(test_async_cli
     }
     mocker.patch('app.routers.v1.api_project.validate_upload_event',
                  return_value=None)
-    mocker.patch('app.routers.v1.api_project.void_check_file_in_zone',
-                 return_value={})
+    mocker.patch('app.routers.v1.api_project.check_file_in_zone',
+                 return_value=(False, ''))
     mocker.patch('app.routers.v1.api_project.get_project_role',
                  return_value=("contributor", 200))
     header = {'Authorization': 'fake token'}
@@ -155,7 +201,7 @@ async def test_upload_for_contributor_into_core_should_return_403(test_async_cli
 
 
 @pytest.mark.asyncio
-async def test_upload_with_conflict_should_return_409(test_async_client_auth, mocker):
+async def test_upload_with_conflict_should_return_409(test_async_client_auth, mocker, httpx_mock):
     payload = {
         "operator": "test_user",
         "upload_message": "test",
@@ -169,8 +215,7 @@ async def test_upload_with_conflict_should_return_409(test_async_client_auth, mo
     }
     mocker.patch('app.routers.v1.api_project.validate_upload_event',
                  return_value=None)
-    mocker.patch('app.routers.v1.api_project.void_check_file_in_zone',
-                 return_value={})
+    mock_file_exist(httpx_mock, status_code=404)
     mock_response = Response()
     mock_response.status_code = 409
     mock_response._content = b'{ "error_msg" : "mock_conflict" }'
@@ -184,7 +229,101 @@ async def test_upload_with_conflict_should_return_409(test_async_client_auth, mo
 
 
 @pytest.mark.asyncio
-async def test_upload_with_internal_error_should_return_500(test_async_client_auth, mocker):
+async def test_upload_with_existing_files_should_report_every_conflict(test_async_client_auth, mocker, httpx_mock):
+    payload = {
+        "operator": "test_user",
+        "upload_message": "test",
+        "type": "processed",
+        "zone": "zone",
+        "filename": "fake.png",
+        "job_type": "AS_FILE",
+        "dcm_id": "undefined",
+        "current_folder_node": "",
+        "data": [{"resumable_filename": f"fake_{index}.png", "resumable_relative_path": "folder"}
+                 for index in range(10)]
+    }
+    mock_file_exist(httpx_mock, status_code=404, existing=["fake_3.png", "fake_7.png"])
+    mocker.patch('app.routers.v1.api_project.validate_upload_event',
+                 return_value=None)
+    transfer = mocker.patch('app.routers.v1.api_project.transfer_to_pre')
+    header = {'Authorization': 'fake token'}
+    response = await test_async_client_auth.post(test_get_project_file_api, headers=header, json=payload)
+    res_json = response.json()
+    assert res_json.get('code') == 409
+    assert res_json.get('error_msg') == "File with that name already exists"
+    assert res_json.get('result') == ["folder/fake_3.png", "folder/fake_7.png"]
+    assert len(httpx_mock.get_requests()) == 10
+    transfer.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_upload_when_file_check_fails_should_not_report_conflict(test_async_client_auth, mocker, httpx_mock):
+    payload = {
+        "operator": "test_user",
+        "upload_message": "test",
+        "type": "processed",
+        "zone": "zone",
+        "filename": "fake.png",
+        "job_type": "AS_FILE",
+        "dcm_id": "undefined",
+        "current_folder_node": "",
+        "data": [{"resumable_filename": "fake.png", "resumable_relative_path": "folder"}]
+    }
+    mock_file_exist(httpx_mock, status_code=500)
+    mocker.patch('app.routers.v1.api_project.validate_upload_event',
+                 return_value=None)
+    transfer = mocker.patch('app.routers.v1.api_project.transfer_to_pre')
+    header = {'Authorization': 'fake token'}
+    response = await test_async_client_auth.post(test_get_project_file_api, headers=header, json=payload)
+    res_json = response.json()
+    assert res_json.get('code') == 500
+    assert list(res_json.get('result')) == ["folder/fake.png"]
+    transfer.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_upload_should_check_files_concurrently_within_limit(test_async_client_auth, mocker, monkeypatch):
+    monkeypatch.setattr(ConfigClass, 'PREUPLOAD_CHECK_CONCURRENCY', 5)
+    payload = {
+        "operator": "test_user",
+        "upload_message": "test",
+        "type": "processed",
+        "zone": "zone",
+        "filename": "fake.png",
+        "job_type": "AS_FILE",
+        "dcm_id": "undefined",
+        "current_folder_node": "",
+        "data": [{"resumable_filename": f"fake_{index}.png", "resumable_relative_path": ""}
+                 for index in range(50)]
+    }
+    in_flight = {"current": 0, "peak": 0}
+
+    async def mock_check_file_in_zone(data, file, project_code):
+        in_flight["current"] += 1
+        in_flight["peak"] = max(in_flight["peak"], in_flight["current"])
+        await asyncio.sleep(0.05)
+        in_flight["current"] -= 1
+        return False, ''
+
+    mocker.patch('app.routers.v1.api_project.validate_upload_event',
+                 return_value=None)
+    mocker.patch('app.routers.v1.api_project.check_file_in_zone',
+                 mock_check_file_in_zone)
+    mock_response = Response()
+    mock_response.status_code = 200
+    mock_response._content = b'{ "result" : "SUCCESSED" }'
+    mocker.patch('app.routers.v1.api_project.transfer_to_pre',
+                 return_value=mock_response)
+    header = {'Authorization': 'fake token'}
+    start = time.monotonic()
+    response = await test_async_client_auth.post(test_get_project_file_api, headers=header, json=payload)
+    assert response.status_code == 200
+    assert in_flight["peak"] == 5
+    assert time.monotonic() - start < 50 * 0.05
+
+
+@pytest.mark.asyncio
+async def test_upload_with_internal_error_should_return_500(test_async_client_auth, mocker, httpx_mock):
     payload = {
         "operator": "test_user",
         "upload_message": "test",
@@ -198,8 +337,7 @@ async def test_upload_with_internal_error_should_return_500(test_async_client_au
     }
     mocker.patch('app.routers.v1.api_project.validate_upload_event',
                  return_value=None)
-    mocker.patch('app.routers.v1.api_project.void_check_file_in_zone',
-                 return_value={})
+    mock_file_exist(httpx_mock, status_code=404)
     mock_response = Response()
     mock_response.status_code = 400
     mock_response._content = b'{ "error_msg" : "mock_internal_error" }'
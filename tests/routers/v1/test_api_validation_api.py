@@ -19,12 +19,14 @@
 # 
 
 import pytest
+from app.config import ConfigClass
 from app.models.error_model import InvalidEncryptionError
 
 
 test_validate_id_api = '/v1/validate/gid'
 test_validate_manifest_api = '/v1/validate/manifest'
 test_validate_env_api = '/v1/validate/env'
+test_validate_manifests_api = '/v1/validate/manifests'
 
 
 @pytest.mark.asyncio
@@ -59,8 +61,8 @@ async def test_validate_attribute_should_return_200(test_async_client_auth, mock
             }
         }
     }
-    mocker.patch('app.routers.v1.api_validation.RDConnection.get_manifest_name_from_project_in_db',
-             mock_get_manifest_name_from_project_in_db)
+    mocker.patch('app.routers.v1.api_validation.RDConnection.get_manifests_with_attributes_in_db',
+                 mock_get_manifests_with_attributes_in_db)
     mocker.patch('app.routers.v1.api_validation.ManifestValidator.has_valid_attributes',
                  mock_has_valid_attributes)
     res = await test_async_client_auth.post(test_validate_manifest_api, json=payload)
@@ -69,6 +71,30 @@ async def test_validate_attribute_should_return_200(test_async_client_auth, mock
     assert res_json.get('result') == 'Valid'
 
 
+@pytest.mark.asyncio
+async def test_validate_attribute_should_look_up_manifest_once(test_async_client_auth, mocker):
+    payload = {
+        "manifest_json": {
+            "manifest_name": "fake_manifest",
+            "project_code": "test_project",
+            "attributes": {"attr1": "a1", "attr2": "text"}
+        }
+    }
+    lookups = []
+
+    async def get_manifests_with_attributes_in_db(arg1, project_code, manifest_name=None):
+        lookups.append((project_code, manifest_name))
+        return await mock_get_manifests_with_attributes_in_db(arg1, project_code, manifest_name)
+
+    mocker.patch('app.routers.v1.api_validation.RDConnection.get_manifests_with_attributes_in_db',
+                 get_manifests_with_attributes_in_db)
+    res = await test_async_client_auth.post(test_validate_manifest_api, json=payload)
+    res_json = res.json()
+    assert res_json.get('code') == 200
+    assert res_json.get('result') == 'Valid'
+    assert lookups == [("test_project", "fake_manifest")]
+
+
 @pytest.mark.asyncio
 async def test_validate_attribute_with_manifest_not_found_return_404(test_async_client_auth, mocker):
     payload = {
@@ -82,8 +108,8 @@ async def test_validate_attribute_with_manifest_not_found_return_404(test_async_
             }
         }
     }
-    mocker.patch('app.routers.v1.api_validation.RDConnection.get_manifest_name_from_project_in_db',
-                 mock_get_manifest_name_from_project_in_db)
+    mocker.patch('app.routers.v1.api_validation.RDConnection.get_manifests_with_attributes_in_db',
+                 mock_get_manifests_with_attributes_in_db)
     res = await test_async_client_auth.post(test_validate_manifest_api, json=payload)
     res_json = res.json()
     assert res_json.get('code') == 404
@@ -103,8 +129,8 @@ async def test_invalidate_attribute_should_return_400(test_async_client_auth, mo
             }
         }
     }
-    mocker.patch('app.routers.v1.api_validation.RDConnection.get_manifest_name_from_project_in_db',
-                 mock_get_manifest_name_from_project_in_db)
+    mocker.patch('app.routers.v1.api_validation.RDConnection.get_manifests_with_attributes_in_db',
+                 mock_get_manifests_with_attributes_in_db)
     mocker.patch('app.routers.v1.api_validation.ManifestValidator.has_valid_attributes',
                  mock_has_valid_attributes)
     res = await test_async_client_auth.post(test_validate_manifest_api, json=payload)
@@ -180,14 +206,70 @@ async def test_validate_env_with_decryption_error_should_return_400(test_async_c
     assert response.get('code') == 400
 
 
-def mock_has_valid_attributes(arg1, arg2):
+@pytest.mark.asyncio
+@pytest.mark.parametrize("worker_threshold", [500, 1])
+async def test_validate_manifest_batch_should_return_all_errors(test_async_client_auth, mocker, monkeypatch,
+                                                                worker_threshold):
+    monkeypatch.setattr(ConfigClass, 'BATCH_VALIDATION_WORKER_THRESHOLD', worker_threshold)
+    payload = {
+        "manifest_name": "fake_manifest",
+        "project_code": "test_project",
+        "entries": [
+            {"file": "file_1", "attributes": {"attr1": "a1", "attr2": "text"}},
+            {"file": "file_2", "attributes": {"attr1": "a3", "fake": "1"}},
+        ]
+    }
+    mocker.patch('app.routers.v1.api_validation.RDConnection.get_manifests_with_attributes_in_db',
+                 mock_get_manifests_with_attributes_in_db)
+    res = await test_async_client_auth.post(test_validate_manifests_api, json=payload)
+    response = res.json()
+    assert response.get('code') == 200
+    assert response.get('result') == [
+        {"file": "file_1", "valid": True, "errors": []},
+        {"file": "file_2", "valid": False,
+         "errors": ["Invalid Attribute fake", "Invalid Choice Field attr1", "Missing Required Attribute attr2"]},
+    ]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("entry", ["file_1", {"file": "file_1", "attributes": "attr1"}])
+async def test_validate_manifest_batch_with_malformed_entry_should_return_422(test_async_client_auth, entry):
+    payload = {
+        "manifest_name": "fake_manifest",
+        "project_code": "test_project",
+        "entries": [entry]
+    }
+    res = await test_async_client_auth.post(test_validate_manifests_api, json=payload)
+    assert res.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_validate_manifest_batch_with_manifest_not_found_return_404(test_async_client_auth, mocker):
+    payload = {
+        "manifest_name": "Manifest1",
+        "project_code": "test_project",
+        "entries": [{"file": "file_1", "attributes": {"attr1": "a1"}}]
+    }
+    mocker.patch('app.routers.v1.api_validation.RDConnection.get_manifests_with_attributes_in_db',
+                 mock_get_manifests_with_attributes_in_db)
+    res = await test_async_client_auth.post(test_validate_manifests_api, json=payload)
+    response = res.json()
+    assert response.get('code') == 404
+    assert response.get('result') == 'Manifest Not Exist Manifest1'
+
+
+async def mock_has_valid_attributes(arg1, arg2):
     if arg2.get("manifest_name", "") == "Manifest":
         return "mock error"
     return ""
 
 
-def mock_get_manifest_name_from_project_in_db(arg1, arg2):
-    if arg2.get("manifest_name", "") == "Manifest1":
-        return ""
-    result = [{'name': "fake_manifest", 'id': 1}]
-    return result
+async def mock_get_manifests_with_attributes_in_db(arg1, project_code, manifest_name=None):
+    if manifest_name == "Manifest1":
+        return []
+    return [{
+        'id': 1,
+        'manifest_name': 'fake_manifest',
+        'attributes': [{"name": "attr1", "type": "multiple_choice", "optional": False, "value": "a1,a2"},
+                       {"name": "attr2", "type": "text", "optional": False, "value": None}]
+    }]